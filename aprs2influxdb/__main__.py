@@ -1,1108 +1,709 @@
-import aprslib
-import influxdb
-from influxdb import InfluxDBClient
 import logging
 import argparse
+import copy
+import gzip
+import signal
 import sys
 import threading
 import time
 import os
-import math
 
 from logging.handlers import TimedRotatingFileHandler
 
-# Command line input
-parser = argparse.ArgumentParser(description='Connects to APRS-IS and saves stream to local InfluxDB')
-parser.add_argument('--dbhost', help='Set InfluxDB host', default="localhost")
-parser.add_argument('--dbport', help='Set InfluxDB port', default="8086")
-parser.add_argument('--dbuser', help='Set InfluxDB user', default="root")
-parser.add_argument('--dbpassword', help='Set InfluxDB password', default="root")
-parser.add_argument('--dbname', help='Set InfluxDB database name', default="mydb")
-parser.add_argument('--callsign', help='Set APRS-IS login callsign', default="nocall")
-parser.add_argument('--port', help='Set APRS-IS port', default="10152")
-parser.add_argument('--interval', help='Set APRS-IS heartbeat interval in minutes', default="15")
-parser.add_argument('--debug', help='Set logging level to DEBUG', action="store_true")
-
-# Parse the arguments
-args = parser.parse_args()
-
-
-def jsonToLineProtocol(jsonData):
-    """Converts JSON APRS-IS packet to influxdb line protocol
-
-    Takes in a JSON packet from aprslib (raw=false) and parses it into an
-    influxdb line protocol compliant string to insert into database. Returns
-    a valid line protocol string ready to be inserted into the database.
+from aprs2influxdb import aprsis
+from aprs2influxdb import columnar
+from aprs2influxdb import config
+from aprs2influxdb import floodlimit
+from aprs2influxdb import lineprotocol
+from aprs2influxdb.lineprotocol import jsonToLineProtocol
+from aprs2influxdb import packetcache
+from aprs2influxdb.pathstats import PathStats
+from aprs2influxdb.rawarchive import RawArchive
+from aprs2influxdb import pipeline
+from aprs2influxdb import shards
+from aprs2influxdb import sinks
+from aprs2influxdb.supervisor import Supervisor, parseServers
+from aprs2influxdb import telemetry
+from aprs2influxdb import tracing
+from aprs2influxdb.writer import BatchController, BatchWriter, DeadLetter
+
+# Parsed options, set by main() and updated on configuration reload
+args = None
+
+# Set by SIGTERM or SIGINT to start shutting down
+shutdownRequested = threading.Event()
+
+# Set once receiving stopped, the parse workers exit when their queue is empty
+stopping = threading.Event()
+
+# Packets which failed with an unexpected error in the parse workers
+packetErrors = 0
+
+# Packets get distinct receive times RECEIVE_STEP seconds apart, as points of
+# the same series and timestamp overwrite each other. A clock or replayed file
+# stepping back more than CLOCK_STEP seconds restarts the sequence.
+RECEIVE_STEP = 1e-6
+CLOCK_STEP = 1.0
+nextReceived = 0.0
+
+# Seconds a finished replay may take to write the packets read, no deadline
+# in practice
+REPLAY_TIMEOUT = 365 * 86400
+
+# Output sink types
+SINKS = ["influxdb", "file", "stdout", "udp", "none"]
+
+# Options which take effect while running when the configuration is reloaded
+RELOADABLE = ["debug", "filter", "batchsize", "minbatchsize", "maxbatchsize", "writelatency", "flushinterval", "overload",
+              "samplerate", "formats", "excludefields", "retries", "retrydelay", "stalltimeout", "shutdowntimeout", "internsize", "packetcache",
+              "floodrate", "floodburst", "floodallow", "workers"]
+
+
+def createParser():
+    """Create the command line argument parser"""
+    parser = argparse.ArgumentParser(description='Connects to APRS-IS and saves stream to local InfluxDB')
+    parser.add_argument('--config', help='Read options from INI configuration file, reloaded on SIGHUP', default=None)
+    parser.add_argument('--dbhost', help='Set InfluxDB host', default="localhost")
+    parser.add_argument('--dbport', help='Set InfluxDB port', default="8086")
+    parser.add_argument('--dbuser', help='Set InfluxDB user', default="root")
+    parser.add_argument('--dbpassword', help='Set InfluxDB password', default="root")
+    parser.add_argument('--dbname', help='Set InfluxDB database name', default="mydb")
+    parser.add_argument('--callsign', help='Set APRS-IS login callsign', default="nocall")
+    parser.add_argument('--host', help='Set APRS-IS server, or comma separated servers tried in turn', default="rotate.aprs.net")
+    parser.add_argument('--port', help='Set APRS-IS port', default="10152")
+    parser.add_argument('--filter', help='Set APRS-IS server side filter', default="")
+    parser.add_argument('--interval', help='Set APRS-IS heartbeat interval in minutes', default="15")
+    parser.add_argument('--receivebuffer', help='Set bytes of the APRS-IS receive buffer', type=int, default=262144)
+    parser.add_argument('--stalltimeout', help='Set seconds without packets before reconnecting to APRS-IS, 0 disables', type=float, default=60)
+    parser.add_argument('--debug', help='Set logging level to DEBUG', action="store_true")
+    parser.add_argument('--sink', help='Set output for points', choices=SINKS, default="influxdb")
+    parser.add_argument('--sinkpath', help='Set line protocol file for the file sink', default="aprs2influxdb.lp")
+    parser.add_argument('--udpport', help='Set InfluxDB UDP listener port for the udp sink', default="8089")
+    parser.add_argument('--udpmtu', help='Set maximum UDP datagram payload in bytes', type=int, default=1400)
+    parser.add_argument('--shardby', help='Split points across the [shard:NAME] sections of the configuration file by callsign, format or region, or mirror them to all', choices=shards.SHARD_KEYS, default=None)
+    parser.add_argument('--batchsize', help='Set points written per batch, the initial size when adapting to write latency', type=int, default=100)
+    parser.add_argument('--minbatchsize', help='Set smallest adaptive batch size', type=int, default=10)
+    parser.add_argument('--maxbatchsize', help='Set largest adaptive batch size', type=int, default=5000)
+    parser.add_argument('--writelatency', help='Set target seconds per batch write the batch size adapts to, 0 keeps it fixed', type=float, default=0.5)
+    parser.add_argument('--flushinterval', help='Set maximum seconds between batch writes', type=float, default=1.0)
+    parser.add_argument('--workers', help='Set number of packet parsing threads', type=config.positiveInt, default=1)
+    parser.add_argument('--queuesize', help='Set maximum packets waiting between pipeline stages', type=int, default=10000)
+    parser.add_argument('--overload', help='Set policy when a pipeline queue is full', choices=pipeline.POLICIES, default="priority")
+    parser.add_argument('--samplerate', help='Keep one of every SAMPLERATE packets with the sample overload policy', type=config.positiveInt, default=10)
+    parser.add_argument('--export', help='Also write parsed packets to hourly columnar files in this directory', default=None)
+    parser.add_argument('--exportformat', help='Set columnar export file format', choices=sorted(columnar.EXTENSIONS), default="parquet")
+    parser.add_argument('--replay', help='Read raw packets from this file, or - for standard input, instead of APRS-IS and exit at its end', default=None)
+    parser.add_argument('--rawarchive', help='Omit raw packets from InfluxDB and archive them in this directory', default=None)
+    parser.add_argument('--rawcompression', help='Set raw archive compression (gzip or zstd)', choices=["gzip", "zstd"], default="gzip")
+    parser.add_argument('--retries', help='Set write retries of a failed batch', type=int, default=5)
+    parser.add_argument('--retrydelay', help='Set seconds before the first write retry, doubled for each retry', type=float, default=0.5)
+    parser.add_argument('--deadletter', help='Set line protocol file for points rejected by InfluxDB', default="aprs2influxdb.deadletter.lp")
+    parser.add_argument('--shutdowntimeout', help='Set seconds to write queued packets on SIGTERM or SIGINT before exiting', type=float, default=10)
+    parser.add_argument('--telemetrystate', help='Keep telemetry channel names and scaling in this file across restarts', default=None)
+    parser.add_argument('--fieldtypes', help='Keep the type of every field in this file across restarts', default=None)
+    parser.add_argument('--floodrate', help='Set packets per minute a station may send of each data type before it is throttled, 0 disables', type=float, default=0)
+    parser.add_argument('--floodburst', help='Set packets a station may send at once before --floodrate applies', type=int, default=20)
+    parser.add_argument('--floodallow', help='Set comma separated callsigns never throttled, a trailing * matches callsigns starting with the text before it', default="")
+    parser.add_argument('--floodstations', help='Set maximum stations tracked by the flood limiter', type=int, default=50000)
+    parser.add_argument('--packetcache', help='Set repeated payloads whose parsed packet and encoding are cached, 0 disables', type=int, default=5000)
+    parser.add_argument('--pathstats', help='Set seconds between summaries of packets per digipeater and iGate, 0 disables', type=float, default=0)
+    parser.add_argument('--tracerate', help='Trace the latency of one of every TRACERATE packets through the pipeline, 0 disables', type=int, default=0)
+    parser.add_argument('--tracesize', help='Set traced packets kept for the latency summary logged on SIGUSR1', type=int, default=1000)
+    parser.add_argument('--internsize', help='Set callsigns and paths shared between packets per table generation, 0 disables', type=int, default=20000)
+    parser.add_argument('--formats', help='Set comma separated packet formats to process, all by default', default="")
+    parser.add_argument('--excludefields', help='Set comma separated fields never written', default="")
+    return parser
+
+
+def parseArguments(argv=None):
+    """Parse command line arguments on top of configuration file values
+
+    Options given on the command line take precedence over the configuration
+    file which takes precedence over built in defaults.
 
     keyword arguments:
-    jsonData -- aprslib parsed JSON packet
+    argv -- list of arguments, defaults to sys.argv[1:]
     """
+    parser = createParser()
 
-    try:
-        if jsonData["format"] == "uncompressed":
-            # Parse uncompressed APRS packet
-            return parseUncompressed(jsonData)
-
-        if jsonData["format"] == "mic-e":
-            # Parse mic-e APRS packet
-            return parseMicE(jsonData)
-
-        if jsonData["format"] == "object":
-            # Parse object APRS packet
-            return parseObject(jsonData)
+    # Find the configuration file first so it can provide defaults
+    known, _ = parser.parse_known_args(argv)
+    if known.config:
+        try:
+            parser.set_defaults(**config.loadConfig(known.config, parser))
+        except ValueError as e:
+            parser.error(str(e))
 
-        if jsonData["format"] == "compressed":
-            # Parse compressed APRS packet
-            return parseCompressed(jsonData)
+    return parser.parse_args(argv)
 
-        if jsonData["format"] == "status":
-            # Parse status APRS packet
-            return parseStatus(jsonData)
 
-        if jsonData["format"] == "wx":
-            # Parse wx APRS packet
-            return parseWX(jsonData)
+def configurePlan():
+    """Compile the encoding plan from configuration values and put it in use
 
-        if jsonData["format"] == "beacon":
-            # Parse beacon APRS packet
-            return parseBeacon(jsonData)
+    Raises ValueError for unknown formats or fields, the current plan is then
+    left in place.
+    """
+    formats = config.splitList(args.formats) or None
+    fields = config.loadFieldLists(args.config) if args.config else {}
+    exclude = config.splitList(args.excludefields)
+    lineprotocol.setPlan(lineprotocol.compilePlan(formats, fields, exclude))
 
-        if jsonData["format"] == "bulletin":
-            # Parse bulletin APRS packet
-            return parseBulletin(jsonData)
 
-        if jsonData["format"] == "message":
-            # Parse message APRS packet
-            return parseMessage(jsonData)
+def configureFieldTypes():
+    """Register field types of the [fieldtypes] configuration section
 
-        if jsonData["format"] == "telemetry-message":
-            # Parse telemetry-message APRS packet
-            # Currently only support scaling values
-            return parseTelemetryScaling(jsonData)
+    Raises ValueError for malformed keys or unknown types. Encoders use the
+    new types once the plan is compiled again.
+    """
+    if not args.config:
+        return
+    for (measurement, field), fieldType in sorted(config.loadFieldTypes(args.config).items()):
+        lineprotocol.fieldTypes.set(measurement, field, fieldType, "the configuration file")
+
+
+def configurePacketCache():
+    """Create, resize or remove the cache of repeated payloads"""
+    global packetCache
+    if args.packetcache <= 0:
+        packetCache = None
+    elif packetCache is None:
+        packetCache = packetcache.PacketCache(args.packetcache)
+    else:
+        packetCache.maxSize = args.packetcache
 
-        # All other formats not yes parsed
-        logger.debug("Not parsing {0} packets".format(jsonData))
 
-    except StandardError:
-        # An error occured
-        logger.error('A parsing StandardError occured', exc_info=True)
-        logger.error("Packet: {0}".format(jsonData))
+def configureFloodLimiter():
+    """Create or update the flood limiter from configuration values
 
+    The limiter is removed when neither --floodrate nor [floodrates] set a
+    rate. Raises ValueError for unknown formats in [floodrates], the current
+    limiter is then left in place.
+    """
+    global floodLimiter
+    formatRates = config.loadFloodRates(args.config) if args.config else {}
+    unknown = set(formatRates) - set(list(lineprotocol.SCHEMAS) + lineprotocol.METADATA_FORMATS)
+    if unknown:
+        raise ValueError("Unknown formats {0} in [floodrates]".format(", ".join(sorted(unknown))))
+    allow = config.splitList(args.floodallow)
+
+    if args.floodrate <= 0 and not any(rate > 0 for rate in formatRates.values()):
+        floodLimiter = None
+    elif floodLimiter is None:
+        floodLimiter = floodlimit.FloodLimiter(args.floodrate, args.floodburst, formatRates, allow, args.floodstations)
+    else:
+        floodLimiter.configure(args.floodrate, args.floodburst, formatRates, allow)
 
-def parseTelemetry(jsonData, fieldList):
-    '''parse telemetry from packets
 
-    Iterates through a packet to extra telemetry data: sequence, bits, and
-    values. These are placed into the fieldList which is returned at the end of
-    the function.
+def warmFieldTypes():
+    """Register the field types of every InfluxDB database written to
 
-    keyword arguments:
-    jsonData -- JSON packet from aprslib
-    fieldList -- list of field items currently parsed
-    '''
-
-    # Check for telemetry in packet
-    if "telemetry" in jsonData:
-        items = jsonData.get("telemetry")
-        # Extract telemetry sequency
-        if "seq" in items:
-            fieldList.append("seq={0}".format(items.get("seq")))
-        # Extract IO bits
-        if "bits" in items:
-            fieldList.append("bits={0}".format(items.get("bits")))
-        # Attempt to retrieve scaling values from telemetryDictionary
+    Types already in a database take precedence, points giving a field
+    another type would be rejected. Unreachable databases are skipped.
+    """
+    for writer in writers:
+        if not isinstance(writer.sink, sinks.InfluxDBSink):
+            continue
         try:
-            channels = telemetryDictionary[jsonData["from"]]
-        except KeyError:
-            # No scaling values found, assign generic scaling to channels
-            channels = []
-            for eqn in range(5):
-                # Create a scaling dictionary for all five measurements
-                equations = {"a": 0, "b": 0, "c": 0, }
-                equations["a"] = 0
-                equations["b"] = 1
-                equations["c"] = 0
-                channels.append(equations)
-
-        # Extract analog values from telemtry packet
-        if "vals" in items:
-            values = items.get("vals")
-            for analog in range(5):
-                # Apply scaling equation A*V**2 + B*V + C
-                telemVal = channels[analog]["a"] * math.pow(values[analog], 2) + channels[analog]["b"] * values[analog] + channels[analog]["c"]
-                fieldList.append("analog{0}={1}".format(analog + 1, telemVal))
-
-    # Return fieldList with found items appended
-    return fieldList
-
-
-def parseEquations(jsonData):
-    '''
-    Iterates through a telemetry-message packet for tEQNs values which are
-    scaling parameters for telemetry data. Places each equation coefficient into
-    a dictionary which is then placed into a list for each measurement.
-    Returns a channels list or None
-
-    keyword arguments:
-    jsonData -- JSON packet from aprslib
-    '''
-    # Check for tEQNS dictionary
-    if("tEQNS" in jsonData):
-        # Exists, initialize channels list and extract equations list
-        channels = []
-        items = jsonData.get("tEQNS")
-        for eqn in items:
-            # Iterate through each measurement coefficient list, assign to dictionary
-            equations = {"a": 0, "b": 0, "c": 0, }
-            equations["a"] = eqn[0]
-            equations["b"] = eqn[1]
-            equations["c"] = eqn[2]
-            channels.append(equations)
-        return channels
-    return None
-
-
-def parseWeather(jsonData, fieldList):
-    '''parse weather data from packets
-
-    Iterates through a packet to extra weather data. Items which are found are
-    appended to the fieldList which is returned.
-
-    keyword arguments:
-    jsonData -- JSON packet from aprslib
-    fieldList -- list of field items currently parsed
-    '''
-
-    # Check for weather data key
-    if "weather" in jsonData:
-        items = jsonData.get("weather")
-
-        # Define weather items to check for
-        wxFields = ["humidity", "pressure", "rain_1h", "rain_24h", "rain_since_midnight", "temperature", "wind_direction", "wind_gust", "wind_speed"]
-        for key in wxFields:
-            if key in items:
-                fieldList.append("{0}={1}".format(key, items.get(key)))
+            lineprotocol.fieldTypes.warm(writer.sink.client, writer.sink.database)
+        except Exception as e:
+            logger.warning("Unable to read field types of database {0}: {1}".format(writer.sink.database, e))
+    lineprotocol.setPlan(lineprotocol.plan)
 
-    # Return fieldList with found items appended
-    return fieldList
 
+def reloadConfig(conn):
+    """Re-read configuration and apply reloadable options to the running program
 
-def parseUncompressed(jsonData):
-    """Parse uncompressed APRS packets into influxedb line protocol. Returns a
-    valid line protocol string.
+    Only options listed in RELOADABLE are changed, the APRS-IS connection and
+    any buffered data are left untouched. Errors leave the current options in
+    place.
 
     keyword arguments:
-    jsonData -- aprslib parsed JSON packet
+    conn -- APRS-IS connection, None when replaying
     """
-    ## Schema
-    # field = from
-    # field = to
-    # field = symbol_table
-    # field = symbol
-    # tag = format
-    # field = via
-    # field = messagecapable
-    # field = latitude
-    # field = longitude
-    # field = posAmbiguity
-    # field = altitude
-    # field = raw
-    # field = speed
-    # field = course
-    # field = raw_timestamp
-    # field = seq
-    # field = analog1
-    # field = analog2
-    # field = analog3
-    # field = analog4
-    # field = analog5
-    # field = bits
-    # field = phg
-    # field = rng
-    # field = comment
-    # field = path
-    # field = pressure
-    # field = rain_1h
-    # field = rain_24h
-    # field = rain_since_midnight
-    # field = temperature
-    # field = wind_direction
-    # field = wind_gust
-    # field = wind_speed
-
-    # initialize variables
-    tags = []
-    fields = []
-
-    # Set measurement to "packet"
-    measurement = "packet"
-
-    # Obtain tags
-    #
-    tags.append("format={0}".format(jsonData.get("format")))
-
-    # Join tags into comma separated string
-    tagStr = ",".join(tags)
-
-    # Create field key lists to iterate through
-    fieldNumKeys = ["latitude", "longitude", "posambiguity", "altitude", "speed", "course"]
-    fieldTextKeys = ["from", "to", "messagecapable", "phg", "rng", "via"]
-
-    # Extract number fields from packet
-    for key in fieldNumKeys:
-        if key in jsonData:
-            fields.append("{0}={1}".format(key, jsonData.get(key)))
-
-    # Extract text fields from packet
-    for key in fieldTextKeys:
-        if key in jsonData:
-            fields.append("{0}=\"{1}\"".format(key, jsonData.get(key)))
-
-    # Extract path
-    if "path" in jsonData:
-        fields.append(parsePath(jsonData.get("path")))
-
-    # Extract comment
-    if "comment" in jsonData:
-        comment = parseTextString(jsonData.get("comment"), "comment")
-        if len(jsonData.get("comment")) > 0:
-            fields.append(comment)
-
-    # Extract raw packet
-    if "raw" in jsonData:
-        comment = parseTextString(jsonData.get("raw"), "raw")
-        if len(jsonData.get("raw")) > 0:
-            fields.append(comment)
-
-    # Extract APRS symbol
-    if "symbol" in jsonData:
-        comment = parseTextString(jsonData.get("symbol"), "symbol")
-        if len(jsonData.get("symbol")) > 0:
-            fields.append(comment)
-
-    # Extract APRS symbol table
-    if "symbol_table" in jsonData:
-        comment = parseTextString(jsonData.get("symbol_table"), "symbol_table")
-        if len(jsonData.get("symbol_table")) > 0:
-            fields.append(comment)
-
-    # Extract raw timestamp from packet
-    if "raw_timestamp" in jsonData:
-        rawtimestamp = parseTextString(jsonData.get("raw_timestamp"), "raw_timestamp")
-        if len(jsonData.get("raw_timestamp")) > 0:
-            fields.append(rawtimestamp)
-
-    # Parse telemetry data
-    fields = parseTelemetry(jsonData, fields)
-
-    # Parse weather data
-    fields = parseWeather(jsonData, fields)
-
-    # Combine all fields into a valid line protocol string
-    fieldsStr = ",".join(fields)
-
-    # Combine final valid line protocol string
-    return measurement + "," + tagStr + " " + fieldsStr
-
-
-def parseMicE(jsonData):
-    """Parse mic-e APRS packets into influxedb line protocol. Returns a
-    valid line protocol string.
-
-    keyword arguments:
-    jsonData -- aprslib parsed JSON packet
-    """
-    ## Schema
-    # measurement = packet
-    # field = from
-    # field = symbol_table
-    # field = symbol
-    # tag = format
-    # field = via
-    # field = latitude
-    # field = longitude
-    # field = posambiguity
-    # field = altitude
-    # field = speed
-    # field = course
-    # field = comment
-    # field = path
-    # field = mbits
-    # field = mtype
-    # field = raw
-    # field = to
-    # field = daodatumbyte
-    # field = path
-
-    # initialize variables
-    tags = []
-    fields = []
-
-    # Set measurement to "packet"
-    measurement = "packet"
-
-    # Obtain tags
-    tags.append("format={0}".format(jsonData.get("format")))
-
-    # Join tags into comma separated string
-    tagStr = ",".join(tags)
-
-    # Create field key lists to iterate through
-    fieldNumKeys = ["latitude", "longitude", "posambiguity", "altitude", "speed", "course", "mbits"]
-    fieldTextKeys = ["from", "via", "to", "mtype", "daodatumbyte"]
-
-    # Extract number fields from packet
-    for key in fieldNumKeys:
-        if key in jsonData:
-            fields.append("{0}={1}".format(key, jsonData.get(key)))
-
-    # Extract text fields from packet
-    for key in fieldTextKeys:
-        if key in jsonData:
-            fields.append("{0}=\"{1}\"".format(key, jsonData.get(key)))
-
-    # Extract path
-    if "path" in jsonData:
-        fields.append(parsePath(jsonData.get("path")))
-
-    # Extract comment
-    if "comment" in jsonData:
-        comment = parseTextString(jsonData.get("comment"), "comment")
-        if len(jsonData.get("comment")) > 0:
-            fields.append(comment)
-        else:
-            pass
+    try:
+        newArgs = parseArguments()
+    except SystemExit:
+        logger.error("Configuration reload failed, keeping current options")
+        return
+
+    for key, value in sorted(vars(newArgs).items()):
+        if value == getattr(args, key):
+            continue
+        if key not in RELOADABLE:
+            logger.warning("Option {0} changed but requires a restart".format(key))
+            continue
+        logger.warning("Reloaded option {0}".format(key))
+        setattr(args, key, value)
+
+        # Apply options which are not read on every use
+        if key == "debug":
+            logger.setLevel(logging.DEBUG if value else logging.WARNING)
+        if key == "filter" and conn is not None:
+            conn.setFilter(value)
+        if key == "stalltimeout" and supervisor is not None:
+            supervisor.stallTimeout = value
+        if key == "overload":
+            parseQueue.policy = value
+        if key == "samplerate":
+            parseQueue.sampleRate = value
+        if key == "packetcache":
+            configurePacketCache()
+        if key == "internsize":
+            lineprotocol.sharedStrings.maxSize = value
+            lineprotocol.sharedStrings.clear()
+        for writer in writers:
+            if key == "batchsize":
+                writer.batchSize = value
+            if key in ("minbatchsize", "maxbatchsize") and writer.controller is not None:
+                writer.controller.minSize = args.minbatchsize
+                writer.controller.maxSize = max(args.minbatchsize, args.maxbatchsize)
+            if key == "writelatency":
+                if value and writer.controller is not None:
+                    writer.controller.targetLatency = value
+                else:
+                    writer.controller = createController()
+            if key == "flushinterval":
+                writer.flushInterval = value
+            if key == "retries":
+                writer.retries = value
+            if key == "retrydelay":
+                writer.retryDelay = value
+            if key == "overload":
+                writer.queue.policy = value
+            if key == "samplerate":
+                writer.queue.sampleRate = value
+
+    # Field allow-lists and types may change without any option changing
+    try:
+        configureFieldTypes()
+        configurePlan()
+    except ValueError as e:
+        logger.error("Keeping current encoding plan: {0}".format(e))
+    try:
+        configureFloodLimiter()
+    except ValueError as e:
+        logger.error("Keeping current flood limits: {0}".format(e))
 
-    # Extract raw packet
-    if "raw" in jsonData:
-        comment = parseTextString(jsonData.get("raw"), "raw")
-        if len(jsonData.get("raw")) > 0:
-            fields.append(comment)
 
-    # Extract APRS symbol
-    if "symbol" in jsonData:
-        comment = parseTextString(jsonData.get("symbol"), "symbol")
-        if len(jsonData.get("symbol")) > 0:
-            fields.append(comment)
+def receiveTimes(now, count):
+    """Return the receive time of the first of count packets received at once
 
-    # Extract APRS symbol table
-    if "symbol_table" in jsonData:
-        comment = parseTextString(jsonData.get("symbol_table"), "symbol_table")
-        if len(jsonData.get("symbol_table")) > 0:
-            fields.append(comment)
+    The packets are timestamped RECEIVE_STEP seconds apart starting at the
+    returned time, which follows the times given to earlier packets.
+    Otherwise packets of one format, whose points only differ in their
+    fields, received in the same receive or clock tick would overwrite each
+    other in InfluxDB.
 
-    # Combine final valid line protocol string
-    fieldsStr = ",".join(fields)
+    keyword arguments:
+    now -- unix time the packets were received
+    count -- number of packets
+    """
+    global nextReceived
+    if nextReceived - CLOCK_STEP < now < nextReceived:
+        now = nextReceived
+    nextReceived = now + count * RECEIVE_STEP
+    return now
 
-    return measurement + "," + tagStr + " " + fieldsStr
 
+def callback(lines):
+    """Consumer callback for every batch of raw packets received from APRS-IS
 
-def parseObject(jsonData):
-    """Parse Object APRS packets into influxedb line protocol
+    Packets are queued for the parse workers, the queue overload policy decides
+    which packets are shed if parsing falls behind. Packets which can only
+    parse to disabled formats, or are above their station's flood limit, are
+    dropped without parsing.
 
     keyword arguments:
-    jsonData -- aprslib parsed JSON packet
+    lines -- list of raw APRS-IS packets from one receive
     """
-    # Converts aprslib JSON to influxdb line protocol
-    # Schema
-    # measurement = packet
-    # field = from
-    # field = to
-    # field = symbol_table
-    # field = symbol
-    # tag = format
-    # field = via
-    # field = alive
-    # field = object_format
-    # field = object_name
-    # field = latitude
-    # field = longitude
-    # field = posambiguity
-    # field = raw_timestamp
-    # field = timestamp
-    # field = speed
-    # field = course
-    # field = altitude
-    # field = comment
-    # field = path
-    # field  = raw
-    # field = daodatumbyte
-    # field = rng
-    # field = bits
-    # field = seq
-    # field = analog1
-    # field = analog2
-    # field = analog3
-    # field = analog4
-    # field = analog5
-
-    # initialize variables
-    tags = []
-    fields = []
-
-    # Set measurement to "packet"
-    measurement = "packet"
-
-    # Obtain tags
-    #tags.append("from={0}".format(jsonData.get("from")))
-    tags.append("format={0}".format(jsonData.get("format")))
-
-    # Join tags into comma separated string
-    tagStr = ",".join(tags)
-
-    # Create field key lists to iterate through
-    fieldNumKeys = ["latitude", "longitude", "posambiguity", "speed", "course", "timestamp", "altitude"]
-    fieldTextKeys = ["from", "alive", "via", "to", "object_format", "object_name", "rng", "daodatumbyte"]
-
-    # Extract number fields from packet
-    for key in fieldNumKeys:
-        if key in jsonData:
-            fields.append("{0}={1}".format(key, jsonData.get(key)))
-
-    # Extract text fields from packet
-    for key in fieldTextKeys:
-        if key in jsonData:
-            fields.append("{0}=\"{1}\"".format(key, jsonData.get(key)))
-
-    # Extract path
-    if "path" in jsonData:
-        fields.append(parsePath(jsonData.get("path")))
-
-    # Extract comment
-    if "comment" in jsonData:
-        comment = parseTextString(jsonData.get("comment"), "comment")
-        if len(jsonData.get("comment")) > 0:
-            fields.append(comment)
-
-    # Parse telemetry
-    fields = parseTelemetry(jsonData, fields)
-
-    # Extract raw packet
-    if "raw" in jsonData:
-        comment = parseTextString(jsonData.get("raw"), "raw")
-        if len(jsonData.get("raw")) > 0:
-            fields.append(comment)
-
-    # Extract symbol
-    if "symbol" in jsonData:
-        comment = parseTextString(jsonData.get("symbol"), "symbol")
-        if len(jsonData.get("symbol")) > 0:
-            fields.append(comment)
-
-    # Extract symbol table
-    if "symbol_table" in jsonData:
-        comment = parseTextString(jsonData.get("symbol_table"), "symbol_table")
-        if len(jsonData.get("symbol_table")) > 0:
-            fields.append(comment)
-
-    # Extract raw_timestamp
-    if "raw_timestamp" in jsonData:
-        rawtimestamp = parseTextString(jsonData.get("raw_timestamp"), "raw_timestamp")
-        if len(jsonData.get("raw_timestamp")) > 0:
-            fields.append(rawtimestamp)
-
-    # Combine final valid line protocol string
-    fieldsStr = ",".join(fields)
-
-    return measurement + "," + tagStr + " " + fieldsStr
-
-
-def parseStatus(jsonData):
-    """Parse Status APRS packets into influxedb line protocol
+    first = receiveTimes(time.time(), len(lines))
+    items = []
+    for index, line in enumerate(lines):
+        received = first + index * RECEIVE_STEP
+        if not lineprotocol.wantsRaw(line):
+            continue
+        if floodLimiter is not None and not floodLimiter.allow(line, received):
+            continue
+        items.append(((line, received), pipeline.rawPriority(line)))
+    if tracer is not None:
+        tracer.sample(items)
+    parseQueue.putMany(items)
+
+
+def parseWorker(index):
+    """Parse worker thread, turns queued raw packets into line protocol
+
+    A packet failing anywhere in parsing, encoding or queuing is logged and
+    counted, the worker carries on with the next one. Workers numbered
+    --workers or above exit after their current batch, so a reload can
+    shrink the pool.
 
     keyword arguments:
-    jsonData -- aprslib parsed JSON packet
+    index -- worker number
     """
-    ## Schema
-    # measurement = packet
-    # field = from
-    # field = to
-    # tag = format
-    # field = via
-    # field = status
-    # field = path
-    # field = timestamp
-    # field = raw
-    # field = raw_timestamp
-
-    # initialize variables
-    tags = []
-    fields = []
-
-    # Set measurement to "packet"
-    measurement = "packet"
-
-    # Obtain tags
-    tags.append("format={0}".format(jsonData.get("format")))
-
-    # Join tags into comma separated string
-    tagStr = ",".join(tags)
-
-    # Create field key lists to iterate through
-    fieldNumKeys = ["timestamp"]
-    fieldTextKeys = ["from", "via", "to"]
-
-    # Extract number fields from packet
-    for key in fieldNumKeys:
-        if key in jsonData:
-            fields.append("{0}={1}".format(key, jsonData.get(key)))
-
-    # Extract text fields from packet
-    for key in fieldTextKeys:
-        if key in jsonData:
-            fields.append("{0}=\"{1}\"".format(key, jsonData.get(key)))
-
-    # Extract path
-    if "path" in jsonData:
-        fields.append(parsePath(jsonData.get("path")))
-
-    # Extract telemetry
-    fields = parseTelemetry(jsonData, fields)
-
-    # Extract status
-    if "status" in jsonData:
-        comment = parseTextString(jsonData.get("status"), "status")
-        if len(jsonData.get("status")) > 0:
-            fields.append(comment)
-
-    # Extract raw packet
-    if "raw" in jsonData:
-        comment = parseTextString(jsonData.get("raw"), "raw")
-        if len(jsonData.get("raw")) > 0:
-            fields.append(comment)
-
-    # Extract raw timestamp
-    if "raw_timestamp" in jsonData:
-        rawtimestamp = parseTextString(jsonData.get("raw_timestamp"), "raw_timestamp")
-        if len(jsonData.get("raw_timestamp")) > 0:
-            fields.append(rawtimestamp)
-
-    # Combine final valid line protocol string
-    fieldsStr = ",".join(fields)
-
-    return measurement + "," + tagStr + " " + fieldsStr
-
-
-def parseCompressed(jsonData):
-    """Parse Compressed APRS packets into influxedb line protocol
+    # Loaded here as only parse workers need the parser
+    import aprslib
 
-    keyword arguments:
-    jsonData -- aprslib parsed JSON packet
-    """
-    ## Schema
-    # measurement = packet
-    # field = from
-    # field = to
-    # field = symbol_table
-    # field = symbol
-    # tag = format
-    # field = via
-    # field = messagecapable
-    # field = latitude
-    # field = longitude
-    # field = gpsfixstatus
-    # field = altitude
-    # field = seq
-    # field = analog1
-    # field = analog2
-    # field = analog3
-    # field = analog4
-    # field = analog5
-    # field = bits
-    # field = comment
-    # field = path
-    # field = phg
-    # field = raw
-    # field = timestamp
-    # field = pressure
-    # field = rain_1h
-    # field = rain_24h
-    # field = rain_since_midnight
-    # field = temperature
-    # field = wind_direction
-    # field = wind_gust
-    # field = wind_speed
-    # field = speed
-    # field = course
-
-    # initialize variables
-    tags = []
-    fields = []
-
-    # Set measurement to "packet"
-    measurement = "packet"
-
-    # Obtain tags
-    tags.append("format={0}".format(jsonData.get("format")))
-
-    # Join tags into comma separated string
-    tagStr = ",".join(tags)
-
-    # Create field key lists to iterate through
-    fieldNumKeys = ["latitude", "longitude", "gpsfixstatus", "altitude", "speed", "course", "timestamp"]
-    fieldTextKeys = ["from", "to", "messagecapable", "phg", "via"]
-
-    # Extract number fields from packet
-    for key in fieldNumKeys:
-        if key in jsonData:
-            fields.append("{0}={1}".format(key, jsonData.get(key)))
-
-    # Extract text fields from packet
-    for key in fieldTextKeys:
-        if key in jsonData:
-            fields.append("{0}=\"{1}\"".format(key, jsonData.get(key)))
-
-    # Extract path
-    if "path" in jsonData:
-        fields.append(parsePath(jsonData.get("path")))
-
-    # Extract comment
-    if "comment" in jsonData:
-        comment = parseTextString(jsonData.get("comment"), "comment")
-        if len(jsonData.get("comment")) > 0:
-            fields.append(comment)
-
-    # Extract telemetry
-    fields = parseTelemetry(jsonData, fields)
-
-    # Extract weather data
-    fields = parseWeather(jsonData, fields)
-
-    # Extract raw packet
-    if "raw" in jsonData:
-        comment = parseTextString(jsonData.get("raw"), "raw")
-        if len(jsonData.get("raw")) > 0:
-            fields.append(comment)
-
-    # Extract APRS symbol
-    if "symbol" in jsonData:
-        comment = parseTextString(jsonData.get("symbol"), "symbol")
-        if len(jsonData.get("symbol")) > 0:
-            fields.append(comment)
-
-    # Extract APRS symbol table
-    if "symbol_table" in jsonData:
-        comment = parseTextString(jsonData.get("symbol_table"), "symbol_table")
-        if len(jsonData.get("symbol_table")) > 0:
-            fields.append(comment)
-
-    # Combine final valid line protocol string
-    fieldsStr = ",".join(fields)
-
-    return measurement + "," + tagStr + " " + fieldsStr
-
-
-def parseWX(jsonData):
-    """Parse WX APRS packets into influxedb line protocol
+    global packetErrors
+    logger.debug("Starting parse worker thread")
+    while (not stopping.is_set() or len(parseQueue)) and index < args.workers:
+        for line, received in parseQueue.get(64, 1):
+            try:
+                parseLine(aprslib, line, received)
+            except Exception:
+                packetErrors += 1
+                logger.error("Processing packet {0!r} failed".format(line), exc_info=True)
+    logger.debug("Parse worker thread {0} exiting".format(index))
 
-    keyword arguments:
-    jsonData -- aprslib parsed JSON packet
-    """
-    ## Schema
-    # measurement = packet*
-    # field = from
-    # field = to
-    # tag = format
-    # field = via
-    # field = wx_raw_timestamp
-    # field = comment
-    # field = humidity
-    # field = pressure
-    # field = rain_1h
-    # field = rain_24h
-    # field = rain_since_midnight
-    # field = temperature
-    # field = wind_direction
-    # field = wind_gust
-    # field = wind_speed
-    # field = path
-    # field = raw
-
-    # initialize variables
-    tags = []
-    fields = []
-
-    # Set measurement to "packet"
-    measurement = "packet"
-
-    # Obtain tags
-    tags.append("format={0}".format(jsonData.get("format")))
-
-    # Join tags into comma separated string
-    tagStr = ",".join(tags)
-
-    # Create field key lists to iterate through
-    fieldTextKeys = ["from", "to", "via"]
-
-    # Extract text fields from packet
-    for key in fieldTextKeys:
-        if key in jsonData:
-            fields.append("{0}=\"{1}\"".format(key, jsonData.get(key)))
-
-    # Extract path
-    if "path" in jsonData:
-        fields.append(parsePath(jsonData.get("path")))
-
-    # Extract comment
-    if "comment" in jsonData:
-        comment = parseTextString(jsonData.get("comment"), "comment")
-        if len(jsonData.get("comment")) > 0:
-            fields.append(comment)
-
-    # Extract raw from packet
-    if "raw" in jsonData:
-        comment = parseTextString(jsonData.get("raw"), "raw")
-        if len(jsonData.get("raw")) > 0:
-            fields.append(comment)
-
-    # Extract wx_raw_timestamp from packet
-    if "wx_raw_timestamp" in jsonData:
-        rawtimestamp = parseTextString(jsonData.get("wx_raw_timestamp"), "wx_raw_timestamp")
-        if len(jsonData.get("wx_raw_timestamp")) > 0:
-            fields.append(rawtimestamp)
-
-    # Obtain weather data
-    fields = parseWeather(jsonData, fields)
-
-    # Combine final valid line protocol string
-    fieldsStr = ",".join(fields)
-
-    return measurement + "," + tagStr + " " + fieldsStr
-
-
-def parseBeacon(jsonData):
-    """Parse Beacon APRS packets into influxedb line protocol
+
+def parseLine(aprslib, line, received):
+    """Parse a raw packet and hand it on to processPacket()
 
     keyword arguments:
-    jsonData -- aprslib parsed JSON packet
+    aprslib -- the aprslib module
+    line -- raw APRS-IS packet bytes
+    received -- unix time the packet was received
     """
-    ## Schema
-    # measurement = packet
-    # field = from
-    # field = to
-    # tag = format
-    # field = via
-    # field = text
-    # field = path
-    # field = raw
-
-    # initialize variables
-    tags = []
-    fields = []
-
-    # Set measurement to "packet"
-    measurement = "packet"
-
-    # Obtain tags
-    tags.append("format={0}".format(jsonData.get("format")))
+    started = time.time()
+    trace = line.trace if line.__class__ is tracing.TracedLine else None
+    if trace is not None:
+        trace.mark(tracing.DEQUEUE)
+
+    # Repeated payloads reuse the parsing and encoding of the first
+    entry = packet = None
+    if packetCache is not None:
+        key = packetcache.cacheKey(line)
+        entry = packetCache.get(key, received)
+        if entry is not None:
+            packet = entry.repeat(line)
+    hit = packet is not None
+
+    if packet is None:
+        try:
+            packet = aprslib.parse(line)
 
-    # Join tags into comma separated string
-    tagStr = ",".join(tags)
+        except aprslib.exceptions.UnknownFormat as e:
+            # aprslib does not parse T# telemetry reports
+            packet = telemetry.parseReport(line)
+            if packet is None:
+                logger.debug("Unable to parse packet: {0}".format(e))
+                return
 
-    # Create field key lists to iterate through
-    fieldTextKeys = ["from", "to", "via"]
+        except aprslib.exceptions.ParseError as e:
+            # Same handling as aprslib consumer, not an error
+            logger.debug("Unable to parse packet: {0}".format(e))
+            return
 
-    # Extract text fields from packet
-    for key in fieldTextKeys:
-        if key in jsonData:
-            fields.append("{0}=\"{1}\"".format(key, jsonData.get(key)))
+        # Share callsigns and path hops with earlier packets
+        lineprotocol.sharedStrings.internPacket(packet)
+        if packetCache is not None:
+            entry = packetCache.add(key, packet)
 
-    # Extract path
-    if "path" in jsonData:
-        fields.append(parsePath(jsonData.get("path")))
+    if trace is not None:
+        trace.mark(tracing.PARSE)
+    processPacket(packet, received, entry, trace)
+    if packetCache is not None:
+        packetCache.record(hit, time.time() - started)
 
-    # Extract text
-    if "text" in jsonData:
-        comment = parseTextString(jsonData.get("text"), "text")
-        if len(jsonData.get("text")) > 0:
-            fields.append(comment)
 
-    # Extract raw packet
-    if "raw" in jsonData:
-        comment = parseTextString(jsonData.get("raw"), "raw")
-        if len(jsonData.get("raw")) > 0:
-            fields.append(comment)
+def startWorker(index):
+    """Start parse worker thread number index and return it
 
-    # Combine final valid line protocol string
-    fieldsStr = ",".join(fields)
+    keyword arguments:
+    index -- worker number used in the thread name
+    """
+    thread = threading.Thread(target=parseWorker, args=(index,), name="parser{0}".format(index))
+    thread.daemon = True
+    thread.start()
+    return thread
 
-    return measurement + "," + tagStr + " " + fieldsStr
 
+def checkWorkers(workerThreads):
+    """Restart parse worker threads which ended before shutdown
 
-def parseBulletin(jsonData):
-    """Parse Bulletin APRS packets into influxedb line protocol
+    Also resizes the pool to --workers after a reload: missing workers are
+    started and retired workers, which exit on their own, are removed once
+    they ended.
 
     keyword arguments:
-    jsonData -- aprslib parsed JSON packet
+    workerThreads -- list of parse worker threads, changed in place
     """
-    ## Schema
-    # measurement = packet
-    # field = from
-    # field = to
-    # tag = format
-    # field = via
-    # field = message_text
-    # field = bid
-    # field = identifier
-    # field = path
-    # field = raw
-
-    # initialize variables
-    tags = []
-    fields = []
-
-    # Set measurement to "packet"
-    measurement = "packet"
-
-    # Obtain tags
-    tags.append("format={0}".format(jsonData.get("format")))
-
-    # Join tags into comma separated string
-    tagStr = ",".join(tags)
-
-    # Create field key lists to iterate through
-    fieldNumKeys = ["bid"]
-    fieldTextKeys = ["from", "to", "via"]
-
-    # Extract number fields from packet
-    for key in fieldNumKeys:
-        if key in jsonData:
-            fields.append("{0}={1}".format(key, jsonData.get(key)))
-
-    # Extract text fields from packet
-    for key in fieldTextKeys:
-        if key in jsonData:
-            fields.append("{0}=\"{1}\"".format(key, jsonData.get(key)))
-
-    # Extract path
-    if "path" in jsonData:
-        fields.append(parsePath(jsonData.get("path")))
-
-    # Extract message text
-    if "message_text" in jsonData:
-        message = parseTextString(jsonData.get("message_text"), "message_text")
-        if len(jsonData.get("message_text")) > 0:
-            fields.append(message)
-
-    # Extract identifier
-    if "identifier" in jsonData:
-        identifier = parseTextString(jsonData.get("identifier"), "identifier")
-        if len(jsonData.get("identifier")) > 0:
-            fields.append(identifier)
-
-    # Extract raw packet
-    if "raw" in jsonData:
-        comment = parseTextString(jsonData.get("raw"), "raw")
-        if len(jsonData.get("raw")) > 0:
-            fields.append(comment)
-
-    # Combine final valid line protocol string
-    fieldsStr = ",".join(fields)
-
-    return measurement + "," + tagStr + " " + fieldsStr
-
-
-def parseMessage(jsonData):
-    """Parse Message APRS packets into influxedb line protocol
+    if stopping.is_set():
+        return
+    for index, thread in enumerate(workerThreads[:args.workers]):
+        if not thread.is_alive():
+            logger.error("Parse worker {0} stopped unexpectedly, restarting it".format(thread.name))
+            workerThreads[index] = startWorker(index)
+
+    # Grow the pool, or forget retired workers which finished their batch
+    while len(workerThreads) < args.workers:
+        workerThreads.append(startWorker(len(workerThreads)))
+    while len(workerThreads) > args.workers and not workerThreads[-1].is_alive():
+        workerThreads.pop()
 
-    keyword arguments:
-    jsonData -- aprslib parsed JSON packet
-    """
-    ## Schema
-    # measurement = packet
-    # field = from
-    # field = to
-    # tag = format
-    # field = via
-    # field = addresse
-    # field = message_text
-    # field = path
-    # field = raw
-    # field = msgNo
-    # field = response
-
-    # initialize variables
-    tags = []
-    fields = []
-
-    # Set measurement to "packet"
-    measurement = "packet"
-
-    # Obtain tags
-    tags.append("format={0}".format(jsonData.get("format")))
-
-    # Join tags into comma separated string
-    tagStr = ",".join(tags)
-
-    # Create field key lists to iterate through
-    fieldNumKeys = ["msgNo"]
-    fieldTextKeys = ["from", "to", "via", "addresse"]
-
-    # Extract number fields from packet
-    for key in fieldNumKeys:
-        if key in jsonData:
-            fields.append("{0}={1}".format(key, jsonData.get(key)))
-
-    # Extract text fields from packet
-    for key in fieldTextKeys:
-        if key in jsonData:
-            fields.append("{0}=\"{1}\"".format(key, jsonData.get(key)))
-
-    # Extract path
-    if "path" in jsonData:
-        fields.append(parsePath(jsonData.get("path")))
-
-    # Extract message text
-    if "message_text" in jsonData:
-        message = parseTextString(jsonData.get("message_text"), "message_text")
-        if len(jsonData.get("message_text")) > 0:
-            fields.append(message)
-
-    # Extract response
-    if "response" in jsonData:
-        message = parseTextString(jsonData.get("response"), "response")
-        if len(jsonData.get("response")) > 0:
-            fields.append(message)
-
-    # Extract raw from packet
-    if "raw" in jsonData:
-        comment = parseTextString(jsonData.get("raw"), "raw")
-        if len(jsonData.get("raw")) > 0:
-            fields.append(comment)
-
-    # Combine final valid line protocol string
-    fieldsStr = ",".join(fields)
-
-    return measurement + "," + tagStr + " " + fieldsStr
-
-
-def parseTelemetryScaling(jsonData):
-    """Parse Telemetry-Message APRS scaling value packets into influxedb line protocol
+
+def processPacket(packet, received, cached=None, trace=None):
+    """Encode a parsed packet and queue it for the writers of its shard
 
     keyword arguments:
-    jsonData -- aprslib parsed JSON packet
+    packet -- aprslib parsed JSON packet
+    received -- unix time the packet was received
+    cached -- optional packetcache.CachedPacket of the packet's payload
+    trace -- tracing.Trace of a sampled packet, None for others
     """
+    # Count digipeaters and iGates of the path for the next summary
+    if pathStats is not None:
+        pathStats.count(packet.get("path"), received)
+
+    # Move raw packet into the local archive instead of the database
+    if rawArchive is not None and "raw" in packet:
+        rawArchive.write(packet.get("from"), packet.pop("raw"), received)
+
+    # Columnar export of the fields the encoder writes
+    if columnarExport is not None:
+        columnarExport.write(packet, received)
+
+    # Export only runs skip encoding, but keep the telemetry metadata the
+    # export scales channels with
+    if not writePoints:
+        if packet.get("format") in lineprotocol.METADATA_FORMATS:
+            jsonToLineProtocol(packet, received)
+        return
+
+    # Parse the packet into line protocol, timestamped on reception since
+    # points are written in batches
+    if cached is None:
+        line = jsonToLineProtocol(packet, received)
+    else:
+        line = cached.encode(packet, received)
 
-    # Parse packet for equations
-    equations = parseEquations(jsonData)
-
-    if equations:
-        # If equations present, then add to dictionary of station
-        # This is not ideal but required until Grafana supports SELECT queries
-        # in templates.
-        telemetryDictionary[jsonData.get("from")] = equations
+    # Check for line protocol string
+    if line:
+        priority = pipeline.FORMAT_PRIORITY.get(packet.get("format"), pipeline.LOW)
+        targets = router.route(packet)
+        if trace is not None:
+            line = tracer.point(line, trace, len(targets))
+            trace.mark(tracing.ENQUEUE)
+        for writer in targets:
+            writer.add(line, priority)
 
 
-def parseTextString(rawText, name):
-    '''Parse text strings for invalid characters. Properly escape for
-    line protocol strings if found.
+def connectInfluxDB(options):
+    """Connect to influxdb database with configuration values
 
     keyword arguments:
-    rawText -- String to be checked
-    name -- Name of field
-    '''
+    options -- parsed options of the writer's shard
+    """
+    from influxdb import InfluxDBClient
 
-    # Check if length is valid
-    if len(rawText) > 0:
-        try:
-            # Convert to ASCII and replace invalid characters
-            text = rawText.encode('ascii', 'replace')
-            text = text.replace("\\", "\\\\")
-            text = text.replace("\'", "\\\'")
-            text = text.replace("\"", "\\\"")
+    return InfluxDBClient(options.dbhost,
+                          options.dbport,
+                          options.dbuser,
+                          options.dbpassword,
+                          options.dbname)
 
-            # Create valide libe protocol field string
-            textStr = ("{0}=\"{1}\"".format(name, text))
 
-        except UnicodeError as e:
-            logger.error(e)
+def createSink(options):
+    """Create the output sink selected by configuration values
 
-        except TypeError as e:
-            logger.error(e)
+    keyword arguments:
+    options -- parsed options of the writer's shard
+    """
 
-        # Return text string if line protocol format
-        return textStr
+    if options.sink == "file":
+        return sinks.FileSink(options.sinkpath, options.dbname)
 
-    else:
-        # rawText is <= 0
-        # Return text string if line protocol format
-        return rawText
+    if options.sink == "stdout":
+        return sinks.StdoutSink()
 
+    if options.sink == "udp":
+        return sinks.UDPSink(options.dbhost, options.udpport, options.udpmtu)
 
-def parsePath(path):
-    """Take path and turn into a string
+    if options.sink == "none":
+        return sinks.NullSink()
 
-    keyword arguments:
-    path -- list of paths from aprslib
-    """
+    return sinks.InfluxDBSink(connectInfluxDB(options), options.dbname)
 
-    # Join path items into a string separated by commas, valid line protocol
-    temp = ",".join(path)
-    pathStr = ("path=\"{0}\"".format(temp))
 
-    # Return line protocol string
-    return pathStr
+def createController():
+    """Create the batch size controller of a writer, None for fixed batches"""
+    if not args.writelatency:
+        return None
+    return BatchController(args.minbatchsize, max(args.minbatchsize, args.maxbatchsize), args.writelatency)
 
 
-def callback(packet):
-    """aprslib callback for every packet received from APRS-IS connection
+def createWriters():
+    """Create the writer stage, one writer with its own queue and sink per shard
 
-    keyword arguments:
-    packet -- APRS-IS packet from aprslib connection
+    Without --shardby there is a single writer using the main options.
+    Returns the list of writers and the ShardRouter choosing between them.
+    Raises ValueError for invalid shard sections.
     """
-    # Open a new connection to influxdb, parse the packet into line protocol
-    influxConn = connectInfluxDB()
-    line = jsonToLineProtocol(packet)
+    shardList = config.loadShards(args.config) if args.config and args.shardby else []
+    if args.shardby and not shardList:
+        raise ValueError("--shardby {0} requires [shard:NAME] sections in the configuration file".format(args.shardby))
+
+    deadLetter = DeadLetter(args.deadletter)
+    writers = []
+    formats = []
+    regions = []
+    for name, options in shardList or [("", {})]:
+        # Shard sections override the main sink options
+        shardArgs = copy.copy(args)
+        for key in config.SHARD_OPTIONS:
+            if key in options:
+                setattr(shardArgs, key, type(getattr(args, key))(options[key]))
+        if shardArgs.sink not in SINKS:
+            raise ValueError("Unknown sink {0} in shard {1}".format(shardArgs.sink, name))
+
+        names = set(config.splitList(options.get("formats", "")))
+        for unknown in names.difference(lineprotocol.SCHEMAS):
+            raise ValueError("Unknown packet format {0} in shard {1}".format(unknown, name))
+        formats.append(names)
+        regions.append(shards.parseRegion(options["region"]) if "region" in options else None)
+
+        queue = pipeline.BoundedQueue(" ".join(["write", name]).strip(), args.queuesize, args.overload, args.samplerate)
+        writers.append(BatchWriter(createSink(shardArgs), args.batchsize, args.flushinterval, queue,
+                                   args.retries, args.retrydelay, deadLetter, createController(), tracer))
+
+    return writers, shards.ShardRouter(writers, args.shardby, formats, regions)
+
+
+def reportRecovery(server, recover, gap):
+    """Write an APRS-IS reconnect as a point of the aprsis measurement
 
-    # Check for line protocol string
-    if line:
-        # Write string to database
-        try:
-            influxConn.write_points([line], protocol='line')
+    keyword arguments:
+    server -- host:port reconnected to
+    recover -- seconds from losing the connection to logging in again
+    gap -- seconds without packets
+    """
+    fields = ["recover={0}".format(recover), "gap={0}".format(gap), "reconnects={0}".format(supervisor.reconnects)]
+    line = lineprotocol.finishLine("aprsis", ["server=" + server], fields, time.time())
+    for writer in router.route({}):
+        writer.add(line, pipeline.HIGH)
 
-        except StandardError:
-            # An error occured before writing to influxdb
-            logger.error('A StandardError occured', exc_info=True)
 
-        except influxdb.exceptions.InfluxDBClientError:
-            # An error occured in the request
-            logger.error('An error occured in the request', exc_info=True)
-            logger.error("Line Protocol: {0}".format(line))
+def writePathStats():
+    """Write the digipeater and iGate summary of the packets since the last one"""
+    for line in pathStats.flush():
+        for writer in router.route({}):
+            writer.add(line, pipeline.NORMAL)
 
-        except influxdb.exceptions.InfluxDBServerError:
-            # An error occured in the server
-            logger.error('An error occured in the server', exc_info=True)
-            logger.error("Line Protocol: {0}".format(line))
 
+def pathSummary(interval):
+    """Path summary thread, writes the path measurement every interval
 
-def connectInfluxDB():
-    """Connect to influxdb database with configuration values"""
+    keyword arguments:
+    interval -- seconds between summaries
+    """
+    logger.debug("Starting path summary thread")
+    while not shutdownRequested.wait(interval):
+        writePathStats()
 
-    return InfluxDBClient(args.dbhost,
-                          args.dbport,
-                          args.dbuser,
-                          args.dbpassword,
-                          args.dbname)
 
+def replay(path):
+    """Replay thread, feeds recorded raw packets to the parse stage
 
-def consumer(conn):
-    """Start consumer function for thread
+    Lines are raw APRS-IS packets, optionally prefixed with their unix
+    receive time and a tab like the decompressed raw archive. Packets without
+    a time are timestamped when read. Packets with equal times, such as the
+    millisecond times of the raw archive, are spread by RECEIVE_STEP.
+    Shutdown is requested at the end of the file.
 
     keyword arguments:
-    conn -- APRS-IS connection from aprslib
+    path -- file of raw packets, gzip compressed if ending in .gz, - for
+            standard input
+    """
+    global replayed
+    if path == "-":
+        source = getattr(sys.stdin, "buffer", sys.stdin)
+    elif path.endswith(".gz"):
+        source = gzip.open(path, "rb")
+    else:
+        source = open(path, "rb")
+
+    logger.debug("Replaying packets from {0}".format(path))
+    try:
+        for line in source:
+            if shutdownRequested.is_set():
+                break
+            line = line.rstrip(b"\r\n")
+            if not line or line.startswith(b"#"):
+                continue
+
+            # Raw archive records start with the receive time
+            received = None
+            stamp, tab, raw = line.partition(b"\t")
+            if tab:
+                try:
+                    received = float(stamp)
+                    line = raw
+                except ValueError:
+                    pass
+
+            replayed += 1
+            if lineprotocol.wantsRaw(line):
+                if tracer is not None:
+                    line = tracer.sampleLine(line)
+                received = receiveTimes(received or time.time(), 1)
+                parseQueue.put((line, received), pipeline.rawPriority(line))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    logger.warning("Replayed {0} packets from {1}".format(replayed, path))
+    shutdownRequested.set()
+
+
+def connectAPRSIS():
+    """Create the supervised APRS-IS connection and start receiving
+
+    Returns the APRS-IS connection and the supervisor's connection thread.
+    A heartbeat thread periodically sends status packets to APRS-IS in order
+    to keep the connection alive.
     """
+    # Start login for APRS-IS
+    logger.info("Logging into APRS-IS {0} as {1} on port {2}".format(args.host, args.callsign, args.port))
+    if args.callsign == "nocall":
+        logger.warning("APRS-IS ignores the callsign \"nocall\"!")
 
-    logger.debug("starting consumer thread")
+    try:
+        servers = parseServers(args.host, args.port)
+    except ValueError as e:
+        logger.error(e)
+        sys.exit(1)
+
+    # Create APRS-IS connection, the supervisor connects it
+    passcode = aprsis.passcode(args.callsign)
+    AIS = aprsis.APRSIS(args.callsign,
+                        passwd=passcode,
+                        host=servers[0][0],
+                        port=servers[0][1],
+                        bufferSize=args.receivebuffer)
+
+    # Set server side filter, sent again on reconnects
+    if args.filter:
+        AIS.setFilter(args.filter)
+
+    # Connect, consume and reconnect on failures or stalls
+    global supervisor
+    supervisor = Supervisor(AIS, servers, callback, args.stalltimeout, reportRecovery)
+    t2 = supervisor.start()
+
+    # Create heartbeat
+    t1 = threading.Thread(target=heartbeat, args=(args.callsign, args.interval))
+    t1.daemon = True
+    t1.start()
 
-    # Obtain raw APRS-IS packets and sent to callback when received
-    conn.consumer(callback, immortal=True, raw=False)
+    return AIS, t2
 
 
-def heartbeat(conn, callsign, interval):
+def heartbeat(callsign, interval):
     """Send out an APRS status message to keep connection alive
 
+    Heartbeats are skipped while the supervisor is reconnecting.
+
     keyword arguments:
-    conn -- APRS-IS connction from aprslib
     callsign -- Callsign of status message
     interval -- Minutes between status messages
     """
@@ -1114,13 +715,147 @@ def heartbeat(conn, callsign, interval):
 
         # Create APRS status message
         status = "{0}>APRS,TCPIP*:>aprs2influxdb heartbeat {1}"
-        conn.sendall(status.format(callsign, timestamp))
-        logger.debug("Sent heartbeat")
+        if supervisor.send(status.format(callsign, timestamp)):
+            logger.debug("Sent heartbeat")
+        else:
+            logger.debug("Skipped heartbeat, not connected")
 
         # Sleep for specified time
         time.sleep(float(interval) * 60)  # Sent every interval minutes
 
 
+def logTraces():
+    """Log the latency distribution of each stage over the recent traced packets"""
+    rows = tracer.summary()
+    logger.warning("Traced {0} of {1} sampled packets, latency of the last {2} in ms (median/90%/99%/max):".format(
+        tracer.finished, tracer.sampled, len(tracer.traces)))
+    for name, count, median, p90, p99, longest in rows:
+        logger.warning("  {0:<12} {1:.3f}/{2:.3f}/{3:.3f}/{4:.3f}".format(name, median * 1e3, p90 * 1e3, p99 * 1e3, longest * 1e3))
+
+
+def requestShutdown(signum, frame):
+    """Signal handler for SIGTERM and SIGINT, a second signal exits at once"""
+    if shutdownRequested.is_set():
+        logger.warning("Exiting without writing queued packets")
+        os._exit(1)
+    logger.warning("Received signal {0}, shutting down".format(signum))
+    shutdownRequested.set()
+
+
+def shutdown(consumerThread, workerThreads, started):
+    """Stop receiving, write queued packets and flush state before exiting
+
+    Stages are stopped in pipeline order so each one drains into the next.
+    Whatever is still queued after --shutdowntimeout seconds is lost, a
+    replay writes every packet read without a deadline. Files and sinks are
+    only closed once the threads using them ended.
+
+    keyword arguments:
+    consumerThread -- supervisor connection thread
+    workerThreads -- list of parse worker threads
+    started -- unix time the program started
+    """
+    # Joins with a timeout keep the signal handlers running on Python 2
+    deadline = time.time() + (REPLAY_TIMEOUT if args.replay else args.shutdowntimeout)
+
+    # Stop reading from APRS-IS, the parse workers exit once the queue is empty
+    if supervisor is not None:
+        supervisor.stop()
+    consumerThread.join(max(0, deadline - time.time()))
+    stopping.set()
+    for thread in workerThreads:
+        thread.join(max(0, deadline - time.time()))
+    parsed = not any(thread.is_alive() for thread in workerThreads)
+    if not parsed:
+        logger.error("Shutdown timeout, parse workers still running with {0} packets queued".format(len(parseQueue)))
+
+    # Summarize the paths of the last packets parsed
+    if pathStats is not None:
+        writePathStats()
+
+    # Writers exit once their queues are empty
+    stopped = []
+    for writer in writers:
+        if writer.stop(max(0, deadline - time.time())):
+            stopped.append(writer)
+        else:
+            logger.error("Shutdown timeout, {0} points not written".format(len(writer.queue)))
+
+    # Flush files and state
+    if parsed:
+        if rawArchive is not None:
+            rawArchive.close()
+        if columnarExport is not None:
+            columnarExport.close()
+    elif rawArchive is not None or columnarExport is not None:
+        logger.error("Parse workers still running, raw archive and export files left unfinished")
+    for writer in stopped:
+        writer.sink.close()
+    if len(stopped) == len(writers) and writers and writers[0].deadLetter is not None:
+        writers[0].deadLetter.close()
+    if args.telemetrystate:
+        try:
+            lineprotocol.telemetryCache.save(args.telemetrystate)
+        except (IOError, OSError) as e:
+            logger.error("Unable to save telemetry state: {0}".format(e))
+    if args.fieldtypes:
+        try:
+            lineprotocol.fieldTypes.save(args.fieldtypes)
+        except (IOError, OSError) as e:
+            logger.error("Unable to save field types: {0}".format(e))
+
+    # Throughput summary
+    elapsed = max(time.time() - started, 1e-3)
+    received = replayed if supervisor is None else supervisor.packets
+    written = sum(writer.written for writer in writers)
+    logger.warning("Ran {0:.0f} s, received {1} packets ({2:.1f}/s), wrote {3} points ({4:.1f}/s)".format(
+        elapsed, received, received / elapsed, written, written / elapsed))
+    logger.warning("Failed {0}, rejected {1}, retried {2} writes, {3} reconnects".format(
+        sum(writer.failed for writer in writers), sum(writer.rejected for writer in writers),
+        sum(writer.retried for writer in writers), 0 if supervisor is None else supervisor.reconnects))
+    shared = lineprotocol.sharedStrings
+    if shared.maxSize:
+        logger.warning("Shared {0} strings and paths, {1:.1%} of {2} lookups found a shared one".format(
+            len(shared), shared.hits / float(max(1, shared.hits + shared.misses)), shared.hits + shared.misses))
+    if packetCache is not None and packetCache.hits + packetCache.misses:
+        logger.warning("Packet cache of {0} payloads hit {1} of {2} packets ({3:.1%}), saving about {4:.1f} s of parsing and encoding".format(
+            len(packetCache), packetCache.hits, packetCache.hits + packetCache.misses,
+            packetCache.hits / float(packetCache.hits + packetCache.misses), packetCache.savedSeconds()))
+    if packetErrors:
+        logger.error("Processing {0} packets failed with an unexpected error".format(packetErrors))
+    if packetcache.templateErrors:
+        logger.error("Encoding {0} cached packets from their template failed, encoded them in full".format(packetcache.templateErrors))
+    if tracer is not None and tracer.finished:
+        logTraces()
+    if pathStats is not None:
+        logger.warning("Summarized the paths of {0} packets in {1} points".format(pathStats.packets, pathStats.points))
+    if floodLimiter is not None:
+        total = floodLimiter.passed + floodLimiter.dropped
+        logger.warning("Throttled {0} of {1} packets ({2:.1%}) from {3} flooding stations, most: {4}".format(
+            floodLimiter.dropped, total, floodLimiter.dropped / float(max(1, total)), floodLimiter.throttledStations,
+            ", ".join("{0} ({1})".format(callsign, packets) for callsign, packets in floodLimiter.top()) or "none"))
+    if columnarExport is not None:
+        logger.warning("Exported {0} rows to {1} files".format(columnarExport.rows, columnarExport.files))
+    for writer in writers:
+        if isinstance(writer.sink, sinks.UDPSink):
+            logger.warning("{0} sent {1} points in {2} UDP datagrams of {3} bytes, {4} datagrams dropped".format(
+                writer.queue.name, writer.sink.linesSent, writer.sink.datagramsSent, writer.sink.bytesSent,
+                writer.sink.datagramsDropped))
+    for queue in [parseQueue] + [writer.queue for writer in writers]:
+        # Packets left in a queue are lost
+        log = logger.error if len(queue) else logger.warning
+        log("{0} queue shed packets by priority low/normal/high: {1}, {2} left".format(
+            queue.name, "/".join(str(count) for count in queue.shed), len(queue)))
+    for writer in writers:
+        if writer.controller is not None:
+            logger.warning("{0} batch size {1} ({2} to {3}), write latency {4:.3f} s (target {5} s), error rate {6:.2f}".format(
+                writer.queue.name, writer.batchSize, writer.controller.minSize, writer.controller.maxSize,
+                writer.controller.latency, writer.controller.targetLatency, writer.controller.errorRate))
+    for (measurement, field), count in sorted(lineprotocol.fieldTypes.quarantined.items()):
+        logger.warning("Quarantined {0} values of {1} field {2}.{3}".format(
+            count, lineprotocol.fieldTypes.types.get((measurement, field)), measurement, field))
+
+
 def createLog(path, debug=False):
     """Create a rotating log at the specified path and return logger
 
@@ -1128,7 +863,8 @@ def createLog(path, debug=False):
     path -- path to log file
     debug -- Boolean to set DEBUG log level,
     """
-    tempLogger = logging.getLogger(__name__)
+    # Package logger so module loggers such as lineprotocol propagate to it
+    tempLogger = logging.getLogger("aprs2influxdb")
 
     # Add handler for rotating file
     handler = TimedRotatingFileHandler(path,
@@ -1153,57 +889,151 @@ def createLog(path, debug=False):
 def main():
     """Main function of aprs2influxdb
 
-    Reads in configuration values and starts connection to APRS-IS with aprslib.
-    Then two threads are started, one to monitor for APRS-IS packets and
-    another to periodically send status packets to APRS-IS in order to keep
-    the connection alive.
+    Reads in configuration values, starts the writer and parse worker threads
+    and the supervised connection to APRS-IS, or the replay of a file of raw
+    packets.
     """
+    # Parse command line and configuration file options
+    global args
+    args = parseArguments()
+
     # Create logger, must be global for functions and threads
     global logger
 
-    # Create telemetry dictionary
-    global telemetryDictionary
-    telemetryDictionary = {}
-
     # Log to sys.prefix + aprs2influxdb.log
     log = os.path.join(sys.prefix, "aprs2influxdb.log")
     logger = createLog(log, args.debug)
 
-    # Start login for APRS-IS
-    logger.info("Logging into APRS-IS as {0} on port {1}".format(args.callsign, args.port))
-    if args.callsign == "nocall":
-        logger.warning("APRS-IS ignores the callsign \"nocall\"!")
+    # Field types of the previous run, overridden by the configuration file
+    try:
+        if args.fieldtypes:
+            lineprotocol.fieldTypes.load(args.fieldtypes)
+        configureFieldTypes()
+    except (IOError, OSError, ValueError) as e:
+        logger.error("Unable to load field types: {0}".format(e))
+        sys.exit(1)
+
+    # Compile the formats and fields to encode once
+    try:
+        configurePlan()
+    except ValueError as e:
+        logger.error(e)
+        sys.exit(1)
+
+    # Rate limit flooding stations before parsing, packets replayed from a
+    # file are never throttled
+    global floodLimiter
+    floodLimiter = None
+    try:
+        configureFloodLimiter()
+    except ValueError as e:
+        logger.error(e)
+        sys.exit(1)
+
+    # Create optional raw packet archive
+    global rawArchive
+    rawArchive = None
+    if args.rawarchive:
+        try:
+            rawArchive = RawArchive(args.rawarchive, args.rawcompression)
+        except (ImportError, ValueError) as e:
+            logger.error(e)
+            sys.exit(1)
+
+    # Create optional columnar export
+    global columnarExport
+    columnarExport = None
+    if args.export:
+        try:
+            columnarExport = columnar.ColumnarExport(args.export, args.exportformat)
+        except (ImportError, ValueError) as e:
+            logger.error(e)
+            sys.exit(1)
 
-    # Open APRS-IS connection
-    passcode = aprslib.passcode(args.callsign)
-    AIS = aprslib.IS(args.callsign,
-                     passwd=passcode,
-                     port=args.port)
+    # Replayed packets are never shed, the stages wait for each other instead
+    if args.replay and args.overload != "block":
+        logger.info("Replaying with the block overload policy")
+        args.overload = "block"
 
-    # Set aprslib logger equal to aprs2influxdb logger
-    AIS.logger = logger
+    started = time.time()
 
-    # Connect to APRS-IS servers
+    # Bound the strings shared between packets and the repeated payloads
+    lineprotocol.sharedStrings.maxSize = args.internsize
+    global packetCache
+    packetCache = None
+    configurePacketCache()
+
+    # Restore telemetry metadata of the previous run
+    if args.telemetrystate:
+        try:
+            lineprotocol.telemetryCache.load(args.telemetrystate)
+        except (IOError, OSError, ValueError) as e:
+            logger.error("Unable to load telemetry state: {0}".format(e))
+
+    # Trace the latency of sampled packets through all stages
+    global tracer
+    tracer = tracing.Tracer(args.tracerate, args.tracesize) if args.tracerate > 0 else None
+
+    # Create writer stage, must be global for the parse workers
+    global writers, router
     try:
-        AIS.connect()
+        writers, router = createWriters()
+    except ValueError as e:
+        logger.error(e)
+        sys.exit(1)
+    warmFieldTypes()
+    for writer in writers:
+        writer.start()
+
+    # Points are only encoded if a writer has a destination for them
+    global writePoints
+    writePoints = not all(isinstance(writer.sink, sinks.NullSink) for writer in writers)
+
+    # Count digipeaters and iGates, summarized by their own thread
+    global pathStats
+    pathStats = None
+    if args.pathstats > 0:
+        pathStats = PathStats()
+        thread = threading.Thread(target=pathSummary, args=(args.pathstats,), name="pathsummary")
+        thread.daemon = True
+        thread.start()
+
+    # Create parse stage fed by the consumer callback
+    global parseQueue
+    parseQueue = pipeline.BoundedQueue("parse", args.queuesize, args.overload, args.samplerate)
+    workerThreads = [startWorker(worker) for worker in range(args.workers)]
+
+    # Receive from APRS-IS or replay a file
+    global supervisor, replayed
+    supervisor = None
+    replayed = 0
+    if args.replay:
+        AIS = None
+        t2 = threading.Thread(target=replay, args=(args.replay,), name="replay")
+        t2.daemon = True
+        t2.start()
+    else:
+        AIS, t2 = connectAPRSIS()
 
-    except aprslib.exceptions.LoginError:
-        # An error occured
-        logger.error('An aprslib LoginError occured', exc_info=True)
+    # Reload configuration on SIGHUP where supported
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: reloadConfig(AIS))
 
-    except aprslib.exceptions.ConnectionError:
-        # An error occured
-        logger.error('An aprslib ConnectionError occured', exc_info=True)
+    # Log the traced latencies on SIGUSR1 where supported
+    if tracer is not None and hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: logTraces())
 
-    # Create heartbeat
-    t1 = threading.Thread(target=heartbeat, args=(AIS, args.callsign, args.interval))
+    # Drain queues and exit on SIGTERM or SIGINT
+    signal.signal(signal.SIGTERM, requestShutdown)
+    signal.signal(signal.SIGINT, requestShutdown)
 
-    # Create consumer
-    t2 = threading.Thread(target=consumer, args=(AIS,))
+    # Keep main thread responsive to signals until shutdown is requested
+    # and the parse workers running
+    while not shutdownRequested.is_set():
+        time.sleep(1)
+        checkWorkers(workerThreads)
 
-    # Start threads
-    t1.start()
-    t2.start()
+    shutdown(t2, workerThreads, started)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,231 @@
+"""APRS-IS client reading the packet stream in batches
+
+APRS-IS sends one packet per line, interleaved with server comment lines
+starting with #. The client logs in itself and receives with recv_into()
+into one large preallocated buffer through a memoryview, finds the line ends
+in place and hands every received chunk on as a batch of raw packet lines.
+Each packet is copied exactly once, from the buffer into the bytes object
+passed downstream, comment lines are skipped by their first byte without
+being copied and a partial line at the end of the buffer is only moved to
+the front when little room is left.
+"""
+import logging
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Software name and version sent when logging in
+SOFTWARE = "aprs2influxdb"
+VERSION = "0.2.1"
+
+# Bytes received into the buffer before a partial line is moved to the front
+MIN_RECEIVE = 16384
+
+# Byte values compared while splitting lines
+COMMENT = ord("#")
+CR = ord("\r")
+
+
+class APRSISError(IOError):
+    """The APRS-IS connection failed or was lost"""
+
+
+class LoginError(APRSISError):
+    """The APRS-IS server did not accept the login"""
+
+
+def passcode(callsign):
+    """Return the APRS-IS passcode of a callsign, the SSID is ignored
+
+    keyword arguments:
+    callsign -- callsign with or without SSID
+    """
+    code = 0x73e2
+    for index, char in enumerate(callsign.split("-")[0].upper()):
+        code ^= ord(char) << (0 if index % 2 else 8)
+    return code & 0x7fff
+
+
+class APRSIS(object):
+    """Connection to an APRS-IS server delivering batches of raw packets
+
+    keyword arguments:
+    callsign -- login callsign
+    passwd -- passcode, -1 logs in receive only
+    host -- APRS-IS server host
+    port -- APRS-IS server port
+    bufferSize -- bytes of the receive buffer
+    timeout -- seconds to wait for connecting and logging in
+    """
+
+    def __init__(self, callsign, passwd=-1, host="rotate.aprs.net", port=10152, bufferSize=262144, timeout=10):
+        self.callsign = callsign
+        self.passwd = passwd
+        self.server = (host, int(port))
+        self.filter = ""
+        self.timeout = timeout
+        self.sock = None
+        self.lock = threading.Lock()
+
+        # Receive buffer, bytes [start:end] are received but not yet split
+        self.buffer = bytearray(bufferSize)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+        # Bytes received and server comment lines skipped
+        self.received = 0
+        self.comments = 0
+
+    def setServer(self, host, port):
+        """Set the server used by the next connect()
+
+        keyword arguments:
+        host -- APRS-IS server host
+        port -- APRS-IS server port
+        """
+        self.server = (host, int(port))
+
+    def setFilter(self, filterText):
+        """Set the server side filter, sent to the server if connected
+
+        keyword arguments:
+        filterText -- APRS-IS filter, empty for none
+        """
+        self.filter = filterText
+        if self.sock is not None and filterText:
+            try:
+                self.sendall("#filter {0}".format(filterText))
+            except (socket.error, APRSISError) as e:
+                # The next login sends the filter
+                logger.warning("Sending filter to APRS-IS failed: {0}".format(e))
+
+    def connect(self):
+        """Connect and log in, raises APRSISError or LoginError on failure"""
+        self.close()
+        try:
+            self.sock = socket.create_connection(self.server, self.timeout)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+            # Servers greet with a comment line before the login
+            banner = self.readLine()
+            if not banner.startswith(b"#"):
+                raise APRSISError("Unexpected APRS-IS greeting {0!r}".format(banner))
+
+            login = "user {0} pass {1} vers {2} {3}".format(self.callsign, self.passwd, SOFTWARE, VERSION)
+            if self.filter:
+                login += " filter " + self.filter
+            self.sendall(login)
+
+            # Packets may already follow the login response in the buffer
+            response = self.readLine()
+            while not response.startswith(b"# logresp"):
+                response = self.readLine()
+            if b" unverified" in response and str(self.passwd) != "-1":
+                raise LoginError("APRS-IS login as {0} failed, incorrect passcode".format(self.callsign))
+            if b"verified" not in response:
+                raise LoginError("APRS-IS login failed: {0}".format(response.decode("latin-1")))
+
+            self.sock.settimeout(None)
+            logger.debug("Logged into APRS-IS: {0}".format(response.decode("latin-1")))
+
+        except socket.error as e:
+            self.close()
+            raise APRSISError(str(e))
+        except APRSISError:
+            self.close()
+            raise
+
+    def close(self):
+        """Close the connection, discarding any partial line"""
+        sock, self.sock = self.sock, None
+        self.start = self.end = 0
+        if sock is not None:
+            sock.close()
+
+    def sendall(self, line):
+        """Send a line to the server, raises APRSISError if not connected
+
+        keyword arguments:
+        line -- APRS packet or server command without line ending
+        """
+        sock = self.sock
+        if sock is None:
+            raise APRSISError("Not connected to APRS-IS")
+        with self.lock:
+            sock.sendall((line + "\r\n").encode("utf-8"))
+
+    def receive(self):
+        """Receive into the free end of the buffer, return the bytes received"""
+        buffer = self.buffer
+
+        # Make room by moving a partial line to the front, or drop a line
+        # too long for the buffer
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif len(buffer) - self.end < MIN_RECEIVE:
+            if self.start == 0:
+                logger.warning("Dropping APRS-IS line longer than {0} bytes".format(len(buffer) - MIN_RECEIVE))
+                self.end = 0
+            else:
+                buffer[:self.end - self.start] = self.view[self.start:self.end].tobytes()
+                self.end -= self.start
+            self.start = 0
+
+        received = self.sock.recv_into(self.view[self.end:])
+        if not received:
+            raise APRSISError("APRS-IS connection closed")
+        self.end += received
+        self.received += received
+        return received
+
+    def readLine(self):
+        """Return the next line including comments, used while logging in"""
+        while True:
+            newline = self.buffer.find(b"\n", self.start, self.end)
+            if newline >= 0:
+                line = self.view[self.start:newline].tobytes().rstrip(b"\r")
+                self.start = newline + 1
+                return line
+            self.receive()
+
+    def splitLines(self):
+        """Return the complete packet lines received, skipping comments"""
+        buffer = self.buffer
+        view = self.view
+        find = buffer.find
+        end = self.end
+        start = self.start
+        lines = []
+        while True:
+            newline = find(b"\n", start, end)
+            if newline < 0:
+                break
+            stop = newline - 1 if newline > start and buffer[newline - 1] == CR else newline
+            if stop > start:
+                if buffer[start] == COMMENT:
+                    self.comments += 1
+                else:
+                    lines.append(view[start:stop].tobytes())
+            start = newline + 1
+        self.start = start
+        return lines
+
+    def consumer(self, callback):
+        """Receive until the connection fails, calling callback with each batch
+
+        Raises APRSISError when the connection is lost or closed.
+
+        keyword arguments:
+        callback -- called with a list of raw packet bytes per receive
+        """
+        try:
+            lines = self.splitLines()
+            while True:
+                if lines:
+                    callback(lines)
+                self.receive()
+                lines = self.splitLines()
+        except socket.error as e:
+            raise APRSISError(str(e))
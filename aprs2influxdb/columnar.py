@@ -0,0 +1,343 @@
+"""Columnar export of parsed packets to hourly Parquet or Arrow IPC files
+
+Offline analysis over months of traffic is slow to pull out of InfluxDB. The
+export accumulates the fields of every packet into typed column buffers per
+format and writes them as row groups to one file per format and UTC hour:
+
+    DIRECTORY/format=wx/hour=2017101912/part-1508436000.parquet
+
+The columns follow the encoding plan and field types of the line protocol
+encoder: the receive time, the dictionary encoded format and source callsign,
+then every planned field in schema order. Telemetry channels keep their
+positional analogN and bitN names since station names differ per station.
+pyarrow is only required when exporting.
+"""
+import os
+import threading
+import time
+
+from aprs2influxdb import fieldtypes
+from aprs2influxdb import lineprotocol
+from aprs2influxdb import telemetry
+
+# File name extensions per supported file format
+EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Columns written for every format ahead of the planned fields
+TIME = "time"
+FORMAT = "format"
+CALLSIGN = "from"
+
+
+def arrowType(fieldType):
+    """Return the pyarrow type of a field type
+
+    keyword arguments:
+    fieldType -- one of fieldtypes.TYPES
+    """
+    import pyarrow
+
+    return {
+        fieldtypes.FLOAT: pyarrow.float64(),
+        fieldtypes.INTEGER: pyarrow.int64(),
+        fieldtypes.STRING: pyarrow.string(),
+        fieldtypes.BOOLEAN: pyarrow.bool_(),
+    }[fieldType]
+
+
+def columnValue(value, fieldType):
+    """Return a value converted for a column of a field type
+
+    Returns None for values which cannot be converted, like formatValue()
+    of the line protocol encoder.
+
+    keyword arguments:
+    value -- field value from aprslib
+    fieldType -- one of fieldtypes.TYPES
+    """
+    try:
+        if fieldType == fieldtypes.FLOAT:
+            number = float(value)
+            if number - number == 0:
+                return number
+
+        elif fieldType == fieldtypes.INTEGER:
+            number = float(value)
+            if number - number == 0 and number == int(number):
+                return int(number)
+
+        elif fieldType == fieldtypes.STRING:
+            if isinstance(value, bytes):
+                return value.decode("utf-8", "replace")
+            return u"{0}".format(value)
+
+        elif fieldType == fieldtypes.BOOLEAN:
+            if isinstance(value, (bool, int)):
+                return bool(value)
+            text = lineprotocol.BOOLEANS.get(str(value).strip().lower())
+            if text is not None:
+                return text == "true"
+
+    except (TypeError, ValueError, OverflowError, UnicodeError):
+        pass
+    return None
+
+
+def planColumns(name, steps):
+    """Return the (column, kind, field type) list of a format's plan
+
+    keyword arguments:
+    name -- packet format
+    steps -- list of (key, kind, names) steps from lineprotocol.compilePlan()
+    """
+    measurement = lineprotocol.MEASUREMENTS.get(name, "packet")
+    columns = []
+    for key, kind, names in steps:
+        for field in names or [key]:
+            if field in (TIME, FORMAT, CALLSIGN):
+                continue
+            fieldType = lineprotocol.fieldTypes.get(measurement, field, lineprotocol.defaultType(kind, field))
+            columns.append((field, kind, fieldType))
+    return columns
+
+
+def packetValues(packet, steps):
+    """Yield the raw value of every planned field of a packet, None if missing
+
+    Values are yielded in the order of planColumns(). Telemetry is scaled
+    and bits evaluated with the station's metadata like the encoder does.
+
+    keyword arguments:
+    packet -- aprslib parsed JSON packet
+    steps -- list of (key, kind, names) steps of the packet's format
+    """
+    for key, kind, names in steps:
+        if kind == lineprotocol.PATH:
+            value = packet.get(key)
+            yield None if value is None else lineprotocol.sharedStrings.joinPath(value)
+
+        elif names is None:
+            if key != CALLSIGN:
+                yield packet.get(key)
+
+        elif kind == lineprotocol.WEATHER:
+            items = packet.get("weather") or {}
+            for field in names:
+                yield items.get(field)
+
+        else:
+            # Telemetry in comments or T# reports, by position
+            items = packet.get("telemetry") or {}
+            values = list(items.get("vals") or []) + [None] * 5
+            bits = items.get("bits")
+            entry = lineprotocol.telemetryCache.get(packet.get("from")) if kind == lineprotocol.CHANNELS else None
+            equations = lineprotocol.telemetryCache.equations(packet.get("from")) if entry is None else entry["equations"]
+            sense = telemetry.DEFAULT_SENSE if entry is None else entry["sense"]
+            for field in names:
+                if field == "seq":
+                    yield items.get("seq")
+                elif field == "bits":
+                    yield bits
+                elif field.startswith("analog"):
+                    channel = int(field[6:]) - 1
+                    value = values[channel]
+                    if value is not None:
+                        a, b, c = equations[channel]
+                        value = a * value * value + b * value + c
+                    yield value
+                else:
+                    bit = int(field[3:]) - 1
+                    yield None if bits is None or len(bits) <= bit else bits[bit] == sense[bit]
+
+
+class FormatBuffer(object):
+    """Column buffers and open output file of one packet format
+
+    keyword arguments:
+    name -- packet format
+    steps -- list of (key, kind, names) steps of the format
+    """
+
+    def __init__(self, name, steps):
+        self.name = name
+        self.steps = steps
+        self.columns = planColumns(name, steps)
+        self.measurement = lineprotocol.MEASUREMENTS.get(name, "packet")
+        self.times = []
+        self.callsigns = []
+        self.values = [[] for column in self.columns]
+        self.hour = None
+        self.writer = None
+        self.schema = None
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, packet, timestamp):
+        """Add a packet to the column buffers
+
+        keyword arguments:
+        packet -- aprslib parsed JSON packet of the format
+        timestamp -- unix receive time of the packet
+        """
+        self.times.append(int(timestamp * 1e6))
+        self.callsigns.append(columnValue(packet.get(CALLSIGN), fieldtypes.STRING))
+        for index, value in enumerate(packetValues(packet, self.steps)):
+            if value is None:
+                self.values[index].append(None)
+                continue
+            column, kind, fieldType = self.columns[index]
+            converted = columnValue(value, fieldType)
+            if converted is None:
+                lineprotocol.fieldTypes.quarantine(self.measurement, column, value)
+            self.values[index].append(converted)
+
+    def createSchema(self):
+        """Return the pyarrow schema of the format's columns"""
+        import pyarrow
+
+        dictionary = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+        fields = [pyarrow.field(TIME, pyarrow.timestamp("us", tz="UTC")),
+                  pyarrow.field(FORMAT, dictionary),
+                  pyarrow.field(CALLSIGN, dictionary)]
+        fields.extend(pyarrow.field(column, arrowType(fieldType)) for column, kind, fieldType in self.columns)
+        return pyarrow.schema(fields)
+
+    def table(self):
+        """Return the buffered rows as a pyarrow Table and empty the buffers"""
+        import pyarrow
+
+        arrays = [pyarrow.array(self.times, pyarrow.timestamp("us", tz="UTC")),
+                  pyarrow.array([self.name] * len(self.times), pyarrow.string()).dictionary_encode(),
+                  pyarrow.array(self.callsigns, pyarrow.string()).dictionary_encode()]
+        for values, field in zip(self.values, list(self.schema)[3:]):
+            arrays.append(pyarrow.array(values, field.type))
+
+        self.times = []
+        self.callsigns = []
+        self.values = [[] for column in self.columns]
+        return pyarrow.Table.from_arrays(arrays, schema=self.schema)
+
+
+class ColumnarExport(object):
+    """Hourly partitioned Parquet or Arrow IPC export of parsed packets
+
+    The column layout of each format is fixed when its first packet of an
+    hour arrives, plan changes apply from the next hour.
+
+    keyword arguments:
+    directory -- directory to write the partitions to
+    fileFormat -- "parquet" (default) or "arrow"
+    blockSize -- rows per format buffered before a row group is written
+    blockAge -- maximum seconds rows are buffered before being written
+    """
+
+    def __init__(self, directory, fileFormat="parquet", blockSize=10000, blockAge=60):
+        if fileFormat not in EXTENSIONS:
+            raise ValueError("Unsupported export format {0}".format(fileFormat))
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Columnar export requires the pyarrow package")
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.directory = directory
+        self.fileFormat = fileFormat
+        self.blockSize = blockSize
+        self.blockAge = blockAge
+        self.lock = threading.Lock()
+
+        # Buffers per format and the time of the last write
+        self.buffers = {}
+        self.lastFlush = time.time()
+
+        # Rows and files written
+        self.rows = 0
+        self.files = 0
+
+    def write(self, packet, timestamp=None):
+        """Add a parsed packet to the export
+
+        Packets of formats which are not in the encoding plan are ignored.
+
+        keyword arguments:
+        packet -- aprslib parsed JSON packet
+        timestamp -- receive time, defaults to now
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        name = packet.get("format")
+
+        with self.lock:
+            buffer = self.buffers.get(name)
+            if buffer is None:
+                steps = lineprotocol.plan.get(name)
+                if not steps:
+                    return
+                buffer = self.buffers[name] = FormatBuffer(name, steps)
+
+            # Rotate hourly, writing the pending rows into the old file
+            hour = int(timestamp // 3600)
+            if hour != buffer.hour:
+                self._flushBuffer(buffer)
+                self._closeFile(buffer)
+                if buffer.steps is not lineprotocol.plan.get(name):
+                    buffer = self.buffers[name] = FormatBuffer(name, lineprotocol.plan.get(name) or buffer.steps)
+                buffer.hour = hour
+
+            buffer.append(packet, timestamp)
+            if len(buffer) >= self.blockSize:
+                self._flushBuffer(buffer)
+
+            # Packets of rare formats are written at least every blockAge
+            now = time.time()
+            if now - self.lastFlush >= self.blockAge:
+                self.lastFlush = now
+                for pending in self.buffers.values():
+                    self._flushBuffer(pending)
+
+    def flush(self):
+        """Write out all buffered rows"""
+        with self.lock:
+            for buffer in self.buffers.values():
+                self._flushBuffer(buffer)
+
+    def close(self):
+        """Write out all buffered rows and close the open files"""
+        with self.lock:
+            for buffer in self.buffers.values():
+                self._flushBuffer(buffer)
+                self._closeFile(buffer)
+
+    def _openFile(self, buffer):
+        import pyarrow
+
+        hour = time.strftime("%Y%m%d%H", time.gmtime(buffer.hour * 3600))
+        directory = os.path.join(self.directory, "format=" + buffer.name, "hour=" + hour)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # Files are not appendable, a new part is started after restarts
+        path = os.path.join(directory, "part-{0:.0f}{1}".format(time.time(), EXTENSIONS[self.fileFormat]))
+        buffer.schema = buffer.createSchema()
+        if self.fileFormat == "parquet":
+            import pyarrow.parquet
+            buffer.writer = pyarrow.parquet.ParquetWriter(path, buffer.schema)
+        else:
+            buffer.writer = pyarrow.RecordBatchFileWriter(path, buffer.schema)
+        self.files += 1
+
+    def _closeFile(self, buffer):
+        if buffer.writer is not None:
+            buffer.writer.close()
+        buffer.writer = None
+
+    def _flushBuffer(self, buffer):
+        if not len(buffer):
+            return
+        if buffer.writer is None:
+            self._openFile(buffer)
+        self.rows += len(buffer)
+        buffer.writer.write_table(buffer.table())
@@ -0,0 +1,215 @@
+"""Configuration file support for aprs2influxdb
+
+Configuration files use INI syntax with a single [aprs2influxdb] section whose
+keys are the long command line option names without leading dashes, e.g.
+
+    [aprs2influxdb]
+    dbhost = influx.example.com
+    callsign = KB1LQC
+    debug = true
+
+An optional [fields] section limits the fields written per packet format,
+keys are aprslib format names and values comma separated field names:
+
+    [fields]
+    mic-e = latitude, longitude, speed, course, from
+
+An optional [fieldtypes] section sets the InfluxDB type of fields, keys are
+measurement.field and values float, integer, string or boolean:
+
+    [fieldtypes]
+    packet.msgNo = string
+
+An optional [floodrates] section sets the packets per minute a station may
+send of an aprslib format before it is throttled, overriding --floodrate:
+
+    [floodrates]
+    message = 60
+
+With --shardby, each [shard:NAME] section adds an output shard. Its keys
+override the database and sink options for that shard, and formats or region
+select the packets it takes:
+
+    [shard:europe]
+    dbhost = influx-eu.example.com
+    region = 35, -25, 72, 45
+"""
+import argparse
+
+try:
+    import configparser
+except ImportError:
+    import ConfigParser as configparser
+
+# Section holding aprs2influxdb options
+SECTION = "aprs2influxdb"
+
+# Section holding per format field allow-lists
+FIELDS_SECTION = "fields"
+
+# Section holding field types by measurement.field
+FIELD_TYPES_SECTION = "fieldtypes"
+
+# Section holding flood limiter rates per format
+FLOOD_RATES_SECTION = "floodrates"
+
+# Prefix of sections defining output shards
+SHARD_PREFIX = "shard:"
+
+# Options a shard section may override, and its routing keys
+SHARD_OPTIONS = ["dbhost", "dbport", "dbuser", "dbpassword", "dbname", "sink", "sinkpath", "udpport", "udpmtu"]
+SHARD_ROUTING = ["formats", "region"]
+
+
+def loadConfig(path, parser):
+    """Read a configuration file and return a dictionary of option values
+
+    Keys are validated against the options known to the argument parser and
+    boolean options are converted from their textual form. Raises ValueError
+    if the file cannot be read or contains unknown options.
+
+    keyword arguments:
+    path -- path to INI configuration file
+    parser -- argparse.ArgumentParser defining the valid options
+    """
+    config = configparser.RawConfigParser()
+    if not config.read(path):
+        raise ValueError("Unable to read configuration file {0}".format(path))
+    if not config.has_section(SECTION):
+        return {}
+
+    # Defaults are used to validate keys and recognize boolean switches
+    defaults = vars(parser.parse_args([]))
+    values = {}
+    for option, value in config.items(SECTION):
+        key = option.replace("-", "_")
+        if key not in defaults or key == "config":
+            raise ValueError("Unknown option {0} in {1}".format(option, path))
+        if isinstance(defaults[key], bool):
+            values[key] = config.getboolean(SECTION, option)
+        else:
+            values[key] = value
+    return values
+
+
+def loadFieldLists(path):
+    """Read per format field allow-lists from a configuration file
+
+    Returns a dictionary of format name to list of field names, empty when
+    there is no [fields] section. Raises ValueError if the file cannot be
+    read.
+
+    keyword arguments:
+    path -- path to INI configuration file
+    """
+    config = configparser.RawConfigParser()
+    if not config.read(path):
+        raise ValueError("Unable to read configuration file {0}".format(path))
+    if not config.has_section(FIELDS_SECTION):
+        return {}
+
+    return dict((option, splitList(value)) for option, value in config.items(FIELDS_SECTION))
+
+
+def loadFieldTypes(path):
+    """Read field types from a configuration file
+
+    Returns a dictionary of (measurement, field) to type name, empty when
+    there is no [fieldtypes] section. Field keys keep their case. Raises
+    ValueError if the file cannot be read or a key is not measurement.field.
+
+    keyword arguments:
+    path -- path to INI configuration file
+    """
+    config = configparser.RawConfigParser()
+    config.optionxform = str
+    if not config.read(path):
+        raise ValueError("Unable to read configuration file {0}".format(path))
+    if not config.has_section(FIELD_TYPES_SECTION):
+        return {}
+
+    types = {}
+    for option, value in config.items(FIELD_TYPES_SECTION):
+        measurement, _, field = option.partition(".")
+        if not measurement or not field:
+            raise ValueError("Field type key {0} in {1} is not measurement.field".format(option, path))
+        types[(measurement, field)] = value.strip().lower()
+    return types
+
+
+def loadFloodRates(path):
+    """Read flood limiter rates per format from a configuration file
+
+    Returns a dictionary of format name to packets per minute, empty when
+    there is no [floodrates] section. Raises ValueError if the file cannot be
+    read or a rate is not a number.
+
+    keyword arguments:
+    path -- path to INI configuration file
+    """
+    config = configparser.RawConfigParser()
+    if not config.read(path):
+        raise ValueError("Unable to read configuration file {0}".format(path))
+    if not config.has_section(FLOOD_RATES_SECTION):
+        return {}
+
+    rates = {}
+    for option, value in config.items(FLOOD_RATES_SECTION):
+        try:
+            rates[option] = float(value)
+        except ValueError:
+            raise ValueError("Flood rate {0} of {1} in {2} is not a number".format(value, option, path))
+    return rates
+
+
+def positiveInt(value):
+    """Argument type of counts which must be at least 1
+
+    Also applies to values read from the configuration file, which argparse
+    converts like command line values.
+
+    keyword arguments:
+    value -- option value string
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("{0} is not a whole number".format(value))
+    if number < 1:
+        raise argparse.ArgumentTypeError("{0} is less than 1".format(value))
+    return number
+
+
+def splitList(value):
+    """Split a comma separated option value into a list of stripped names
+
+    keyword arguments:
+    value -- comma separated string
+    """
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def loadShards(path):
+    """Read output shard sections from a configuration file
+
+    Returns a list of (name, options) tuples in file order, options being a
+    dictionary of the keys set in the section. Raises ValueError if the file
+    cannot be read or a section contains unknown keys.
+
+    keyword arguments:
+    path -- path to INI configuration file
+    """
+    config = configparser.RawConfigParser()
+    if not config.read(path):
+        raise ValueError("Unable to read configuration file {0}".format(path))
+
+    shards = []
+    for section in config.sections():
+        if not section.startswith(SHARD_PREFIX):
+            continue
+        options = dict(config.items(section))
+        for option in options:
+            if option not in SHARD_OPTIONS + SHARD_ROUTING:
+                raise ValueError("Unknown option {0} in [{1}] of {2}".format(option, section, path))
+        shards.append((section[len(SHARD_PREFIX):], options))
+    return shards
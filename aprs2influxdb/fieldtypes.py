@@ -0,0 +1,154 @@
+"""Registry of the InfluxDB type of every field written
+
+InfluxDB fixes the type of a field the first time it is written to a shard
+and rejects every later point giving it another type, which with batching
+fails the whole batch. aprslib returns some values with varying types, such
+as msgNo which is usually numeric but may be alphanumeric, so the encoder
+coerces each value to the type registered for its measurement and field:
+
+float -- numbers, the default for numeric fields
+integer -- whole numbers, written with the i suffix
+string -- quoted text, the default for text fields
+boolean -- true or false
+
+Values which cannot be coerced are quarantined: the field is left out of the
+point and counted. Types are taken from the encoder schemas, a local cache
+file, the [fieldtypes] configuration section and SHOW FIELD KEYS of the
+databases written to, later sources overriding earlier ones.
+"""
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+FLOAT = "float"
+INTEGER = "integer"
+STRING = "string"
+BOOLEAN = "boolean"
+TYPES = [FLOAT, INTEGER, STRING, BOOLEAN]
+
+
+class FieldRegistry(object):
+    """Field types by (measurement, field) and counts of quarantined values
+
+    keyword arguments:
+    types -- optional dictionary of (measurement, field) to type
+    """
+
+    def __init__(self, types=None):
+        self.types = dict(types or {})
+        self.lock = threading.Lock()
+
+        # Quarantined values by (measurement, field)
+        self.quarantined = {}
+
+    def __len__(self):
+        return len(self.types)
+
+    def get(self, measurement, field, default):
+        """Return the type of a field, registering default if it has none
+
+        keyword arguments:
+        measurement -- measurement name
+        field -- field key
+        default -- type used and registered for a new field
+        """
+        fieldType = self.types.get((measurement, field))
+        if fieldType is None:
+            fieldType = self.types.setdefault((measurement, field), default)
+        return fieldType
+
+    def lookup(self, measurement, field, default):
+        """Return the type of a field, or default without registering it
+
+        Used for field keys chosen by remote stations, such as telemetry
+        channel names, which would otherwise grow the registry and its cache
+        file without limit.
+
+        keyword arguments:
+        measurement -- measurement name
+        field -- field key
+        default -- type used if the field has none
+        """
+        return self.types.get((measurement, field), default)
+
+    def set(self, measurement, field, fieldType, source=None):
+        """Register the type of a field, replacing any earlier type
+
+        Raises ValueError for unknown types.
+
+        keyword arguments:
+        measurement -- measurement name
+        field -- field key
+        fieldType -- one of TYPES
+        source -- optional description logged if the type changes
+        """
+        if fieldType not in TYPES:
+            raise ValueError("Unknown field type {0} of {1}.{2}".format(fieldType, measurement, field))
+        previous = self.types.get((measurement, field))
+        if source is not None and previous is not None and previous != fieldType:
+            logger.warning("Field {0}.{1} is {2} in {3}, writing it as {2} instead of {4}".format(
+                measurement, field, fieldType, source, previous))
+        self.types[(measurement, field)] = fieldType
+
+    def quarantine(self, measurement, field, value):
+        """Count a value which could not be coerced to its field's type
+
+        The first value of each field is logged as a warning, later ones at
+        debug level.
+
+        keyword arguments:
+        measurement -- measurement name
+        field -- field key
+        value -- value left out of the point
+        """
+        with self.lock:
+            count = self.quarantined.get((measurement, field), 0) + 1
+            self.quarantined[(measurement, field)] = count
+        message = "Quarantined {0!r} of {1} field {2}.{3}".format(value, self.types.get((measurement, field)), measurement, field)
+        if count == 1:
+            logger.warning(message)
+        else:
+            logger.debug(message)
+
+    def warm(self, client, database):
+        """Register the field types of a database with SHOW FIELD KEYS
+
+        keyword arguments:
+        client -- influxdb.InfluxDBClient of the database
+        database -- database name, used in log messages
+        """
+        result = client.query("SHOW FIELD KEYS")
+        for (measurement, tags), points in result.items():
+            for point in points:
+                self.set(measurement, point["fieldKey"], point["fieldType"], "database " + database)
+
+    def save(self, path):
+        """Write the registered types to a JSON file, replacing it atomically
+
+        keyword arguments:
+        path -- cache file
+        """
+        measurements = {}
+        for (measurement, field), fieldType in list(self.types.items()):
+            measurements.setdefault(measurement, {})[field] = fieldType
+        temporary = path + ".tmp"
+        with open(temporary, "w") as cacheFile:
+            json.dump(measurements, cacheFile, indent=1, sort_keys=True)
+        os.rename(temporary, path)
+
+    def load(self, path):
+        """Register types written by save(), a missing file is not an error
+
+        keyword arguments:
+        path -- cache file
+        """
+        if not os.path.exists(path):
+            return
+        with open(path) as cacheFile:
+            measurements = json.load(cacheFile)
+        for measurement, fields in measurements.items():
+            for field, fieldType in fields.items():
+                self.set(measurement, field, fieldType)
@@ -0,0 +1,168 @@
+"""Per station flood limiting of raw packets before they are parsed
+
+Misconfigured stations and looping digipeaters can send hundreds of packets
+a minute, each of which would be parsed, encoded and written. Raw packets are
+therefore rate limited per source callsign and APRS data type identifier as
+soon as they arrive, with a token bucket allowing a burst of packets and then
+a steady rate per minute. Rates are set per aprslib format and apply to the
+data types parsing to that format.
+
+The buckets are kept in the generic cell rate algorithm form, a single float
+per station and data type holding the time its bucket will be full again, so
+the table stays compact and entries whose bucket has refilled carry no state
+and are expired. Allow-listed stations are only looked up for packets which
+would be throttled.
+"""
+import logging
+
+from aprs2influxdb import lineprotocol
+
+logger = logging.getLogger(__name__)
+
+# Seconds between sweeps of expired buckets
+SWEEP_INTERVAL = 60
+
+
+def typeRates(rate, formatRates=None):
+    """Return the packets per minute allowed by APRS data type identifier
+
+    Data types which can parse to several formats get the highest rate of
+    those formats, data types not listed use the default rate.
+
+    keyword arguments:
+    rate -- default packets per minute
+    formatRates -- optional dictionary of aprslib format to packets per minute
+    """
+    formatRates = formatRates or {}
+    rates = {}
+    for dataType, formats in lineprotocol.RAW_FORMATS.items():
+        rates[dataType] = max(formatRates.get(name, rate) for name in formats)
+    return rates
+
+
+class FloodLimiter(object):
+    """Token bucket rate limits per station and data type of raw packets
+
+    keyword arguments:
+    rate -- packets per minute allowed per station and data type
+    burst -- packets allowed at once before the rate applies
+    formatRates -- optional dictionary of aprslib format to packets per minute
+    allow -- optional list of callsigns never limited, a trailing * matches
+             callsigns starting with the text before it
+    maxStations -- maximum buckets kept, the least busy are dropped beyond it
+    """
+
+    def __init__(self, rate=20, burst=20, formatRates=None, allow=None, maxStations=50000):
+        self.configure(rate, burst, formatRates, allow)
+        self.maxStations = maxStations
+
+        # Time each bucket is full again by station and data type
+        self.buckets = {}
+        self.lastSweep = 0
+
+        # Packets passed and throttled, throttled packets by station and
+        # stations throttled, the least throttled evicted beyond maxStations
+        self.passed = 0
+        self.dropped = 0
+        self.throttled = {}
+        self.throttledStations = 0
+
+    def configure(self, rate, burst, formatRates=None, allow=None):
+        """Set the rates, burst and allow-list, keeping the current buckets
+
+        keyword arguments:
+        rate -- packets per minute allowed per station and data type
+        burst -- packets allowed at once before the rate applies
+        formatRates -- optional dictionary of aprslib format to packets per minute
+        allow -- optional list of callsigns or callsign prefixes ending with *
+        """
+        allow = allow or []
+        self.rate = rate
+        self.burst = max(1, burst)
+
+        # Seconds between packets by data type, 0 for unlimited
+        self.intervals = dict((dataType, 60.0 / typeRate if typeRate > 0 else 0)
+                              for dataType, typeRate in typeRates(rate, formatRates).items())
+        self.interval = 60.0 / rate if rate > 0 else 0
+        self.allowed = set(callsign.encode() for callsign in allow if not callsign.endswith("*"))
+        self.allowedPrefixes = tuple(callsign[:-1].encode() for callsign in allow if callsign.endswith("*"))
+
+    def allow(self, line, now):
+        """Return True if a raw packet is within its station's rate
+
+        keyword arguments:
+        line -- raw APRS-IS packet bytes
+        now -- unix time the packet was received
+        """
+        body = line.find(b":") + 1
+        dataType = line[body:body + 1]
+        interval = self.intervals.get(dataType, self.interval)
+        if not interval:
+            self.passed += 1
+            return True
+
+        # A full bucket allows burst packets at once
+        key = dataType + line[:line.find(b">")]
+        full = self.buckets.get(key, now)
+        if full < now:
+            full = now
+        if full - now <= (self.burst - 1) * interval:
+            self.buckets[key] = full + interval
+            self.passed += 1
+            if now - self.lastSweep >= SWEEP_INTERVAL or len(self.buckets) > self.maxStations:
+                self.sweep(now)
+            return True
+
+        return self.throttle(key[1:])
+
+    def throttle(self, source):
+        """Count a packet above its station's rate, return True if allow-listed
+
+        keyword arguments:
+        source -- source callsign bytes of the packet
+        """
+        if source in self.allowed or (self.allowedPrefixes and source.startswith(self.allowedPrefixes)):
+            self.passed += 1
+            return True
+
+        self.dropped += 1
+        count = self.throttled.get(source)
+        if count is None:
+            # Reported once, counts are logged on exit
+            if len(self.throttled) >= self.maxStations:
+                self.evict()
+            self.throttledStations += 1
+            logger.warning("Throttling flooding station {0}".format(source.decode("utf-8", "replace")))
+            count = 0
+        self.throttled[source] = count + 1
+        return False
+
+    def evict(self):
+        """Forget the least throttled half of the throttled stations
+
+        The most throttled stations keep their counts for the exit summary.
+        """
+        busiest = sorted(self.throttled.items(), key=lambda item: item[1])[-max(1, self.maxStations // 2):]
+        self.throttled = dict(busiest)
+
+    def sweep(self, now):
+        """Expire refilled buckets, then drop the least busy if still too many
+
+        keyword arguments:
+        now -- current unix time
+        """
+        self.lastSweep = now
+        self.buckets = dict((key, full) for key, full in self.buckets.items() if full > now)
+        if len(self.buckets) > self.maxStations:
+            busiest = sorted(self.buckets.items(), key=lambda item: item[1])[-max(1, self.maxStations // 2):]
+            self.buckets = dict(busiest)
+            logger.warning("Flood limiter tracking over {0} stations, dropped the least busy".format(self.maxStations))
+
+    def top(self, count=10):
+        """Return the (callsign, throttled packets) of the most throttled stations
+
+        keyword arguments:
+        count -- number of stations
+        """
+        stations = sorted(self.throttled.items(), key=lambda item: -item[1])[:count]
+        return [(source.decode("utf-8", "replace"), packets) for source, packets in stations]
@@ -0,0 +1,109 @@
+"""Bounded tables sharing repeated strings between packets
+
+aprslib creates new string objects for the callsigns and path hops of every
+packet although a few thousand stations and digipeaters make up most of the
+traffic. Interning them right after parsing lets per-station caches, export
+buffers and counters hold one shared object per distinct string instead of
+one per packet. Formatted path strings are memoized by their tuple of hops,
+so the path of a station is joined once instead of for every packet.
+
+Tables are bounded by generations: once the current generation is full it
+becomes the previous one and a new generation starts, strings still in use
+are carried over on their next lookup and the rest are dropped.
+"""
+
+# Packet keys holding callsigns and other often repeated strings
+PACKET_KEYS = ["from", "to", "via", "addresse", "object_name"]
+
+
+class InternTable(object):
+    """Generational table mapping strings and hop tuples to shared objects
+
+    keyword arguments:
+    maxSize -- entries per generation, 0 disables sharing
+    """
+
+    def __init__(self, maxSize=20000):
+        self.maxSize = maxSize
+        self.current = {}
+        self.previous = {}
+
+        # Lookups which found a shared object and which added one
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.current) + len(self.previous)
+
+    def _store(self, key, value):
+        # Start a new generation when the current one is full
+        if len(self.current) >= self.maxSize:
+            self.previous = self.current
+            self.current = {}
+        self.current[key] = value
+        return value
+
+    def intern(self, value):
+        """Return the shared object equal to a string
+
+        keyword arguments:
+        value -- string to share
+        """
+        shared = self.current.get(value)
+        if shared is not None:
+            self.hits += 1
+            return shared
+        if not self.maxSize:
+            return value
+
+        shared = self.previous.get(value)
+        if shared is None:
+            self.misses += 1
+            shared = value
+        else:
+            self.hits += 1
+        return self._store(shared, shared)
+
+    def joinPath(self, hops):
+        """Return the hops of a path joined with commas, memoized by hop tuple
+
+        keyword arguments:
+        hops -- list of path hop strings
+        """
+        key = tuple(hops)
+        path = self.current.get(key)
+        if path is not None:
+            self.hits += 1
+            return path
+        if not self.maxSize:
+            return ",".join(hops)
+
+        path = self.previous.get(key)
+        if path is None:
+            self.misses += 1
+            path = ",".join(hops)
+        else:
+            self.hits += 1
+        return self._store(key, path)
+
+    def internPacket(self, packet):
+        """Replace the callsigns and path hops of a parsed packet by shared objects
+
+        keyword arguments:
+        packet -- aprslib parsed JSON packet, changed in place
+        """
+        if not self.maxSize:
+            return packet
+        for key in PACKET_KEYS:
+            value = packet.get(key)
+            if value:
+                packet[key] = self.intern(value)
+        path = packet.get("path")
+        if path:
+            packet["path"] = [self.intern(hop) for hop in path]
+        return packet
+
+    def clear(self):
+        """Drop all shared objects"""
+        self.current = {}
+        self.previous = {}
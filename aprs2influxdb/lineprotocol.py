@@ -0,0 +1,805 @@
+"""APRS packet to influxdb line protocol encoding
+
+The parsing and encoding core of aprs2influxdb. This module only depends on the
+standard library so it can be imported by tools and tests without loading the
+APRS-IS and influxdb client libraries.
+"""
+import logging
+import math
+import threading
+import types
+
+from aprs2influxdb import fieldtypes
+from aprs2influxdb import interning
+from aprs2influxdb import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Telemetry metadata per station from telemetry-message packets
+telemetryCache = telemetry.TelemetryCache()
+
+# Type of every field written, values are coerced to it
+fieldTypes = fieldtypes.FieldRegistry()
+
+# Callsigns and path hops shared between packets, joined paths by hop tuple
+sharedStrings = interning.InternTable()
+
+# Types written as float without coercion when finite
+try:
+    INTEGERS = (int, long)
+except NameError:
+    INTEGERS = (int,)
+NUMBERS = INTEGERS + (float,)
+
+# Errors of malformed packets, without KeyboardInterrupt and SystemExit
+try:
+    ENCODE_ERRORS = StandardError
+except NameError:
+    ENCODE_ERRORS = Exception
+
+# Textual values accepted for boolean fields
+BOOLEANS = {"true": "true", "t": "true", "yes": "true", "y": "true", "1": "true",
+            "false": "false", "f": "false", "no": "false", "n": "false", "0": "false"}
+
+# Per thread state, the reusable field list
+local = threading.local()
+
+
+def lineFields():
+    """Return the calling thread's reusable list of field strings, emptied
+
+    Used by the parse functions in place of a new list per packet, so encoding
+    a packet only allocates the field strings and the final line.
+    """
+    fields = getattr(local, "fields", None)
+    if fields is None:
+        fields = local.fields = []
+    else:
+        del fields[:]
+    return fields
+
+
+def finishLine(measurement, tags, fields, timestamp=None):
+    """Combine measurement, tags, fields and timestamp into one line protocol string
+
+    keyword arguments:
+    measurement -- measurement name
+    tags -- list of "key=value" tag strings
+    fields -- list of "key=value" field strings
+    timestamp -- optional unix time in seconds, written in nanoseconds
+    """
+    return joinLine(",".join([measurement] + tags) + " ", fields, timestamp)
+
+
+def joinLine(header, fields, timestamp=None):
+    """Append fields and timestamp to a "measurement,tags " header
+
+    keyword arguments:
+    header -- measurement and tag set followed by a space
+    fields -- list of "key=value" field strings
+    timestamp -- optional unix time in seconds, written in nanoseconds
+    """
+    if timestamp is None:
+        return header + ",".join(fields)
+    return header + ",".join(fields) + " %d" % (timestamp * 1e9)
+
+
+# Kinds of fields in a format schema
+NUMBER = "number"  # numeric value written as is
+TEXT = "text"  # string value quoted as is
+ESCAPED = "escaped"  # string escaped with escapeString, omitted if empty
+PATH = "path"  # path list joined with commas
+TELEMETRY = "telemetry"  # telemetry fields from parseTelemetry
+WEATHER = "weather"  # weather fields from parseWeather
+CHANNELS = "channels"  # named telemetry channels from parseChannels
+
+# Field type written for each kind of schema entry and telemetry channel
+KIND_TYPES = {
+    NUMBER: fieldtypes.FLOAT,
+    TEXT: fieldtypes.STRING,
+    ESCAPED: fieldtypes.STRING,
+    PATH: fieldtypes.STRING,
+    TELEMETRY: fieldtypes.FLOAT,
+    WEATHER: fieldtypes.FLOAT,
+    CHANNELS: fieldtypes.FLOAT,
+}
+BIT_TYPE = fieldtypes.BOOLEAN
+
+
+def defaultType(kind, field):
+    """Return the type a field of a kind of schema entry is written as
+
+    keyword arguments:
+    kind -- kind of schema entry
+    field -- field key
+    """
+    if kind == CHANNELS and field.startswith("bit"):
+        return BIT_TYPE
+    return KIND_TYPES[kind]
+
+
+# Fields written by the TELEMETRY, CHANNELS and WEATHER schema entries
+TELEMETRY_FIELDS = ["seq", "bits", "analog1", "analog2", "analog3", "analog4", "analog5"]
+CHANNEL_FIELDS = ["seq"] + telemetry.DEFAULT_KEYS
+WEATHER_FIELDS = ["humidity", "pressure", "rain_1h", "rain_24h", "rain_since_midnight", "temperature", "wind_direction", "wind_gust", "wind_speed"]
+WEATHER_PREFIXES = dict((key, key + "=") for key in WEATHER_FIELDS)
+
+# Fields of each supported aprslib format in line protocol order. Formats are
+# written to the "packet" measurement tagged with their format unless listed
+# in MEASUREMENTS.
+SCHEMAS = {
+    "uncompressed": [
+        ("latitude", NUMBER), ("longitude", NUMBER), ("posambiguity", NUMBER),
+        ("altitude", NUMBER), ("speed", NUMBER), ("course", NUMBER),
+        ("from", TEXT), ("to", TEXT), ("messagecapable", TEXT), ("phg", TEXT),
+        ("rng", TEXT), ("via", TEXT),
+        ("path", PATH),
+        ("comment", ESCAPED), ("raw", ESCAPED), ("symbol", ESCAPED),
+        ("symbol_table", ESCAPED), ("raw_timestamp", ESCAPED),
+        ("telemetry", TELEMETRY),
+        ("weather", WEATHER),
+    ],
+    "mic-e": [
+        ("latitude", NUMBER), ("longitude", NUMBER), ("posambiguity", NUMBER),
+        ("altitude", NUMBER), ("speed", NUMBER), ("course", NUMBER),
+        ("mbits", NUMBER),
+        ("from", TEXT), ("via", TEXT), ("to", TEXT), ("mtype", TEXT),
+        ("daodatumbyte", TEXT),
+        ("path", PATH),
+        ("comment", ESCAPED), ("raw", ESCAPED), ("symbol", ESCAPED),
+        ("symbol_table", ESCAPED),
+    ],
+    "object": [
+        ("latitude", NUMBER), ("longitude", NUMBER), ("posambiguity", NUMBER),
+        ("speed", NUMBER), ("course", NUMBER), ("timestamp", NUMBER),
+        ("altitude", NUMBER),
+        ("from", TEXT), ("alive", TEXT), ("via", TEXT), ("to", TEXT),
+        ("object_format", TEXT), ("object_name", TEXT), ("rng", TEXT),
+        ("daodatumbyte", TEXT),
+        ("path", PATH),
+        ("comment", ESCAPED),
+        ("telemetry", TELEMETRY),
+        ("raw", ESCAPED), ("symbol", ESCAPED), ("symbol_table", ESCAPED),
+        ("raw_timestamp", ESCAPED),
+    ],
+    "status": [
+        ("timestamp", NUMBER),
+        ("from", TEXT), ("via", TEXT), ("to", TEXT),
+        ("path", PATH),
+        ("telemetry", TELEMETRY),
+        ("status", ESCAPED), ("raw", ESCAPED), ("raw_timestamp", ESCAPED),
+    ],
+    "compressed": [
+        ("latitude", NUMBER), ("longitude", NUMBER), ("gpsfixstatus", NUMBER),
+        ("altitude", NUMBER), ("speed", NUMBER), ("course", NUMBER),
+        ("timestamp", NUMBER),
+        ("from", TEXT), ("to", TEXT), ("messagecapable", TEXT), ("phg", TEXT),
+        ("via", TEXT),
+        ("path", PATH),
+        ("comment", ESCAPED),
+        ("telemetry", TELEMETRY),
+        ("weather", WEATHER),
+        ("raw", ESCAPED), ("symbol", ESCAPED), ("symbol_table", ESCAPED),
+    ],
+    "wx": [
+        ("from", TEXT), ("to", TEXT), ("via", TEXT),
+        ("path", PATH),
+        ("comment", ESCAPED), ("raw", ESCAPED), ("wx_raw_timestamp", ESCAPED),
+        ("weather", WEATHER),
+    ],
+    "beacon": [
+        ("from", TEXT), ("to", TEXT), ("via", TEXT),
+        ("path", PATH),
+        ("text", ESCAPED), ("raw", ESCAPED),
+    ],
+    "bulletin": [
+        ("bid", NUMBER),
+        ("from", TEXT), ("to", TEXT), ("via", TEXT),
+        ("path", PATH),
+        ("message_text", ESCAPED), ("identifier", ESCAPED), ("raw", ESCAPED),
+    ],
+    "message": [
+        ("msgNo", NUMBER),
+        ("from", TEXT), ("to", TEXT), ("via", TEXT), ("addresse", TEXT),
+        ("path", PATH),
+        ("message_text", ESCAPED), ("response", ESCAPED), ("raw", ESCAPED),
+    ],
+    "telemetry": [
+        ("telemetry", CHANNELS),
+    ],
+}
+
+# Formats written to their own measurement, tagged with the source station
+MEASUREMENTS = {
+    "telemetry": "telemetry",
+}
+
+# Fields each kind of schema entry may write, besides the entry's own key
+KIND_FIELDS = {
+    TELEMETRY: TELEMETRY_FIELDS,
+    CHANNELS: CHANNEL_FIELDS,
+    WEATHER: WEATHER_FIELDS,
+}
+
+# Formats which update station state instead of producing a point
+METADATA_FORMATS = ["telemetry-message"]
+
+# Fields which differ between packets repeating a payload by their kind
+TEMPLATE_KEYS = {"path": PATH, "via": TEXT, "raw": ESCAPED}
+
+# aprslib formats a raw packet may parse to by APRS data type identifier.
+# Identifiers not listed, such as third party traffic, may parse to anything.
+RAW_FORMATS = {
+    b"!": ("uncompressed", "compressed", "wx"),
+    b"=": ("uncompressed", "compressed", "wx"),
+    b"/": ("uncompressed", "compressed", "wx"),
+    b"@": ("uncompressed", "compressed", "wx"),
+    b"`": ("mic-e",),
+    b"'": ("mic-e",),
+    b";": ("object",),
+    b">": ("status",),
+    b"_": ("wx",),
+    b":": ("message", "bulletin", "telemetry-message"),
+    b"T": ("telemetry",),
+}
+
+
+def compilePlan(formats=None, fields=None, exclude=None):
+    """Compile the encoding plan for the selected formats and fields
+
+    Returns a dictionary of format to the list of (key, kind, names) steps to
+    encode, where names are the telemetry, channel or weather fields to write. Formats
+    which are not in the plan are never encoded. Raises ValueError for
+    unknown formats or fields.
+
+    keyword arguments:
+    formats -- list of formats to process, all formats if None
+    fields -- dictionary of format to list of fields to write, all if missing
+    exclude -- list of fields never written for any format
+    """
+    known = list(SCHEMAS) + METADATA_FORMATS
+    formats = known if formats is None else formats
+    fields = fields or {}
+    exclude = set(exclude or [])
+
+    for name in list(formats) + list(fields):
+        if name not in known:
+            raise ValueError("Unknown packet format {0}".format(name))
+
+    plan = {}
+    for name in formats:
+        if name in METADATA_FORMATS:
+            plan[name] = []
+            continue
+
+        # Every field a format may write, including telemetry and weather
+        available = []
+        for key, kind in SCHEMAS[name]:
+            available.extend(KIND_FIELDS.get(kind, [key]))
+
+        allowed = set(fields.get(name, available))
+        unknown = allowed.difference(available)
+        if unknown:
+            raise ValueError("Unknown {0} fields {1}".format(name, ", ".join(sorted(unknown))))
+        allowed.difference_update(exclude)
+
+        steps = []
+        for key, kind in SCHEMAS[name]:
+            if kind in KIND_FIELDS:
+                names = [field for field in KIND_FIELDS[kind] if field in allowed]
+                if names:
+                    steps.append((key, kind, names))
+            elif key in allowed:
+                steps.append((key, kind, None))
+        plan[name] = steps
+
+    return plan
+
+
+# Source of the encoder compiled for each format, see compileEncoder()
+ENCODER = """def encode(jsonData, timestamp):
+    fields = lineFields()
+    append = fields.append
+    get = jsonData.get
+%s
+    if not fields:
+        return None
+    return joinLine(%s, fields, timestamp)
+"""
+
+# Source of each kind of schema entry written as the kind's own type, the
+# key prefix precomputed. Numbers which are not finite ints or floats are
+# coerced.
+STEP = {
+    NUMBER: ("    value = get({key!r})\n    if value is not None:\n"
+             "        if value.__class__ in NUMBERS and value - value == 0:\n"
+             "            append({prefix!r} + str(value))\n"
+             "        else:\n"
+             "            coerceField(fields, {measurement!r}, {key!r}, value, {fieldType!r})"),
+    TEXT: "    value = get({key!r})\n    if value is not None:\n        append({prefix!r} + str(value) + '\"')",
+    ESCAPED: "    value = get({key!r})\n    if value:\n        append({prefix!r} + escapeString(value) + '\"')",
+    PATH: "    value = get({key!r})\n    if value is not None:\n        append({prefix!r} + sharedStrings.joinPath(value) + '\"')",
+    TELEMETRY: "    parseTelemetry(jsonData, fields, {names!r}, {types!r})",
+    WEATHER: "    parseWeather(jsonData, fields, {names!r}, {types!r})",
+    CHANNELS: "    parseChannels(jsonData, fields, {names!r})",
+}
+
+# Source of schema entries registered with another type than their kind's
+COERCE = {
+    NUMBER: "    value = get({key!r})\n    if value is not None:\n        coerceField(fields, {measurement!r}, {key!r}, value, {fieldType!r})",
+    TEXT: "    value = get({key!r})\n    if value is not None:\n        coerceField(fields, {measurement!r}, {key!r}, value, {fieldType!r})",
+    ESCAPED: "    value = get({key!r})\n    if value:\n        coerceField(fields, {measurement!r}, {key!r}, value, {fieldType!r})",
+    PATH: "    value = get({key!r})\n    if value is not None:\n        coerceField(fields, {measurement!r}, {key!r}, sharedStrings.joinPath(value), {fieldType!r})",
+}
+
+
+def compileEncoder(name, steps):
+    """Compile the steps of a format into a function encoding its packets
+
+    The function takes a packet and timestamp like jsonToLineProtocol. The
+    steps are unrolled into straight line code with the measurement, tag set,
+    every "key=" prefix and field type as constants, so encoding a packet
+    only looks up and formats its values. Field types are registered in
+    fieldTypes, an encoder has to be compiled again when they change.
+
+    keyword arguments:
+    name -- packet format
+    steps -- list of (key, kind, names) steps from compilePlan()
+    """
+    if name in METADATA_FORMATS:
+        return lambda jsonData, timestamp=None: parseTelemetryMetadata(jsonData)
+
+    measurement = MEASUREMENTS.get(name, "packet")
+    lines = []
+    for key, kind, names in steps:
+        prefix = key + "=" if kind == NUMBER else key + '="'
+        if names is not None:
+            nameTypes = tuple(fieldTypes.get(measurement, field, defaultType(kind, field)) for field in names)
+            lines.append(STEP[kind].format(names=tuple(names), types=nameTypes))
+            continue
+
+        fieldType = fieldTypes.get(measurement, key, KIND_TYPES[kind])
+        template = STEP[kind] if fieldType == KIND_TYPES[kind] else COERCE[kind]
+        lines.append(template.format(key=key, prefix=prefix, measurement=measurement, fieldType=fieldType))
+
+    # Telemetry is tagged with the station, other formats with the format
+    if name in MEASUREMENTS:
+        header = "{0!r} + telemetry.escapeKey(jsonData['from']) + ' '".format(MEASUREMENTS[name] + ",from=")
+    else:
+        header = repr("packet,format={0} ".format(name))
+
+    # Bind to the module globals, helpers are looked up when called
+    namespace = {}
+    exec(ENCODER % ("\n".join(lines) or "    pass", header), namespace)
+    return types.FunctionType(namespace["encode"].__code__, globals(), "encode_" + name.replace("-", "_"))
+
+
+def compileEncoders(newPlan):
+    """Return a dictionary of format to encoder compiled from a plan
+
+    keyword arguments:
+    newPlan -- plan from compilePlan()
+    """
+    return dict((name, compileEncoder(name, steps)) for name, steps in newPlan.items())
+
+
+# Encoding plan in use and its compiled encoders, replaced as a whole when the
+# configuration changes
+plan = compilePlan()
+encoders = compileEncoders(plan)
+
+
+def setPlan(newPlan):
+    """Replace the encoding plan used by jsonToLineProtocol
+
+    keyword arguments:
+    newPlan -- plan from compilePlan()
+    """
+    global plan, encoders
+    encoders = compileEncoders(newPlan)
+    plan = newPlan
+
+
+def wantsRaw(line):
+    """Return False if a raw packet cannot parse to any planned format
+
+    Used to skip parsing packets of disabled formats altogether.
+
+    keyword arguments:
+    line -- raw APRS-IS packet bytes
+    """
+    body = line.find(b":") + 1
+    formats = RAW_FORMATS.get(line[body:body + 1])
+    if formats is None:
+        return True
+    for name in formats:
+        if name in encoders:
+            return True
+    return False
+
+
+def jsonToLineProtocol(jsonData, timestamp=None):
+    """Converts JSON APRS-IS packet to influxdb line protocol
+
+    Takes in a JSON packet from aprslib (raw=false) and parses it into an
+    influxdb line protocol compliant string to insert into database. Returns
+    a valid line protocol string ready to be inserted into the database.
+    Telemetry-message packets update the telemetry metadata instead.
+
+    keyword arguments:
+    jsonData -- aprslib parsed JSON packet
+    timestamp -- optional unix receive time of the packet
+    """
+
+    try:
+        encode = encoders.get(jsonData["format"])
+
+        if encode is None:
+            # Formats not yet parsed or disabled
+            logger.debug("Not parsing {0} packets".format(jsonData))
+            return None
+
+        return encode(jsonData, timestamp)
+
+    except ENCODE_ERRORS:
+        # An error occured
+        logger.error('A parsing StandardError occured', exc_info=True)
+        logger.error("Packet: {0}".format(jsonData))
+
+
+def encodeTemplate(jsonData):
+    """Encode a packet into a template of the line without its changing fields
+
+    Packets repeating a payload only differ in their path, via and raw
+    values and the timestamp. Those are encoded as placeholders and the line
+    split around them, so fillTemplate() can encode a repeat by joining the
+    constant parts with its own values. Returns a (parts, keys, presence)
+    tuple, or None for formats not encoded as line protocol or if one of
+    the fields is written with a coerced type.
+
+    keyword arguments:
+    jsonData -- aprslib parsed JSON packet
+    """
+    name = jsonData.get("format")
+    encode = encoders.get(name)
+    if encode is None or name in METADATA_FORMATS:
+        return None
+
+    # Replace the changing values written by the plan with placeholders
+    measurement = MEASUREMENTS.get(name, "packet")
+    placeholders = {}
+    keys = []
+    for key, kind, names in plan[name]:
+        if key not in TEMPLATE_KEYS:
+            continue
+        if fieldTypes.get(measurement, key, KIND_TYPES[kind]) != KIND_TYPES[kind]:
+            return None
+        if templatePresent(kind, jsonData.get(key)):
+            placeholders[key] = "\x00" + key + "\x00"
+            keys.append((key, kind))
+    presence = templatePresence(jsonData)
+
+    placeholderData = dict(jsonData)
+    for key, kind in keys:
+        placeholderData[key] = [placeholders[key]] if kind == PATH else placeholders[key]
+    line = encode(placeholderData, None)
+    if line is None:
+        return None
+
+    # Split the line at each placeholder in the order they were written
+    keys.sort(key=lambda item: line.find(placeholders[item[0]]))
+    parts = []
+    start = 0
+    for key, kind in keys:
+        position = line.find(placeholders[key])
+        parts.append(line[start:position])
+        start = position + len(placeholders[key])
+    parts.append(line[start:])
+    return parts, keys, presence
+
+
+def templatePresent(kind, value):
+    """Return True if a value of a template field kind is written"""
+    return bool(value) if kind == ESCAPED else value is not None
+
+
+def templatePresence(jsonData):
+    """Return which of the TEMPLATE_KEYS a packet writes"""
+    get = jsonData.get
+    return get("path") is not None, get("via") is not None, bool(get("raw"))
+
+
+def fillTemplate(template, jsonData, timestamp=None):
+    """Encode a packet with a template from encodeTemplate() of its payload
+
+    Returns None if the packet writes other changing fields than the
+    template, it has to be encoded in full then.
+
+    keyword arguments:
+    template -- (parts, keys, presence) tuple from encodeTemplate()
+    jsonData -- aprslib parsed JSON packet repeating the template's payload
+    timestamp -- optional unix receive time of the packet
+    """
+    parts, keys, presence = template
+    if templatePresence(jsonData) != presence:
+        return None
+
+    line = [parts[0]]
+    for index, (key, kind) in enumerate(keys):
+        value = jsonData[key]
+        if kind == PATH:
+            line.append(sharedStrings.joinPath(value))
+        elif kind == ESCAPED:
+            line.append(escapeString(value))
+        else:
+            line.append(str(value))
+        line.append(parts[index + 1])
+    if timestamp is not None:
+        line.append(" %d" % (timestamp * 1e9))
+    return "".join(line)
+
+
+def formatValue(value, fieldType):
+    """Return a value as line protocol field value of a type
+
+    Returns None if the value cannot be coerced to the type, such as text in
+    a numeric field or numbers which are not finite.
+
+    keyword arguments:
+    value -- field value from aprslib
+    fieldType -- one of fieldtypes.TYPES
+    """
+    try:
+        if fieldType == fieldtypes.FLOAT:
+            number = float(value)
+            if number - number == 0:
+                return str(number)
+
+        elif fieldType == fieldtypes.INTEGER:
+            if isinstance(value, INTEGERS):
+                return "%di" % value
+            number = float(value)
+            if number - number == 0 and number == int(number):
+                return "%di" % number
+
+        elif fieldType == fieldtypes.STRING:
+            if isinstance(value, NUMBERS):
+                value = str(value)
+            return '"' + escapeString(value) + '"'
+
+        elif fieldType == fieldtypes.BOOLEAN:
+            if value.__class__ is bool:
+                return "true" if value else "false"
+            return BOOLEANS.get(str(value).strip().lower())
+
+    except (AttributeError, TypeError, ValueError, OverflowError, UnicodeError):
+        pass
+    return None
+
+
+def coerceField(fieldList, measurement, key, value, fieldType):
+    """Append a field coerced to its type, or quarantine the value
+
+    keyword arguments:
+    fieldList -- list of field items currently parsed
+    measurement -- measurement the field is written to
+    key -- field key
+    value -- field value from aprslib
+    fieldType -- one of fieldtypes.TYPES
+    """
+    text = formatValue(value, fieldType)
+    if text is None:
+        fieldTypes.quarantine(measurement, key, value)
+    else:
+        fieldList.append(key + "=" + text)
+
+
+def appendNumber(fieldList, measurement, key, value, fieldType):
+    """Append a numeric field, coercing it unless it is a finite float
+
+    keyword arguments:
+    fieldList -- list of field items currently parsed
+    measurement -- measurement the field is written to
+    key -- field key
+    value -- field value
+    fieldType -- one of fieldtypes.TYPES
+    """
+    if fieldType == fieldtypes.FLOAT and value.__class__ in NUMBERS and value - value == 0:
+        fieldList.append(key + "=" + str(value))
+    else:
+        coerceField(fieldList, measurement, key, value, fieldType)
+
+
+def parseTelemetry(jsonData, fieldList, names=TELEMETRY_FIELDS, types=None):
+    '''parse telemetry from packets
+
+    Iterates through a packet to extra telemetry data: sequence, bits, and
+    values. These are placed into the fieldList which is returned at the end of
+    the function.
+
+    keyword arguments:
+    jsonData -- JSON packet from aprslib
+    fieldList -- list of field items currently parsed
+    names -- telemetry field names to extract
+    types -- field types of names, looked up in fieldTypes if None
+    '''
+
+    # Check for telemetry in packet
+    if "telemetry" in jsonData:
+        items = jsonData.get("telemetry")
+        if types is None:
+            types = [fieldTypes.get("packet", name, KIND_TYPES[TELEMETRY]) for name in names]
+        fieldType = dict(zip(names, types))
+        # Extract telemetry sequency
+        if "seq" in items and "seq" in names:
+            appendNumber(fieldList, "packet", "seq", items.get("seq"), fieldType["seq"])
+        # Extract IO bits
+        if "bits" in items and "bits" in names:
+            appendNumber(fieldList, "packet", "bits", items.get("bits"), fieldType["bits"])
+        # Retrieve scaling values from the metadata cache
+        channels = telemetryCache.equations(jsonData["from"])
+
+        # Extract analog values from telemtry packet
+        if "vals" in items:
+            values = items.get("vals")
+            for analog in range(5):
+                key = "analog{0}".format(analog + 1)
+                if key not in names:
+                    continue
+                # Apply scaling equation A*V**2 + B*V + C
+                a, b, c = channels[analog]
+                telemVal = a * math.pow(values[analog], 2) + b * values[analog] + c
+                appendNumber(fieldList, "packet", key, telemVal, fieldType[key])
+
+    # Return fieldList with found items appended
+    return fieldList
+
+
+def parseChannels(jsonData, fieldList, names=CHANNEL_FIELDS):
+    '''parse telemetry report channels using the station's metadata
+
+    Appends the sequence number, the scaled analog values and the digital bits
+    as booleans to the fieldList. Channels are named after the station's PARM
+    names, bits are true when they match the station's BITS sense.
+
+    keyword arguments:
+    jsonData -- telemetry packet from telemetry.parseReport
+    fieldList -- list of field items currently parsed
+    names -- channel fields to extract, by analogN and bitN position
+    '''
+    items = jsonData.get("telemetry")
+    if items is None:
+        return fieldList
+
+    # Names, equations and bit sense known for the station
+    entry = telemetryCache.get(jsonData["from"])
+    if entry is None:
+        keys, equations, sense = telemetry.DEFAULT_KEYS, telemetry.DEFAULT_EQUATIONS, telemetry.DEFAULT_SENSE
+    else:
+        keys, equations, sense = entry["keys"], entry["equations"], entry["sense"]
+
+    # Keys differ by station, so their types are looked up per packet
+    # without registering the names stations send
+    measurement = MEASUREMENTS["telemetry"]
+    if items.get("seq") is not None and "seq" in names:
+        appendNumber(fieldList, measurement, "seq", items["seq"], fieldTypes.get(measurement, "seq", KIND_TYPES[CHANNELS]))
+
+    # Apply scaling equation A*V**2 + B*V + C
+    for channel, value in enumerate(items.get("vals", [])[:5]):
+        if value is not None and CHANNEL_FIELDS[channel + 1] in names:
+            a, b, c = equations[channel]
+            key = keys[channel]
+            appendNumber(fieldList, measurement, key, float(a * value * value + b * value + c),
+                         fieldTypes.lookup(measurement, key, KIND_TYPES[CHANNELS]))
+
+    for bit, state in enumerate(items.get("bits", "")[:8]):
+        if CHANNEL_FIELDS[bit + 6] in names:
+            key = keys[bit + 5]
+            fieldType = fieldTypes.lookup(measurement, key, BIT_TYPE)
+            if fieldType == fieldtypes.BOOLEAN:
+                fieldList.append(key + ("=true" if state == sense[bit] else "=false"))
+            else:
+                coerceField(fieldList, measurement, key, state == sense[bit], fieldType)
+
+    return fieldList
+
+
+def parseWeather(jsonData, fieldList, names=WEATHER_FIELDS, types=None):
+    '''parse weather data from packets
+
+    Iterates through a packet to extra weather data. Items which are found are
+    appended to the fieldList which is returned.
+
+    keyword arguments:
+    jsonData -- JSON packet from aprslib
+    fieldList -- list of field items currently parsed
+    names -- weather field names to extract
+    types -- field types of names, looked up in fieldTypes if None
+    '''
+
+    # Check for weather data key
+    if "weather" in jsonData:
+        items = jsonData.get("weather")
+        if types is None:
+            types = [fieldTypes.get("packet", name, KIND_TYPES[WEATHER]) for name in names]
+
+        # Check for each weather item, finite numbers need no coercion
+        for index, key in enumerate(names):
+            if key in items:
+                value = items[key]
+                if types[index] == fieldtypes.FLOAT and value.__class__ in NUMBERS and value - value == 0:
+                    fieldList.append(WEATHER_PREFIXES[key] + str(value))
+                else:
+                    coerceField(fieldList, "packet", key, value, types[index])
+
+    # Return fieldList with found items appended
+    return fieldList
+
+
+def parseTelemetryMetadata(jsonData):
+    """Store telemetry-message PARM, UNIT, EQNS and BITS values of a station
+
+    The metadata applies to the station the message is addressed to, usually
+    the sender itself. Telemetry-message packets are not written as points.
+
+    keyword arguments:
+    jsonData -- aprslib parsed JSON packet
+    """
+    station = jsonData.get("addresse") or jsonData.get("from")
+    telemetryCache.update(station, jsonData)
+
+
+def escapeString(rawText):
+    '''Escape a text for use inside a line protocol string field
+
+    Non ASCII characters are replaced, backslashes and quotes escaped.
+
+    keyword arguments:
+    rawText -- String to be escaped
+    '''
+    # Convert to ASCII and replace invalid characters, the strict codec is
+    # much faster for the common all ASCII text
+    try:
+        text = rawText.encode('ascii')
+    except UnicodeError:
+        text = rawText.encode('ascii', 'replace')
+
+    # Python 3 encodes to bytes
+    if text.__class__ is not str:
+        text = text.decode('ascii')
+
+    # Most texts need no escaping
+    if "\\" in text or "\'" in text or "\"" in text:
+        text = text.replace("\\", "\\\\")
+        text = text.replace("\'", "\\\'")
+        text = text.replace("\"", "\\\"")
+    return text
+
+
+def parseTextString(rawText, name):
+    '''Parse text strings for invalid characters. Properly escape for
+    line protocol strings if found.
+
+    keyword arguments:
+    rawText -- String to be checked
+    name -- Name of field
+    '''
+
+    # Check if length is valid
+    if len(rawText) > 0:
+        # Create valid line protocol field string
+        return name + "=\"" + escapeString(rawText) + "\""
+
+    # rawText is empty
+    return rawText
+
+
+def parsePath(path):
+    """Take path and turn into a string
+
+    keyword arguments:
+    path -- list of paths from aprslib
+    """
+
+    # Join path items into a string separated by commas, valid line protocol
+    return "path=\"" + sharedStrings.joinPath(path) + "\""
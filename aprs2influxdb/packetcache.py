@@ -0,0 +1,211 @@
+"""Bounded cache of parsed and encoded packets by repeated payload
+
+Much of the APRS-IS feed is stations sending byte identical payloads again
+and again, only the path and receive time differ. The cache keeps the
+parsed packet and a line protocol template per source, destination and
+payload, so a repeat skips aprslib and most of the encoding: its path, via
+and raw values are taken from the new header and filled into the template
+with the new timestamp.
+
+aprslib turns packet timestamps into unix times relative to the current UTC
+date, so the cache is emptied when the date changes. Templates are encoded
+again after the encoding plan changed, and templates of packets carrying
+telemetry whenever telemetry metadata arrived.
+"""
+import collections
+import logging
+import re
+import threading
+
+from aprs2influxdb import lineprotocol
+
+logger = logging.getLogger(__name__)
+
+# Packets whose template could not be encoded or filled
+templateErrors = 0
+
+# Paths of hops aprslib accepts, other packets are parsed to be rejected
+PATH = re.compile(r"^[A-Z0-9\-]{1,9}\*?(?:,[A-Z0-9\-]{1,9}\*?)*$", re.I)
+
+
+def cacheKey(line):
+    """Return the cache key of a raw packet, the packet without its path
+
+    keyword arguments:
+    line -- raw APRS-IS packet bytes
+    """
+    colon = line.find(b":")
+    comma = line.find(b",", 0, colon)
+    if comma < 0:
+        return line
+    return line[:comma] + line[colon:]
+
+
+class CachedPacket(object):
+    """Parsed packet and line protocol template of a payload
+
+    keyword arguments:
+    packet -- aprslib parsed JSON packet of the payload's first appearance
+    """
+
+    __slots__ = ["packet", "viaFromPath", "rawHead", "rawTail", "template", "encoders", "telemetryVersion"]
+
+    def __init__(self, packet):
+        self.packet = dict(packet)
+
+        # aprslib sets via from a q construct, T# reports leave it empty
+        path = packet.get("path") or []
+        self.viaFromPath = packet.get("via") == viaCall(path) and packet.get("format") != "telemetry"
+
+        # Raw text before and after the path
+        raw = packet.get("raw", "")
+        colon = raw.find(":")
+        comma = raw.find(",", 0, colon)
+        self.rawHead = raw[:colon if comma < 0 else comma]
+        self.rawTail = raw[colon:]
+
+        self.template = None
+        self.encoders = None
+        self.telemetryVersion = None
+
+    def repeat(self, line):
+        """Return the packet of a raw packet repeating the payload, None if its path is invalid
+
+        keyword arguments:
+        line -- raw APRS-IS packet bytes with the same source, destination and payload
+        """
+        colon = line.find(b":")
+        comma = line.find(b",", 0, colon)
+        hops = []
+        if comma >= 0:
+            path = line[comma + 1:colon].decode("latin-1")
+            if not PATH.match(path):
+                return None
+            intern = lineprotocol.sharedStrings.intern
+            hops = [intern(hop) for hop in path.split(",")]
+        packet = dict(self.packet)
+        packet["path"] = hops
+        if "via" in packet and self.viaFromPath:
+            packet["via"] = viaCall(hops)
+        if "raw" in packet:
+            packet["raw"] = self.rawHead + "".join("," + hop for hop in hops) + self.rawTail
+        return packet
+
+    def encode(self, packet, timestamp):
+        """Encode the packet of the payload or a repeat as line protocol
+
+        keyword arguments:
+        packet -- packet from repeat(), or the first parsed packet
+        timestamp -- unix receive time of the packet
+        """
+        global templateErrors
+        line = None
+        try:
+            # Templates follow the encoding plan and telemetry metadata
+            usesTelemetry = packet.get("format") == "telemetry" or "telemetry" in packet
+            version = lineprotocol.telemetryCache.version if usesTelemetry else None
+            if self.encoders is not lineprotocol.encoders or self.telemetryVersion != version:
+                self.encoders = lineprotocol.encoders
+                self.telemetryVersion = version
+                self.template = lineprotocol.encodeTemplate(packet)
+
+            if self.template is not None:
+                line = lineprotocol.fillTemplate(self.template, packet, timestamp)
+
+        except lineprotocol.ENCODE_ERRORS:
+            # The full encoder handles and logs the packet instead
+            templateErrors += 1
+            self.template = None
+            logger.error("Encoding a packet template failed", exc_info=True)
+            logger.error("Packet: {0}".format(packet))
+
+        if line is None:
+            line = lineprotocol.jsonToLineProtocol(packet, timestamp)
+        return line
+
+
+def viaCall(path):
+    """Return the station after a q construct ending the path like aprslib, or ""
+
+    keyword arguments:
+    path -- list of path hops
+    """
+    if len(path) >= 2 and len(path[-2]) == 3 and path[-2][0] == "q":
+        return path[-1]
+    return ""
+
+
+class PacketCache(object):
+    """Least recently used cache of CachedPacket by cacheKey()
+
+    keyword arguments:
+    maxSize -- maximum payloads kept
+    """
+
+    def __init__(self, maxSize=5000):
+        self.maxSize = maxSize
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.day = None
+
+        # Packets repeating a cached payload and others, seconds spent on each
+        self.hits = 0
+        self.misses = 0
+        self.hitSeconds = 0.0
+        self.missSeconds = 0.0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, received):
+        """Return the CachedPacket of a key or None
+
+        keyword arguments:
+        key -- cacheKey() of the raw packet
+        received -- unix time the packet was received
+        """
+        day = int(received // 86400)
+        with self.lock:
+            # Parsed timestamps depend on the date
+            if day != self.day:
+                self.entries.clear()
+                self.day = day
+
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry
+            return entry
+
+    def add(self, key, packet):
+        """Cache a parsed packet, return its CachedPacket
+
+        keyword arguments:
+        key -- cacheKey() of the raw packet
+        packet -- aprslib parsed JSON packet
+        """
+        entry = CachedPacket(packet)
+        with self.lock:
+            self.entries[key] = entry
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+        return entry
+
+    def record(self, hit, seconds):
+        """Count a packet and the seconds it took to parse and encode
+
+        keyword arguments:
+        hit -- True if the packet repeated a cached payload
+        seconds -- seconds from taking the packet to queuing its point
+        """
+        if hit:
+            self.hits += 1
+            self.hitSeconds += seconds
+        else:
+            self.misses += 1
+            self.missSeconds += seconds
+
+    def savedSeconds(self):
+        """Return the estimated seconds saved by hits compared to parsing them"""
+        if not self.hits or not self.misses:
+            return 0.0
+        return self.hits * (self.missSeconds / self.misses - self.hitSeconds / self.hits)
@@ -0,0 +1,117 @@
+"""Incremental digipeater and iGate counters of packet paths
+
+The path of every packet is written as one joined string, which dashboards
+of which digipeaters and iGates carry the traffic would have to search with
+regular expressions over every point. Instead the paths are counted as the
+packets flow and periodically summarized into one point per digipeater,
+iGate and q construct of the path measurement.
+
+Packets only count a path tuple, which is cheap as consecutive packets share
+few distinct paths. Each distinct path is split into its hops once per
+summary: the digipeaters up to the last hop marked used with *, the q
+construct APRS-IS added and the iGate or server after it.
+"""
+import re
+import threading
+
+from aprs2influxdb import lineprotocol
+from aprs2influxdb import telemetry
+
+# Path aliases and markers which are no digipeater callsigns
+ALIAS = re.compile(r"^(?:WIDE|TRACE|RELAY|ECHO|GATE|TEMP|TCPIP|TCPXX|NOGATE|RFONLY)\d*(?:-\d+)?$", re.I)
+
+# q constructs of packets gated from RF, followed by the iGate callsign
+RF_CONSTRUCTS = set(["qAR", "qAr", "qAO", "qAo"])
+
+# Tag values of the role of a counted callsign
+DIGIPEATER = "digipeater"
+IGATE = "igate"
+QCONSTRUCT = "qconstruct"
+
+
+def parseHops(path):
+    """Return the used digipeaters, q construct and iGate or server of a path
+
+    Returns a tuple of the list of digipeater callsigns which repeated the
+    packet, the q construct or None and the callsign after the q construct
+    or None.
+
+    keyword arguments:
+    path -- list of path hops from aprslib
+    """
+    construct = entry = None
+    hops = path
+    for index, hop in enumerate(path):
+        if len(hop) == 3 and hop[0] == "q":
+            construct = hop
+            hops = path[:index]
+            if index + 1 < len(path):
+                entry = path[index + 1]
+            break
+
+    # Hops up to the last one marked * have repeated the packet
+    used = 0
+    for index, hop in enumerate(hops):
+        if hop.endswith("*"):
+            used = index + 1
+    digipeaters = []
+    for hop in hops[:used]:
+        hop = hop.rstrip("*")
+        if hop and not ALIAS.match(hop):
+            digipeaters.append(hop)
+    return digipeaters, construct, entry
+
+
+class PathStats(object):
+    """Packet counts by path, summarized per digipeater, iGate and q construct"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.paths = {}
+        self.last = None
+
+        # Packets and summary points so far
+        self.packets = 0
+        self.points = 0
+
+    def count(self, path, received):
+        """Count a packet by its path
+
+        keyword arguments:
+        path -- list of path hops from aprslib
+        received -- unix time the packet was received
+        """
+        key = tuple(path or ())
+        with self.lock:
+            self.paths[key] = self.paths.get(key, 0) + 1
+            self.last = received
+
+    def flush(self):
+        """Return the summary of the packets counted since the last flush
+
+        Returns a list of line protocol points of the path measurement, tagged
+        with the role and callsign, timestamped with the receive time of the
+        last packet counted. Empty if no packets were counted.
+        """
+        with self.lock:
+            paths, self.paths = self.paths, {}
+            timestamp = self.last
+
+        # Split every distinct path once
+        counts = {}
+        for path, packets in paths.items():
+            digipeaters, construct, entry = parseHops(path)
+            for callsign in digipeaters:
+                counts[(DIGIPEATER, callsign)] = counts.get((DIGIPEATER, callsign), 0) + packets
+            if construct is not None:
+                counts[(QCONSTRUCT, construct)] = counts.get((QCONSTRUCT, construct), 0) + packets
+            if construct in RF_CONSTRUCTS and entry:
+                counts[(IGATE, entry)] = counts.get((IGATE, entry), 0) + packets
+            self.packets += packets
+
+        lines = []
+        for (role, callsign), packets in sorted(counts.items()):
+            tags = ["role=" + role, "call=" + telemetry.escapeKey(callsign)]
+            lines.append(lineprotocol.finishLine("path", tags, ["packets={0}".format(packets)], timestamp))
+        self.points += len(lines)
+        return lines
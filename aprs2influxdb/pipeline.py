@@ -0,0 +1,236 @@
+"""Bounded queues with load shedding between the pipeline stages
+
+Packets flow from the APRS-IS reader through parse workers to the writer
+stage. Each hand-off is a BoundedQueue so memory and latency stay bounded when
+packets arrive faster than they can be encoded or written. What happens when
+a queue is full is decided by its overload policy:
+
+block -- wait for room, pushing back on the previous stage
+dropoldest -- discard the oldest queued packet
+priority -- discard the oldest packet of the lowest priority, beacons and
+            status packets are shed before positions
+sample -- keep only one of every sampleRate packets while full
+"""
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ["block", "dropoldest", "priority", "sample"]
+
+# Shedding priorities, higher priorities are kept longer
+LOW = 0
+NORMAL = 1
+HIGH = 2
+
+# Priority by aprslib packet format
+FORMAT_PRIORITY = {
+    "uncompressed": HIGH,
+    "compressed": HIGH,
+    "mic-e": HIGH,
+    "object": HIGH,
+    "wx": NORMAL,
+    "message": NORMAL,
+    "telemetry-message": NORMAL,
+    "telemetry": NORMAL,
+    "bulletin": LOW,
+    "status": LOW,
+    "beacon": LOW,
+}
+
+# Priority by APRS data type identifier, the first character after the header
+TYPE_PRIORITY = {
+    b"!": HIGH,
+    b"=": HIGH,
+    b"/": HIGH,
+    b"@": HIGH,
+    b"`": HIGH,
+    b"'": HIGH,
+    b";": HIGH,
+    b")": HIGH,
+    b"_": NORMAL,
+    b":": NORMAL,
+    b"T": NORMAL,
+    b">": LOW,
+}
+
+# Seconds between warnings about shed packets
+WARNING_INTERVAL = 10
+
+
+def rawPriority(line):
+    """Return the shedding priority of a raw APRS packet before parsing
+
+    keyword arguments:
+    line -- raw APRS-IS packet bytes
+    """
+    body = line.find(b":") + 1
+    return TYPE_PRIORITY.get(line[body:body + 1], LOW)
+
+
+class BoundedQueue(object):
+    """Thread safe FIFO queue with a maximum size and an overload policy
+
+    Items are kept in one deque per priority with a parallel deque of arrival
+    sequence numbers, so FIFO order is preserved while the lowest priority can
+    still be shed in constant time, without a wrapper object per item.
+
+    keyword arguments:
+    name -- queue name used in log messages
+    maxsize -- maximum number of queued items
+    policy -- overload policy, one of POLICIES
+    sampleRate -- keep one of every sampleRate items with the sample policy
+    onShed -- optional function called with every item shed
+    """
+
+    def __init__(self, name, maxsize=10000, policy="priority", sampleRate=10, onShed=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.sampleRate = sampleRate
+        self.onShed = onShed
+
+        self.levels = [collections.deque() for priority in (LOW, NORMAL, HIGH)]
+        self.sequences = [collections.deque() for priority in (LOW, NORMAL, HIGH)]
+        self.size = 0
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.notEmpty = threading.Condition(self.lock)
+        self.notFull = threading.Condition(self.lock)
+
+        # Counters of queued and shed items, shed items per priority
+        self.queued = 0
+        self.shed = [0, 0, 0]
+        self.sampled = 0
+        self.lastWarning = 0
+
+    def __len__(self):
+        return self.size
+
+    def put(self, item, priority=NORMAL):
+        """Queue an item, applying the overload policy if the queue is full
+
+        Returns False if the item itself was shed.
+
+        keyword arguments:
+        item -- object to queue
+        priority -- LOW, NORMAL or HIGH
+        """
+        with self.lock:
+            return self._put(item, priority)
+
+    def putMany(self, items):
+        """Queue a batch of items under one lock, returns the number queued
+
+        keyword arguments:
+        items -- list of (item, priority) tuples
+        """
+        with self.lock:
+            queued = 0
+            for item, priority in items:
+                queued += self._put(item, priority)
+            return queued
+
+    def _put(self, item, priority):
+        if self.size >= self.maxsize:
+            if self.policy == "block":
+                while self.size >= self.maxsize:
+                    self.notFull.wait()
+
+            elif self.policy == "priority":
+                # Shed the oldest item of a lower priority, else this one
+                lowest = self._lowestLevel()
+                if lowest >= priority:
+                    return self._shedItem(item, priority)
+                self._dropOldest(lowest)
+
+            elif self.policy == "sample":
+                # Admit every sampleRate-th item in place of the oldest
+                self.sampled += 1
+                if self.sampled % self.sampleRate:
+                    return self._shedItem(item, priority)
+                self._dropOldest(self._oldestLevel())
+
+            else:
+                self._dropOldest(self._oldestLevel())
+
+        self.levels[priority].append(item)
+        self.sequences[priority].append(self.sequence)
+        self.sequence += 1
+        self.size += 1
+        self.queued += 1
+        self.notEmpty.notify()
+        return True
+
+    def get(self, maxItems, timeout=None):
+        """Return a list of up to maxItems items as soon as any are queued
+
+        An empty list is returned if nothing arrives within timeout seconds.
+
+        keyword arguments:
+        maxItems -- maximum number of items to return
+        timeout -- seconds to wait for an item, None waits forever
+        """
+        with self.lock:
+            if not self.size:
+                self.notEmpty.wait(timeout)
+            return self._take(maxItems)
+
+    def getBatch(self, batchSize, timeout):
+        """Return up to batchSize items once batchSize are queued or timeout passed
+
+        keyword arguments:
+        batchSize -- number of items to wait for
+        timeout -- maximum seconds to wait
+        """
+        deadline = time.time() + timeout
+        with self.lock:
+            while self.size < batchSize:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.notEmpty.wait(remaining)
+            return self._take(batchSize)
+
+    def _take(self, maxItems):
+        items = []
+        while self.size and len(items) < maxItems:
+            level = self._oldestLevel()
+            items.append(self.levels[level].popleft())
+            self.sequences[level].popleft()
+            self.size -= 1
+        if items:
+            self.notFull.notify_all()
+        return items
+
+    def _oldestLevel(self):
+        oldest = None
+        for level, sequences in enumerate(self.sequences):
+            if sequences and (oldest is None or sequences[0] < self.sequences[oldest][0]):
+                oldest = level
+        return oldest
+
+    def _lowestLevel(self):
+        for level, items in enumerate(self.levels):
+            if items:
+                return level
+
+    def _dropOldest(self, level):
+        item = self.levels[level].popleft()
+        self.sequences[level].popleft()
+        self.size -= 1
+        self._shedItem(item, level)
+
+    def _shedItem(self, item, priority):
+        self.shed[priority] += 1
+        if self.onShed is not None:
+            self.onShed(item)
+
+        # Rate limit warnings, counters hold the exact totals
+        now = time.time()
+        if now - self.lastWarning >= WARNING_INTERVAL:
+            self.lastWarning = now
+            logger.warning("{0} queue full, shed packets by priority low/normal/high: {1}".format(self.name, "/".join(str(count) for count in self.shed)))
+        return False
@@ -0,0 +1,215 @@
+"""Compressed, hourly rotating archive of raw APRS-IS packets
+
+Raw packet strings are written to one segment file per UTC hour instead of
+being stored in influxdb. Each segment is a series of independently
+compressed blocks (gzip members or zstd frames) so the file can still be read
+with zcat/zstdcat. A small text index next to every segment records which
+stations appear in which block, allowing raw packets of a single station to be
+looked up for a time range without decompressing the whole segment.
+"""
+import os
+import threading
+import time
+import zlib
+
+# File name extensions per supported compression
+EXTENSIONS = {"gzip": ".raw.gz", "zstd": ".raw.zst"}
+
+
+def segmentName(timestamp):
+    """Return the segment base name for a unix timestamp (UTC hour)
+
+    keyword arguments:
+    timestamp -- unix timestamp in seconds
+    """
+    return time.strftime("%Y%m%d%H", time.gmtime(timestamp))
+
+
+def compressBlock(data, compression):
+    """Compress a block into a standalone gzip member or zstd frame
+
+    keyword arguments:
+    data -- bytes to compress
+    compression -- "gzip" or "zstd"
+    """
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor().compress(data)
+
+    # wbits of 16 + MAX_WBITS produces a complete gzip member
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompressBlock(data, compression):
+    """Decompress a single block written by compressBlock
+
+    keyword arguments:
+    data -- compressed bytes of exactly one block
+    compression -- "gzip" or "zstd"
+    """
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+class RawArchive(object):
+    """Hourly rotating compressed archive of raw packets with offset index
+
+    keyword arguments:
+    directory -- directory to store segment and index files in
+    compression -- "gzip" (default) or "zstd"
+    blockSize -- number of packets per compressed block
+    blockAge -- maximum seconds a packet is held before its block is written
+    """
+
+    def __init__(self, directory, compression="gzip", blockSize=500, blockAge=60):
+        if compression not in EXTENSIONS:
+            raise ValueError("Unsupported compression {0}".format(compression))
+        if compression == "zstd":
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                raise ImportError("zstd compression requires the zstandard package")
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.directory = directory
+        self.compression = compression
+        self.blockSize = blockSize
+        self.blockAge = blockAge
+        self.lock = threading.Lock()
+
+        # Currently open segment
+        self.segment = None
+        self.dataFile = None
+        self.indexFile = None
+
+        # Pending block of records and per station time ranges
+        self.records = []
+        self.stations = {}
+        self.blockStart = None
+
+    def write(self, callsign, raw, timestamp=None):
+        """Add a raw packet to the archive
+
+        keyword arguments:
+        callsign -- source callsign of the packet
+        raw -- raw packet string
+        timestamp -- receive time, defaults to now
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if not isinstance(raw, bytes):
+            raw = raw.encode("utf-8", "replace")
+
+        with self.lock:
+            # Rotate hourly, flushing the pending block into the old segment
+            segment = segmentName(timestamp)
+            if segment != self.segment:
+                self._flushBlock()
+                self._openSegment(segment)
+
+            self.records.append(("{0:.3f}\t".format(timestamp)).encode("ascii") + raw + b"\n")
+            first, last = self.stations.get(callsign, (timestamp, timestamp))
+            self.stations[callsign] = (min(first, timestamp), max(last, timestamp))
+            if self.blockStart is None:
+                self.blockStart = timestamp
+
+            if len(self.records) >= self.blockSize or timestamp - self.blockStart >= self.blockAge:
+                self._flushBlock()
+
+    def flush(self):
+        """Write out the pending block"""
+        with self.lock:
+            self._flushBlock()
+
+    def close(self):
+        """Write out the pending block and close the current segment"""
+        with self.lock:
+            self._flushBlock()
+            self._closeSegment()
+
+    def _openSegment(self, segment):
+        self._closeSegment()
+        base = os.path.join(self.directory, segment)
+        self.segment = segment
+        self.dataFile = open(base + EXTENSIONS[self.compression], "ab")
+        self.indexFile = open(base + ".idx", "a")
+
+    def _closeSegment(self):
+        if self.dataFile is not None:
+            self.dataFile.close()
+            self.indexFile.close()
+        self.segment = None
+        self.dataFile = None
+        self.indexFile = None
+
+    def _flushBlock(self):
+        if not self.records:
+            return
+
+        # Append one compressed block and index it by its byte offset
+        block = compressBlock(b"".join(self.records), self.compression)
+        self.dataFile.seek(0, os.SEEK_END)
+        offset = self.dataFile.tell()
+        self.dataFile.write(block)
+        self.dataFile.flush()
+
+        for callsign, (first, last) in self.stations.items():
+            self.indexFile.write("{0}\t{1:.3f}\t{2:.3f}\t{3}\t{4}\n".format(callsign, first, last, offset, len(block)))
+        self.indexFile.flush()
+
+        self.records = []
+        self.stations = {}
+        self.blockStart = None
+
+
+def lookup(directory, callsign, start, end):
+    """Yield (timestamp, raw) tuples archived for a station in a time range
+
+    Only the blocks listed in the hourly index files for the station are read
+    and decompressed.
+
+    keyword arguments:
+    directory -- archive directory
+    callsign -- source callsign to look up
+    start -- unix timestamp of range start
+    end -- unix timestamp of range end
+    """
+    hour = int(start) - int(start) % 3600
+    while hour <= end:
+        base = os.path.join(directory, segmentName(hour))
+        hour += 3600
+        if not os.path.exists(base + ".idx"):
+            continue
+
+        # Find the blocks containing the station within the time range
+        blocks = []
+        with open(base + ".idx") as indexFile:
+            for entry in indexFile:
+                station, first, last, offset, length = entry.rstrip("\n").split("\t")
+                if station == callsign and float(first) <= end and float(last) >= start:
+                    blocks.append((int(offset), int(length)))
+
+        if not blocks:
+            continue
+
+        for compression, extension in EXTENSIONS.items():
+            if os.path.exists(base + extension):
+                break
+        else:
+            continue
+
+        prefix = callsign.encode("utf-8") + b">"
+        with open(base + extension, "rb") as dataFile:
+            for offset, length in sorted(blocks):
+                dataFile.seek(offset)
+                data = decompressBlock(dataFile.read(length), compression)
+                for record in data.splitlines():
+                    timestamp, raw = record.split(b"\t", 1)
+                    timestamp = float(timestamp)
+                    if raw.startswith(prefix) and start <= timestamp <= end:
+                        yield timestamp, raw
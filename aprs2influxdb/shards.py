@@ -0,0 +1,109 @@
+"""Routing of points to several writers by callsign, format or region
+
+Each shard is a BatchWriter with its own queue and sink, so a slow or
+unavailable database only backs up the points routed to it. ShardRouter picks
+the writers of every packet:
+
+callsign -- a stable hash of the source callsign spreads stations evenly
+format -- shards list the packet formats they take
+region -- shards list a latitude/longitude box, positionless packets go to
+          the default shard
+mirror -- every shard receives every point, for replicas
+"""
+import zlib
+
+SHARD_KEYS = ["callsign", "format", "region", "mirror"]
+
+
+def parseRegion(value):
+    """Parse a "south, west, north, east" box in degrees into a tuple of floats
+
+    Raises ValueError if the box is malformed. A box whose west edge is east
+    of its east edge crosses the 180th meridian.
+
+    keyword arguments:
+    value -- comma separated box edges
+    """
+    try:
+        south, west, north, east = [float(edge) for edge in value.split(",")]
+    except ValueError:
+        raise ValueError("Region {0} is not south, west, north, east".format(value))
+    if not -90 <= south <= north <= 90 or not -180 <= west <= 180 or not -180 <= east <= 180:
+        raise ValueError("Region {0} is outside of the globe".format(value))
+    return (south, west, north, east)
+
+
+def inRegion(region, latitude, longitude):
+    """Return True if a position lies within a region box
+
+    keyword arguments:
+    region -- (south, west, north, east) tuple from parseRegion
+    latitude -- degrees north
+    longitude -- degrees east
+    """
+    south, west, north, east = region
+    if not south <= latitude <= north:
+        return False
+    if west <= east:
+        return west <= longitude <= east
+    return longitude >= west or longitude <= east
+
+
+class ShardRouter(object):
+    """Choose the writers a packet's point is added to
+
+    Shards are tried in order. With format and region keys the first shard
+    without formats or region is the default shard, otherwise the first
+    shard. With a single writer and no key every point goes to that writer.
+
+    keyword arguments:
+    writers -- list of BatchWriters, one per shard
+    shardBy -- one of SHARD_KEYS, or None to send every point to all writers
+    formats -- list with the set of formats of each shard, empty if none
+    regions -- list with the region box of each shard, None if none
+    """
+
+    def __init__(self, writers, shardBy=None, formats=None, regions=None):
+        self.writers = writers
+        self.shardBy = shardBy
+
+        # Single writer lists, returned without allocating per packet
+        self.targets = [[writer] for writer in writers]
+
+        self.formats = {}
+        for shard, names in enumerate(formats or []):
+            for name in names:
+                self.formats.setdefault(name, self.targets[shard])
+
+        self.regions = [(region, self.targets[shard]) for shard, region in enumerate(regions or []) if region is not None]
+
+        # Shard taking everything not claimed by formats or regions
+        self.default = self.targets[0]
+        for shard in range(len(writers)):
+            if not (formats and formats[shard]) and not (regions and regions[shard]):
+                self.default = self.targets[shard]
+                break
+
+    def route(self, packet):
+        """Return the list of writers for a parsed packet
+
+        keyword arguments:
+        packet -- aprslib parsed JSON packet
+        """
+        if self.shardBy == "callsign":
+            callsign = packet.get("from", "")
+            if not isinstance(callsign, bytes):
+                callsign = callsign.encode("utf-8")
+            return self.targets[(zlib.crc32(callsign) & 0xffffffff) % len(self.targets)]
+
+        if self.shardBy == "format":
+            return self.formats.get(packet.get("format"), self.default)
+
+        if self.shardBy == "region":
+            if "latitude" in packet and "longitude" in packet:
+                for region, target in self.regions:
+                    if inRegion(region, packet["latitude"], packet["longitude"]):
+                        return target
+            return self.default
+
+        return self.writers
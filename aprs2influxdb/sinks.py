@@ -0,0 +1,150 @@
+"""Output sinks for batches of influxdb line protocol
+
+Every sink accepts a payload of newline terminated line protocol strings with
+write() and releases its resources with close(). The writer stage is unaware
+of where points end up, which allows the pipeline to be measured without a
+database and each deployment to pick the cheapest transport.
+"""
+import errno
+import logging
+import os
+import socket
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+class InfluxDBSink(object):
+    """Write batches to the influxdb HTTP /write endpoint
+
+    keyword arguments:
+    client -- influxdb.InfluxDBClient, its session is reused for every batch
+    database -- database name to write to
+    """
+
+    def __init__(self, client, database):
+        self.client = client
+        self.database = database
+
+    def write(self, payload):
+        """POST a line protocol payload, raises influxdb client exceptions"""
+        self.client.request(url="write",
+                            method="POST",
+                            params={"db": self.database},
+                            data=payload,
+                            expected_response_code=204,
+                            headers={"Content-Type": "application/octet-stream"})
+
+    def close(self):
+        pass
+
+
+class FileSink(object):
+    """Append batches to a line protocol file loadable with influx -import
+
+    keyword arguments:
+    path -- file to append to
+    database -- database named in the import file header
+    bufferSize -- bytes buffered before writing to disk
+    """
+
+    def __init__(self, path, database, bufferSize=1024 * 1024):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", bufferSize)
+
+        # influx -import requires a DML header naming the database
+        if new:
+            self.file.write("# DML\n# CONTEXT-DATABASE: {0}\n".format(database))
+
+    def write(self, payload):
+        self.file.write(payload)
+
+    def close(self):
+        self.file.close()
+
+
+class StdoutSink(object):
+    """Print batches to standard output"""
+
+    def write(self, payload):
+        sys.stdout.write(payload)
+        sys.stdout.flush()
+
+    def close(self):
+        pass
+
+
+class NullSink(object):
+    """Discard batches, for runs which only export or archive packets"""
+
+    def write(self, payload):
+        pass
+
+    def close(self):
+        pass
+
+
+class UDPSink(object):
+    """Send line protocol to an influxdb UDP listener without acknowledgement
+
+    Lines are packed into datagrams of at most mtu bytes, a single line longer
+    than mtu is sent on its own. The socket is non-blocking so a full send
+    buffer drops the datagram instead of stalling the writer. The host is
+    resolved once when the sink is created.
+
+    Raises ValueError if the host cannot be resolved.
+
+    keyword arguments:
+    host -- influxdb host
+    port -- influxdb UDP listener port
+    mtu -- maximum datagram payload in bytes
+    """
+
+    def __init__(self, host, port, mtu=1400):
+        try:
+            family, socktype, proto, canonname, self.address = socket.getaddrinfo(host, int(port), 0, socket.SOCK_DGRAM)[0]
+        except socket.gaierror as e:
+            raise ValueError("Unable to resolve UDP sink host {0}: {1}".format(host, e))
+        self.mtu = mtu
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+        # Transmit counters
+        self.bytesSent = 0
+        self.linesSent = 0
+        self.datagramsSent = 0
+        self.datagramsDropped = 0
+
+    def write(self, payload):
+        if not isinstance(payload, bytes):
+            payload = payload.encode("utf-8")
+
+        # Cut the payload at the last newline which fits into each datagram
+        start = 0
+        end = len(payload)
+        while start < end:
+            stop = start + self.mtu
+            if stop >= end:
+                cut = end
+            else:
+                cut = payload.rfind(b"\n", start, stop) + 1
+                if cut <= start:
+                    cut = payload.find(b"\n", stop) + 1 or end
+            self.send(payload[start:cut])
+            start = cut
+
+        logger.debug("UDP sent {0} bytes in {1} datagrams, {2} dropped".format(self.bytesSent, self.datagramsSent, self.datagramsDropped))
+
+    def send(self, datagram):
+        """Send one datagram, counting it as dropped if the socket is busy"""
+        try:
+            self.bytesSent += self.sock.sendto(datagram, self.address)
+            self.linesSent += datagram.count(b"\n")
+            self.datagramsSent += 1
+        except socket.error as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS):
+                raise
+            self.datagramsDropped += 1
+
+    def close(self):
+        self.sock.close()
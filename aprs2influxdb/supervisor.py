@@ -0,0 +1,225 @@
+"""Supervision of the APRS-IS connection
+
+The Supervisor owns the APRS-IS connection: it connects, runs the consumer,
+and when the connection drops, fails to log in or stops delivering packets it
+reconnects to the next server with jittered exponential backoff. The pipeline
+queues are untouched while reconnecting so nothing already received is lost.
+Reconnect gaps are measured and reported:
+
+recover -- seconds from noticing the loss to being logged in again
+gap -- seconds between the last packet before and the first packet after
+"""
+import logging
+import random
+import socket
+import threading
+import time
+
+from aprs2influxdb.aprsis import APRSISError
+
+logger = logging.getLogger(__name__)
+
+# Bounds of the delay between failed connection attempts in seconds
+MIN_RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 60
+
+
+def parseServers(hosts, port):
+    """Parse a comma separated list of APRS-IS servers into (host, port) tuples
+
+    keyword arguments:
+    hosts -- comma separated host or host:port entries
+    port -- port of entries without one
+    """
+    servers = []
+    for entry in hosts.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, entryPort = entry.partition(":")
+        servers.append((host, int(entryPort or port)))
+    if not servers:
+        raise ValueError("No APRS-IS server given")
+    return servers
+
+
+class Supervisor(object):
+    """Keep an APRS-IS connection receiving packets, reconnecting as needed
+
+    keyword arguments:
+    conn -- aprsis.APRSIS connection, not yet connected
+    servers -- list of (host, port) tuples tried in turn
+    callback -- called with every batch of raw packets received
+    stallTimeout -- seconds without packets after which the connection is
+                    considered stalled, 0 to disable
+    onRecover -- optional function called with the server, recover and gap
+                 seconds once packets flow again after a reconnect
+    """
+
+    def __init__(self, conn, servers, callback, stallTimeout=60, onRecover=None):
+        self.conn = conn
+        self.servers = servers
+        self.callback = callback
+        self.stallTimeout = stallTimeout
+        self.onRecover = onRecover
+
+        # Serializes sending with connecting and closing
+        self.lock = threading.Lock()
+        self.connected = False
+        self.stopping = False
+        self.server = 0
+
+        # Packet and reconnect counters
+        self.packets = 0
+        self.reconnects = 0
+        self.totalGap = 0.0
+        self.lastPacket = time.time()
+
+        # Set while recovering from a lost connection
+        self.lostAt = None
+        self.gapStart = None
+        self.recover = None
+
+    def start(self):
+        """Start the connection and watchdog threads, return the connection thread"""
+        watchdog = threading.Thread(target=self.watch, name="watchdog")
+        watchdog.daemon = True
+        watchdog.start()
+
+        thread = threading.Thread(target=self.run, name="consumer")
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def run(self):
+        """Connection thread, connects and consumes packets until the program exits"""
+        delay = 0
+        while not self.stopping:
+            host, port = self.servers[self.server]
+            logger.info("Connecting to APRS-IS {0}:{1}".format(host, port))
+            self.conn.setServer(host, port)
+            try:
+                with self.lock:
+                    self.conn.connect()
+                    self.connected = True
+
+            except Exception as e:
+                # Try the next server after a growing, jittered delay
+                logger.warning("Connecting to APRS-IS {0}:{1} failed: {2}".format(host, port, e))
+                self.conn.close()
+                self.rotate()
+                delay = min(MAX_RECONNECT_DELAY, max(MIN_RECONNECT_DELAY, delay * 2))
+                time.sleep(random.uniform(delay / 2.0, delay))
+                continue
+
+            delay = 0
+            self.connectedAt(host, port)
+            if self.stopping:
+                break
+
+            try:
+                self.conn.consumer(self.receive)
+
+            except APRSISError as e:
+                if not self.stopping:
+                    logger.warning("APRS-IS connection to {0}:{1} lost: {2}".format(host, port, e))
+
+            except Exception:
+                logger.error("An error occured consuming APRS-IS packets", exc_info=True)
+
+            if self.stopping:
+                break
+            self.lost()
+
+        with self.lock:
+            self.connected = False
+            self.conn.close()
+        logger.debug("Stopped receiving from APRS-IS")
+
+    def receive(self, lines):
+        """Consumer callback, tracks packet arrival and passes batches on"""
+        self.packets += len(lines)
+        self.lastPacket = now = time.time()
+        if self.gapStart is not None:
+            self.recovered(now)
+        self.callback(lines)
+
+    def connectedAt(self, host, port):
+        """Record a successful login"""
+        now = time.time()
+        if self.lostAt is not None:
+            self.recover = now - self.lostAt
+            self.lostAt = None
+            self.reconnects += 1
+            logger.warning("Reconnected to APRS-IS {0}:{1} after {2:.1f} s".format(host, port, self.recover))
+
+        # The stall timer starts with the connection
+        self.lastPacket = now
+
+    def recovered(self, now):
+        """Record the first packet after a reconnect and report the gap"""
+        gap = now - self.gapStart
+        self.gapStart = None
+        self.totalGap += gap
+        host, port = self.servers[self.server]
+        logger.warning("Packets from APRS-IS resumed after a gap of {0:.1f} s".format(gap))
+        if self.onRecover is not None:
+            self.onRecover("{0}:{1}".format(host, port), self.recover, gap)
+
+    def lost(self):
+        """Close a lost connection and start timing the recovery"""
+        with self.lock:
+            self.connected = False
+            self.conn.close()
+
+        # A gap already open continues through failed reconnects
+        if self.gapStart is None:
+            self.gapStart = self.lastPacket
+        self.lostAt = time.time()
+        self.rotate()
+
+    def rotate(self):
+        """Move on to the next server"""
+        self.server = (self.server + 1) % len(self.servers)
+
+    def stop(self):
+        """Stop receiving packets, the connection thread ends without reconnecting"""
+        self.stopping = True
+        self.drop()
+
+    def drop(self):
+        """Break the connection, waking the consumer to reconnect"""
+        sock = self.conn.sock
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+    def watch(self):
+        """Watchdog thread, drops connections which stopped delivering packets"""
+        while not self.stopping:
+            time.sleep(1)
+            if self.connected and self.stallTimeout and time.time() - self.lastPacket > self.stallTimeout:
+                logger.warning("No packets from APRS-IS for {0} s, reconnecting".format(self.stallTimeout))
+                self.drop()
+
+    def send(self, line):
+        """Send a line to APRS-IS if connected, return True if sent
+
+        keyword arguments:
+        line -- APRS packet or server command
+        """
+        with self.lock:
+            if not self.connected:
+                return False
+            try:
+                self.conn.sendall(line)
+                return True
+            except Exception as e:
+                logger.warning("Sending to APRS-IS failed: {0}".format(e))
+
+        # Let the consumer notice and reconnect
+        self.drop()
+        return False
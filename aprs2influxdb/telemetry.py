@@ -0,0 +1,221 @@
+"""APRS telemetry reports and per station telemetry metadata
+
+Telemetry stations send T# reports with a sequence number, five analog
+channels and eight digital bits. Separate telemetry-message packets addressed
+to the station give the channel names (PARM), units and labels (UNIT), the
+scaling equations (EQNS) and the bit sense and project title (BITS). The
+metadata is kept in a bounded cache so reports can be scaled and named when
+they are encoded, without a database lookup per packet.
+"""
+import collections
+import json
+import os
+import re
+import threading
+
+# Default scaling A*V**2 + B*V + C passing values through unchanged
+DEFAULT_EQUATIONS = [(0, 1, 0)] * 5
+
+# Default bit sense, a bit is active when it is 1
+DEFAULT_SENSE = "11111111"
+
+# Field keys of channels without a name
+DEFAULT_KEYS = ["analog{0}".format(channel) for channel in range(1, 6)] + ["bit{0}".format(bit) for bit in range(1, 9)]
+
+# Field keys written besides the channels, which channel names may not take
+RESERVED_KEYS = ["seq"]
+
+# Raw T# report: source, destination, path and the telemetry body
+REPORT = re.compile(r"^([^>]+)>([^,:]+)((?:,[^,:]+)*):T#(.*)$")
+
+
+def escapeKey(name):
+    """Escape a name for use as a line protocol field key or tag value
+
+    Non ASCII characters are replaced like in string fields, aprslib decodes
+    channel names and units of other languages to unicode.
+
+    keyword arguments:
+    name -- channel name or callsign
+    """
+    try:
+        name.encode("ascii")
+    except UnicodeError:
+        if isinstance(name, bytes):
+            name = name.decode("utf-8", "replace")
+        name = str(name.encode("ascii", "replace").decode("ascii"))
+    return name.strip().replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+def channelKeys(names):
+    """Return the field keys of the thirteen channels of a station
+
+    Channels are keyed by their escaped names. Channels without a name, or
+    whose name is reserved, taken by an earlier channel or the analogN or
+    bitN key of another channel, use their own analogN or bitN key instead,
+    so no key is written twice in one point.
+
+    keyword arguments:
+    names -- list of thirteen PARM channel names, empty if unnamed
+    """
+    keys = []
+    for channel, name in enumerate(names):
+        key = escapeKey(name)
+        if not key or key in RESERVED_KEYS or key in keys or (key in DEFAULT_KEYS and key != DEFAULT_KEYS[channel]):
+            key = DEFAULT_KEYS[channel]
+        keys.append(key)
+    return keys
+
+
+def parseReport(line):
+    """Parse a raw T# telemetry report into an aprslib style packet
+
+    aprslib does not parse T# reports, this fills the gap with a packet of
+    format "telemetry" holding a "telemetry" dictionary like the one aprslib
+    uses for comment telemetry: seq, vals and bits. Empty analog values are
+    None. Returns None if the line is not a telemetry report.
+
+    keyword arguments:
+    line -- raw APRS packet
+    """
+    if not isinstance(line, str):
+        line = line.decode("utf-8", "replace")
+
+    match = REPORT.match(line.rstrip("\r\n"))
+    if match is None:
+        return None
+    source, destination, path, body = match.groups()
+
+    # Sequence number, up to five analog values and the digital bits
+    items = body.split(",")
+    if not items[0].isdigit() and items[0] != "MIC":
+        return None
+    try:
+        sequence = int(items[0]) if items[0].isdigit() else None
+        values = [float(item) if item.strip() else None for item in items[1:6]]
+    except ValueError:
+        return None
+    bits = items[6].strip()[:8] if len(items) > 6 else ""
+    if bits.strip("01"):
+        return None
+
+    return {
+        "format": "telemetry",
+        "from": source,
+        "to": destination,
+        "path": path.split(",")[1:],
+        "via": "",
+        "raw": line.rstrip("\r\n"),
+        "telemetry": {"seq": sequence, "vals": values, "bits": bits},
+    }
+
+
+class TelemetryCache(object):
+    """Bounded least recently used cache of telemetry metadata per station
+
+    Besides the names, units, equations and bit sense as received, each entry
+    holds the field keys for the five analog channels and eight bits so
+    encoding only looks them up, see channelKeys().
+
+    keyword arguments:
+    maxStations -- maximum stations kept, the least recently used are evicted
+    """
+
+    def __init__(self, maxStations=10000):
+        self.maxStations = maxStations
+        self.stations = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+        # Changed whenever metadata is stored, for caches of encoded reports
+        self.version = 0
+
+    def __len__(self):
+        return len(self.stations)
+
+    def get(self, station):
+        """Return the metadata of a station or None
+
+        keyword arguments:
+        station -- telemetry station callsign
+        """
+        with self.lock:
+            entry = self.stations.pop(station, None)
+            if entry is not None:
+                self.stations[station] = entry
+            return entry
+
+    def equations(self, station):
+        """Return the five (a, b, c) scaling equations of a station
+
+        keyword arguments:
+        station -- telemetry station callsign
+        """
+        entry = self.get(station)
+        return DEFAULT_EQUATIONS if entry is None else entry["equations"]
+
+    def update(self, station, packet):
+        """Store the metadata of an aprslib telemetry-message packet
+
+        Returns True if the packet held telemetry metadata.
+
+        keyword arguments:
+        station -- telemetry station callsign the metadata applies to
+        packet -- aprslib parsed telemetry-message packet
+        """
+        if not any(key in packet for key in ("tPARM", "tUNIT", "tEQNS", "tBITS")):
+            return False
+
+        with self.lock:
+            entry = self.stations.pop(station, None)
+            if entry is None:
+                entry = {"names": [""] * 13, "units": [""] * 13, "equations": DEFAULT_EQUATIONS,
+                         "sense": DEFAULT_SENSE, "title": ""}
+                while len(self.stations) >= self.maxStations:
+                    self.stations.popitem(last=False)
+
+            if "tPARM" in packet:
+                entry["names"] = (list(packet["tPARM"]) + [""] * 13)[:13]
+            if "tUNIT" in packet:
+                entry["units"] = (list(packet["tUNIT"]) + [""] * 13)[:13]
+            if "tEQNS" in packet:
+                entry["equations"] = ([tuple(equation) for equation in packet["tEQNS"]] + DEFAULT_EQUATIONS)[:5]
+            if "tBITS" in packet:
+                entry["sense"] = packet["tBITS"]
+                entry["title"] = packet.get("title", "")
+
+            # Field keys follow the channel names
+            entry["keys"] = channelKeys(entry["names"])
+
+            self.stations[station] = entry
+            self.version += 1
+            return True
+
+    def save(self, path):
+        """Write the cached metadata to a JSON file, replacing it atomically
+
+        keyword arguments:
+        path -- state file
+        """
+        with self.lock:
+            stations = list(self.stations.items())
+        temporary = path + ".tmp"
+        with open(temporary, "w") as stateFile:
+            json.dump(stations, stateFile)
+        os.rename(temporary, path)
+
+    def load(self, path):
+        """Read metadata written by save(), a missing file is not an error
+
+        keyword arguments:
+        path -- state file
+        """
+        if not os.path.exists(path):
+            return
+        with open(path) as stateFile:
+            stations = json.load(stateFile)
+        with self.lock:
+            for station, entry in stations[-self.maxStations:]:
+                entry["equations"] = [tuple(equation) for equation in entry["equations"]]
+                entry["keys"] = channelKeys(entry["names"])
+                self.stations[station] = entry
+            self.version += 1
@@ -0,0 +1,199 @@
+"""Sampled latency tracing of single packets through the pipeline
+
+One of every rate packets received is traced: the raw packet is replaced by
+a TracedLine, a bytes subclass carrying a Trace, and its line protocol point
+by a TracedPoint, a str subclass carrying the same Trace. Each stage notes
+the monotonic time the packet passed it, from receiving it through parsing,
+encoding and queuing to the batch holding its point being written and
+acknowledged by the sink. Finished traces are kept in a ring buffer of the
+most recent ones, which is summarized into latency percentiles per stage.
+
+Packets which are not sampled pass unchanged: receiving costs a countdown
+per batch, parse workers compare the class of each packet and writers only
+look for traced points while some are queued.
+"""
+import collections
+import threading
+import time
+
+# Monotonic clock where available, Python 2 only has the wall clock
+monotonic = getattr(time, "monotonic", time.time)
+
+# Stage boundaries in pipeline order, noted in Trace.times
+RECEIVE = 0  # received from APRS-IS or read from the replayed file
+DEQUEUE = 1  # taken from the parse queue by a parse worker
+PARSE = 2  # parsed, or taken from the packet cache
+ENCODE = 3  # encoded to line protocol
+ENQUEUE = 4  # queued for the writers
+FLUSH = 5  # taken into a batch by a writer
+ACK = 6  # batch written to the sink
+STAGES = ["receive", "dequeue", "parse", "encode", "enqueue", "flush", "ack"]
+
+# Names of the latency between each stage and the one before
+INTERVALS = ["parse queue", "parse", "encode", "enqueue", "write queue", "write"]
+
+
+class Trace(object):
+    """Monotonic times a sampled packet passed each stage"""
+
+    __slots__ = ["times"]
+
+    def __init__(self):
+        self.times = [None] * len(STAGES)
+        self.times[RECEIVE] = monotonic()
+
+    def mark(self, stage):
+        """Note the current time for a stage
+
+        keyword arguments:
+        stage -- stage index such as PARSE
+        """
+        self.times[stage] = monotonic()
+
+
+class TracedLine(bytes):
+    """Raw packet bytes of a sampled packet, carrying its Trace as trace"""
+
+
+class TracedPoint(str):
+    """Line protocol point of a sampled packet, carrying its Trace as trace"""
+
+
+def percentile(values, fraction):
+    """Return the value below which a fraction of sorted values fall
+
+    keyword arguments:
+    values -- sorted list of numbers
+    fraction -- fraction between 0 and 1
+    """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Tracer(object):
+    """Sample packets for tracing and keep the latest finished traces
+
+    keyword arguments:
+    rate -- trace one of every rate packets
+    size -- finished traces kept
+    """
+
+    def __init__(self, rate=1000, size=1000):
+        self.rate = max(1, rate)
+        self.countdown = self.rate
+        self.traces = collections.deque(maxlen=size)
+        self.lock = threading.Lock()
+
+        # Traced points queued for writers but not yet taken into a batch
+        self.pending = 0
+
+        # Packets sampled and traces finished
+        self.sampled = 0
+        self.finished = 0
+
+    def sample(self, items):
+        """Replace every rate-th packet of a batch by a TracedLine in place
+
+        keyword arguments:
+        items -- list of ((line, received), priority) queued together
+        """
+        count = len(items)
+        while self.countdown <= count:
+            index = self.countdown - 1
+            (line, received), priority = items[index]
+            items[index] = ((self.trace(line), received), priority)
+            self.countdown += self.rate
+        self.countdown -= count
+        return items
+
+    def sampleLine(self, line):
+        """Return a raw packet, as a TracedLine if it is the rate-th
+
+        keyword arguments:
+        line -- raw APRS-IS packet bytes
+        """
+        if self.countdown > 1:
+            self.countdown -= 1
+            return line
+        self.countdown = self.rate
+        return self.trace(line)
+
+    def trace(self, line):
+        """Return a raw packet as a TracedLine with a new Trace
+
+        keyword arguments:
+        line -- raw APRS-IS packet bytes
+        """
+        traced = TracedLine(line)
+        traced.trace = Trace()
+        self.sampled += 1
+        return traced
+
+    def point(self, line, trace, writers):
+        """Return the point of a traced packet, noting it as queued
+
+        keyword arguments:
+        line -- line protocol string of the packet
+        trace -- Trace of the packet
+        writers -- number of writers the point is queued for
+        """
+        trace.mark(ENCODE)
+        point = TracedPoint(line)
+        point.trace = trace
+        with self.lock:
+            self.pending += writers
+        return point
+
+    def discard(self, point):
+        """Note a point shed by a full write queue, if traced, as no longer queued
+
+        keyword arguments:
+        point -- line protocol point shed
+        """
+        if point.__class__ is TracedPoint:
+            with self.lock:
+                self.pending = max(0, self.pending - 1)
+
+    def take(self, points):
+        """Return the traces of the traced points of a batch, noting them flushed
+
+        keyword arguments:
+        points -- list of line protocol points taken by a writer
+        """
+        traces = [point.trace for point in points if point.__class__ is TracedPoint]
+        if traces:
+            with self.lock:
+                self.pending = max(0, self.pending - len(traces))
+            for trace in traces:
+                trace.mark(FLUSH)
+        return traces
+
+    def acknowledge(self, traces):
+        """Note the batch holding traced points as written and keep the traces
+
+        A point queued for several writers is kept once, when its first
+        writer wrote it.
+
+        keyword arguments:
+        traces -- traces returned by take()
+        """
+        for trace in traces:
+            if trace.times[ACK] is None:
+                trace.mark(ACK)
+                self.traces.append(trace)
+                self.finished += 1
+
+    def summary(self):
+        """Return (interval name, count, median, 90%, 99%, max) tuples in seconds
+
+        Covers the finished traces in the ring buffer, the latency between
+        each pair of stages and from receiving to writing as "total".
+        """
+        traces = list(self.traces)
+        rows = []
+        for index, name in enumerate(INTERVALS + ["total"]):
+            start, end = (index, index + 1) if name != "total" else (RECEIVE, ACK)
+            values = sorted(trace.times[end] - trace.times[start] for trace in traces)
+            if values:
+                rows.append((name, len(values), percentile(values, 0.5), percentile(values, 0.9),
+                             percentile(values, 0.99), values[-1]))
+        return rows
@@ -0,0 +1,307 @@
+"""Writer stage batching line protocol points into an output sink"""
+import logging
+import random
+import threading
+import time
+
+from aprs2influxdb.pipeline import BoundedQueue, NORMAL
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes of batches rejected for their content, which are split to
+# find the offending points
+REJECTED_CODES = (400, 413)
+
+# HTTP status codes worth retrying although they are client errors
+RETRY_CODES = (408, 429)
+
+# Upper bound of the delay between retries in seconds
+MAX_RETRY_DELAY = 30
+
+# Weight of the latest write in the average latency and error rate
+SMOOTHING = 0.2
+
+
+def seriesKey(line):
+    """Return the measurement and tag set of a line protocol point
+
+    The key ends at the first space not escaped by an odd number of
+    backslashes, tag values may hold escaped spaces.
+
+    keyword arguments:
+    line -- line protocol string
+    """
+    space = line.find(" ")
+    while space > 0 and line[space - 1] == "\\":
+        backslashes = space - len(line[:space].rstrip("\\"))
+        if not backslashes % 2:
+            break
+        space = line.find(" ", space + 1)
+    return line[:space]
+
+
+class DeadLetter(object):
+    """Append points rejected by the database to a line protocol file
+
+    Each point is preceded by a comment with the time and reason it was
+    rejected, comments are skipped by influx -import so the file can be
+    loaded again once the points are fixed.
+
+    keyword arguments:
+    path -- file to append to, opened on the first rejected point, shared by
+            the writers of all shards
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def write(self, line, reason):
+        reason = " ".join(str(reason).split())
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a")
+            self.file.write("# {0} {1}\n{2}\n".format(time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), reason, line))
+            self.file.flush()
+            self.count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class BatchController(object):
+    """Adapt the batch size to the observed write latency
+
+    Additive increase, multiplicative decrease: every full batch written
+    within targetLatency seconds grows the batch size by a step, every slower
+    or failed write shrinks it by a factor. Under load batches grow until the
+    database starts to slow down, then hover just below that point. Batches
+    which are not full, because points arrive slowly, leave the size as is.
+
+    keyword arguments:
+    minSize -- smallest batch size
+    maxSize -- largest batch size
+    targetLatency -- seconds a batch write may take
+    increase -- points added after a fast full batch, minSize if None
+    decrease -- factor applied after a slow or failed write
+    """
+
+    def __init__(self, minSize=10, maxSize=5000, targetLatency=0.5, increase=None, decrease=0.5):
+        self.minSize = minSize
+        self.maxSize = maxSize
+        self.targetLatency = targetLatency
+        self.increase = increase
+        self.decrease = decrease
+
+        # Smoothed write latency in seconds and share of failed writes
+        self.latency = 0.0
+        self.errorRate = 0.0
+
+        # Counters of batch size changes
+        self.increases = 0
+        self.decreases = 0
+
+    def observe(self, batchSize, points, seconds, failed=False):
+        """Return the batch size to use after a write attempt
+
+        keyword arguments:
+        batchSize -- current batch size
+        points -- points in the batch written
+        seconds -- duration of the write attempt
+        failed -- True if the write failed
+        """
+        self.latency += SMOOTHING * (seconds - self.latency)
+        self.errorRate += SMOOTHING * ((1.0 if failed else 0.0) - self.errorRate)
+
+        if failed or seconds > self.targetLatency:
+            newSize = max(self.minSize, int(batchSize * self.decrease))
+            if newSize < batchSize:
+                self.decreases += 1
+                logger.debug("Write took {0:.3f} s{1}, batch size {2}".format(seconds, " and failed" if failed else "", newSize))
+            return newSize
+
+        if points >= batchSize:
+            newSize = min(self.maxSize, batchSize + (self.increase or self.minSize))
+            if newSize > batchSize:
+                self.increases += 1
+            return newSize
+
+        return min(self.maxSize, max(self.minSize, batchSize))
+
+
+class BatchWriter(object):
+    """Collect line protocol points and write them to a sink in batches
+
+    A batch is written once batchSize points are waiting or flushInterval
+    seconds have passed since the last write, whichever comes first. Writing
+    happens on the writer thread so slow sinks do not stall packet reception.
+    Points wait in a bounded queue which sheds load when the sink falls behind.
+    Each batch is sorted by series key, keeping the arrival order of the
+    points of a series, which the database ingests more cheaply. With a
+    BatchController the batch size follows the write latency.
+
+    Failed writes are retried with jittered exponential backoff. Batches the
+    database rejects for their content are split in halves until the
+    offending points are isolated, those go to the dead letter file and the
+    rest of the batch is written.
+
+    keyword arguments:
+    sink -- output sink from aprs2influxdb.sinks
+    batchSize -- points per batch
+    flushInterval -- maximum seconds between writes
+    queue -- BoundedQueue feeding the writer, a default one if None
+    retries -- attempts after the first failed write of a batch
+    retryDelay -- seconds before the first retry, doubled for each retry
+    deadLetter -- DeadLetter for rejected points, logged only if None
+    controller -- BatchController adapting batchSize, fixed size if None
+    tracer -- tracing.Tracer noting when traced points are written, or None
+    """
+
+    def __init__(self, sink, batchSize=100, flushInterval=1.0, queue=None, retries=5, retryDelay=0.5, deadLetter=None,
+                 controller=None, tracer=None):
+        self.sink = sink
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.queue = queue if queue is not None else BoundedQueue("write")
+        self.retries = retries
+        self.retryDelay = retryDelay
+        self.deadLetter = deadLetter
+        self.controller = controller
+        self.tracer = tracer
+        self.stopping = False
+
+        # Traced points shed by the queue are no longer looked for
+        if tracer is not None:
+            self.queue.onShed = tracer.discard
+        self.thread = None
+
+        # Throughput counters
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+
+    def add(self, line, priority=NORMAL):
+        """Queue a line protocol point for writing
+
+        keyword arguments:
+        line -- line protocol string without trailing newline
+        priority -- shedding priority from aprs2influxdb.pipeline
+        """
+        self.queue.put(line, priority)
+
+    def run(self):
+        """Writer thread, writes batches until stopped and the queue is empty"""
+        logger.debug("Starting writer thread")
+        while not self.stopping or len(self.queue):
+            points = self.queue.getBatch(self.batchSize, self.flushInterval)
+            if points:
+                # Only batches written completely acknowledge their traces
+                traces = self.tracer.take(points) if self.tracer is not None and self.tracer.pending else None
+                lost = self.failed + self.rejected
+
+                points.sort(key=seriesKey)
+                self.write(points)
+                if traces and self.failed + self.rejected == lost:
+                    self.tracer.acknowledge(traces)
+        logger.debug("Stopped writer thread")
+
+    def stop(self, timeout=None):
+        """Write the queued points and stop the writer thread
+
+        Returns False if points were still queued after timeout seconds.
+
+        keyword arguments:
+        timeout -- seconds to wait for the queue to drain, None waits forever
+        """
+        self.stopping = True
+        if self.thread is not None:
+            self.thread.join(timeout)
+            return not self.thread.is_alive()
+        return True
+
+    def write(self, points):
+        """Write a list of points to the sink as one batch
+
+        keyword arguments:
+        points -- list of line protocol strings
+        """
+        # Terminating empty string makes join end the payload with a newline
+        points.append("")
+        payload = "\n".join(points)
+        points.pop()
+
+        for attempt in range(self.retries + 1):
+            start = time.time()
+            try:
+                self.sink.write(payload)
+                self.written += len(points)
+                self.batches += 1
+                self.adapt(len(points), time.time() - start, False)
+                return
+
+            except Exception as e:
+                code = getattr(e, "code", None)
+
+                # Bad points will not succeed on retry, find them instead
+                if code in REJECTED_CODES:
+                    self.reject(points, e)
+                    return
+
+                self.adapt(len(points), time.time() - start, True)
+
+                # Other client errors such as authentication are permanent
+                permanent = code is not None and 400 <= code < 500 and code not in RETRY_CODES
+                if permanent or attempt == self.retries:
+                    # Sink specific errors are logged and the batch discarded
+                    self.failed += len(points)
+                    logger.error('An error occured writing a batch of {0} points'.format(len(points)), exc_info=True)
+                    logger.debug("Batch: {0}".format(points))
+                    return
+
+                # Full jitter keeps restarted writers from retrying in step
+                delay = random.uniform(0, min(MAX_RETRY_DELAY, self.retryDelay * 2 ** attempt))
+                self.retried += 1
+                logger.warning("Writing a batch of {0} points failed: {1}, retry {2} in {3:.1f} s".format(len(points), e, attempt + 1, delay))
+                time.sleep(delay)
+
+    def adapt(self, points, seconds, failed):
+        """Let the controller adjust the batch size after a write attempt
+
+        keyword arguments:
+        points -- points in the batch written
+        seconds -- duration of the write attempt
+        failed -- True if the write failed
+        """
+        if self.controller is not None:
+            self.batchSize = self.controller.observe(self.batchSize, points, seconds, failed)
+
+    def reject(self, points, error):
+        """Split a rejected batch and write the halves, dead letter single points
+
+        keyword arguments:
+        points -- list of line protocol strings rejected together
+        error -- exception raised by the sink
+        """
+        if len(points) > 1:
+            half = len(points) // 2
+            self.write(points[:half])
+            self.write(points[half:])
+            return
+
+        self.rejected += 1
+        logger.warning("Point rejected: {0}".format(error))
+        logger.debug("Rejected point: {0}".format(points[0]))
+        if self.deadLetter is not None:
+            self.deadLetter.write(points[0], error)
+
+    def start(self):
+        """Start the writer thread and return it"""
+        self.thread = threading.Thread(target=self.run, name="writer")
+        self.thread.daemon = True
+        self.thread.start()
+        return self.thread
@@ -0,0 +1,76 @@
+"""Measure the CPU cost of encoding parsed packets into line protocol
+
+Encodes aprslib-style packets of the common formats with jsonToLineProtocol
+and reports the best time per packet of several repeats for each format and
+overall. Run from the source directory:
+
+    python benchmarks/encode.py [--packets N]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Import the package from the source directory the script is run in
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aprs2influxdb import lineprotocol
+
+# Parsed packets as aprslib returns them, one per common format
+PACKETS = [
+    {"format": "uncompressed", "from": "KB1LQC-9", "to": "APRS", "via": "",
+     "path": ["WIDE1-1", "qAR", "W1XM"], "latitude": 42.3601, "longitude": -71.0589,
+     "symbol": ">", "symbol_table": "/", "messagecapable": False, "posambiguity": 0,
+     "altitude": 12.192, "course": 90, "speed": 66.672, "comment": "On the road",
+     "raw": "KB1LQC-9>APRS,WIDE1-1,qAR,W1XM:!4221.61N/07103.53W>090/036/A=000040On the road"},
+    {"format": "mic-e", "from": "N0CALL-7", "to": "T2SP0W", "via": "",
+     "path": ["WIDE1-1", "WIDE2-1", "qAR", "N0CALL-10"], "latitude": 42.0583, "longitude": -72.0292,
+     "symbol": "[", "symbol_table": "/", "posambiguity": 0, "altitude": 245, "course": 278,
+     "speed": 3.704, "mbits": "111", "mtype": "M0: Off Duty", "comment": "Kenwood TH-D74",
+     "raw": "N0CALL-7>T2SP0W,WIDE1-1,WIDE2-1,qAR,N0CALL-10:`c5xl!j[/`\"4V}Kenwood TH-D74_%"},
+    {"format": "object", "from": "W1AW", "to": "APRS", "via": "", "path": ["TCPIP*", "qAC", "T2BOSTON"],
+     "object_name": "HAMFEST", "alive": True, "object_format": "uncompressed", "timestamp": 1500000000,
+     "latitude": 41.7147, "longitude": -72.7272, "symbol": "-", "symbol_table": "/", "posambiguity": 0,
+     "comment": "Hamfest Saturday 8am",
+     "raw": "W1AW>APRS,TCPIP*,qAC,T2BOSTON:;HAMFEST  *092345z4142.88N/07243.63W-Hamfest Saturday 8am"},
+    {"format": "wx", "from": "EW1234", "to": "APRS", "via": "", "path": ["TCPXX*", "qAX", "CWOP-1"],
+     "wx_raw_timestamp": "10090556", "comment": "",
+     "weather": {"wind_direction": 220, "wind_speed": 1.78816, "wind_gust": 2.2352, "temperature": 25.0,
+                 "rain_1h": 0.0, "rain_24h": 0.0, "rain_since_midnight": 0.0, "humidity": 50, "pressure": 990.0},
+     "raw": "EW1234>APRS,TCPXX*,qAX,CWOP-1:_10090556c220s004g005t077r000p000P000h50b09900"},
+    {"format": "message", "from": "KB1LQC", "to": "APRS", "via": "", "path": ["TCPIP*", "qAC", "T2TEXAS"],
+     "addresse": "N0CALL", "message_text": "Hello there", "msgNo": 12,
+     "raw": "KB1LQC>APRS,TCPIP*,qAC,T2TEXAS::N0CALL   :Hello there{12"},
+]
+
+
+def measure(packets, count, received, repeat):
+    """Return the best seconds of repeat runs encoding count packets"""
+    encode = lineprotocol.jsonToLineProtocol
+    best = None
+    for run in range(repeat):
+        start = time.time()
+        for sequence in range(count):
+            encode(packets[sequence % len(packets)], received)
+        seconds = time.time() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark line protocol encoding')
+    parser.add_argument('--packets', help='Packets to encode per format', type=int, default=100000)
+    parser.add_argument('--repeat', help='Runs of which the fastest is reported', type=int, default=5)
+    args = parser.parse_args()
+
+    received = time.time()
+    print("python {0}".format(sys.version.split()[0]))
+    for packet in PACKETS:
+        seconds = measure([packet], args.packets, received, args.repeat)
+        print("{0:<14} {1:6.2f} us/packet".format(packet["format"], seconds / args.packets * 1e6))
+    seconds = measure(PACKETS, args.packets * len(PACKETS), received, args.repeat)
+    print("{0:<14} {1:6.2f} us/packet".format("all", seconds / (args.packets * len(PACKETS)) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Local stand-ins for an APRS-IS server and an influxdb /write endpoint
+
+FakeAPRSIS speaks enough of the APRS-IS protocol for a client to log in and
+then streams packets at a fixed rate. FakeInfluxDB accepts line protocol
+batches on /write, records them, and can inject latency and errors. Both run
+in background threads on an ephemeral local port.
+"""
+import random
+import socket
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+# Synthetic packet bodies covering the common formats, {0} is a sequence number
+SYNTHETIC = [
+    "!4903.50N/07201.75W-Synthetic position {0}",
+    "=4903.50N/07201.75W>090/036/A=001234 Mobile {0}",
+    "@092345z4903.50N/07201.75W_220/004g005t077r000p000P000h50b09900wx {0}",
+    ">Synthetic status {0}",
+    ":N0CALL   :Synthetic message{{{0}",
+    ";OBJECT   *092345z4903.50N/07201.75W-Object {0}",
+]
+
+
+def callsign(index, ssid=0):
+    """Return a valid APRS callsign of up to six characters for a station number
+
+    keyword arguments:
+    index -- station number, written in base 36 after a T
+    ssid -- secondary station identifier, omitted if 0
+    """
+    digits = ""
+    while True:
+        index, digit = divmod(index, 36)
+        digits = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"[digit] + digits
+        if not index:
+            break
+    return "T" + digits[-5:] + ("-{0}".format(ssid) if ssid else "")
+
+
+def syntheticPackets(stations=500):
+    """Yield an endless stream of synthetic raw APRS packets
+
+    keyword arguments:
+    stations -- number of distinct source callsigns
+    """
+    sequence = 0
+    while True:
+        source = callsign(sequence % stations, sequence % 15)
+        body = SYNTHETIC[sequence % len(SYNTHETIC)].format(sequence)
+        yield "{0}>APRS,WIDE1-1,qAR,FAKE:{1}".format(source, body)
+        sequence += 1
+
+
+def recordedPackets(path):
+    """Yield raw APRS packets from a file, starting over at the end
+
+    keyword arguments:
+    path -- file with one raw packet per line
+    """
+    with open(path) as packetFile:
+        packets = [line.rstrip("\r\n") for line in packetFile if line.strip() and not line.startswith("#")]
+    while True:
+        for packet in packets:
+            yield packet
+
+
+class FakeAPRSIS(object):
+    """APRS-IS server streaming packets to every client that logs in
+
+    keyword arguments:
+    packets -- iterator of raw packet strings
+    rate -- packets per second sent to each client
+    """
+
+    def __init__(self, packets, rate=100):
+        self.packets = packets
+        self.rate = rate
+        self.sent = 0
+        self.logins = []
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(5)
+        self.port = self.listener.getsockname()[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.accept)
+        thread.daemon = True
+        thread.start()
+
+    def accept(self):
+        while True:
+            client, address = self.listener.accept()
+            thread = threading.Thread(target=self.serve, args=(client,))
+            thread.daemon = True
+            thread.start()
+
+    def serve(self, client):
+        try:
+            # Banner, then wait for "user CALL pass PASS vers ..." login line
+            client.sendall(b"# aprsc 2.1.4 fake\r\n")
+            login = b""
+            while not login.endswith(b"\n"):
+                data = client.recv(512)
+                if not data:
+                    return
+                login += data
+            callsign = login.decode("latin-1").split()[1]
+            self.logins.append(login.decode("latin-1").strip())
+            client.sendall("# logresp {0} verified, server FAKE\r\n".format(callsign).encode("latin-1"))
+
+            # Discard anything the client sends, such as heartbeats
+            drain = threading.Thread(target=self.drain, args=(client,))
+            drain.daemon = True
+            drain.start()
+
+            self.stream(client)
+        except socket.error:
+            pass
+        finally:
+            client.close()
+
+    def drain(self, client):
+        try:
+            while client.recv(4096):
+                pass
+        except socket.error:
+            pass
+
+    def stream(self, client):
+        """Send packets in small bursts to hold the configured rate"""
+        start = lastComment = time.time()
+        sent = 0
+        while True:
+            now = time.time()
+            due = int((now - start) * self.rate) - sent
+            if due > 0:
+                lines = [next(self.packets) for count in range(due)]
+                client.sendall(("\r\n".join(lines) + "\r\n").encode("latin-1"))
+                sent += due
+                self.sent += due
+
+            # Server comment lines are part of a real feed as well
+            if now - lastComment >= 20:
+                client.sendall(b"# aprsc 2.1.4 fake keepalive\r\n")
+                lastComment = now
+            time.sleep(0.005)
+
+
+class FakeInfluxDB(object):
+    """influxdb HTTP endpoint recording line protocol batches
+
+    keyword arguments:
+    latency -- seconds to wait before answering each write
+    errorRate -- fraction of writes answered with errorCode
+    errorCode -- HTTP status of injected errors, 500 or 400
+    """
+
+    def __init__(self, latency=0.0, errorRate=0.0, errorCode=500):
+        self.latency = latency
+        self.errorRate = errorRate
+        self.errorCode = errorCode
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.points = 0
+        self.errors = 0
+        self.latencies = []
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive like influxdb so client sessions reuse connections
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                # /ping and /query used by clients to check the server
+                status = 204 if self.path.startswith("/ping") else 200
+                body = b"" if status == 204 else b'{"results":[{"statement_id":0}]}'
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                status = fake.record(body) if self.path.startswith("/write") else 404
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def record(self, body):
+        """Record a batch and return the HTTP status to answer with"""
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.errorRate:
+            with self.lock:
+                self.errors += 1
+            return self.errorCode
+
+        # Latency from reception in aprs2influxdb to arrival here
+        now = time.time()
+        lines = body.decode("utf-8", "replace").splitlines()
+        latencies = []
+        for line in lines:
+            timestamp = line.rsplit(" ", 1)[-1]
+            if timestamp.isdigit():
+                latencies.append(now - int(timestamp) / 1e9)
+
+        with self.lock:
+            self.batches += 1
+            self.points += len(lines)
+            self.latencies.extend(latencies)
+        return 204
+
+    def takeLatencies(self):
+        """Return and reset latencies recorded since the last call"""
+        with self.lock:
+            latencies = self.latencies
+            self.latencies = []
+        return latencies
@@ -0,0 +1,94 @@
+"""Measure memory held by long lived per packet strings with and without interning
+
+Splits synthetic raw packets into new callsign and path strings the way
+aprslib does, shares them through an intern table and keeps them the way
+the columnar export buffers and per station caches of a long running process
+do: the source, destination and joined path of the last --rows packets and
+an entry per station. Without a --internsize every configuration of
+--compare is measured in a child process of its own. Reports peak RSS growth,
+peak traced allocations on Python 3 and the time per packet. Run from the
+source directory:
+
+    python benchmarks/interning.py [--rows N] [--stations N]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+# Import the package from the source directory the script is run in
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aprs2influxdb.interning import InternTable
+from fakes import callsign
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def rawPacket(sequence, stations):
+    """Return a raw packet of one of stations heard through one of a few hundred iGates"""
+    station = sequence * 7919 % stations
+    return "{0}>APRS,WIDE1-1,WIDE2-1,qAR,IGATE{1}:>Status {2}".format(
+        callsign(station, station % 15), station % 300, sequence)
+
+
+def measure(args):
+    shared = InternTable(args.internsize)
+    raws = [rawPacket(sequence, args.stations) for sequence in range(args.rows)]
+
+    if tracemalloc:
+        tracemalloc.start()
+    baseRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+
+    # Parse and retain the fields like export buffers and station caches
+    sources, destinations, paths, stationState = [], [], [], {}
+    for raw in raws:
+        header = raw.split(":", 1)[0]
+        source, _, route = header.partition(">")
+        hops = route.split(",")
+        packet = shared.internPacket({"from": source, "to": hops[0], "path": hops[1:]})
+        sources.append(packet["from"])
+        destinations.append(packet["to"])
+        paths.append(shared.joinPath(packet["path"]))
+        stationState[packet["from"]] = len(sources)
+    end = time.time()
+
+    peakRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    line = "internsize {0}: {1:.2f} us/packet, peak rss growth {2:.1f} MiB".format(
+        args.internsize, (end - start) / args.rows * 1e6, (peakRss - baseRss) / 1024.0)
+    if tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        line += ", peak traced allocations {0:.1f} MiB".format(peak / 1048576.0)
+    if args.internsize:
+        line += ", {0:.1%} shared".format(shared.hits / float(max(1, shared.hits + shared.misses)))
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark memory of retained strings with and without interning')
+    parser.add_argument('--rows', help='Packets retained', type=int, default=200000)
+    parser.add_argument('--stations', help='Distinct source callsigns', type=int, default=5000)
+    parser.add_argument('--internsize', help='Intern table generation size, measures --compare sizes if not given', type=int, default=None)
+    parser.add_argument('--compare', help='Comma separated intern table sizes to compare', default="0,20000")
+    args = parser.parse_args()
+
+    if args.internsize is not None:
+        measure(args)
+        return
+
+    # Separate processes keep the peak RSS of one run out of the next
+    print("python {0}, {1} packets from {2} stations".format(sys.version.split()[0], args.rows, args.stations))
+    sys.stdout.flush()
+    for size in args.compare.split(","):
+        subprocess.check_call([sys.executable, __file__, "--rows", str(args.rows), "--stations", str(args.stations),
+                               "--internsize", size.strip()])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""End-to-end throughput test of aprs2influxdb against local fake servers
+
+Starts a FakeAPRSIS streaming synthetic or recorded packets and a FakeInfluxDB,
+runs aprs2influxdb main() in a child process against both, and reports once a
+second the points written, end-to-end latency and the child's memory use.
+Run from the source directory:
+
+    python benchmarks/loadtest.py --rate 2000 --duration 60 -- --batchsize 500
+
+Arguments after -- are passed to aprs2influxdb.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from fakes import FakeAPRSIS, FakeInfluxDB, recordedPackets, syntheticPackets
+
+
+def rss(pid):
+    """Return resident memory of a process in MiB from /proc, or 0"""
+    try:
+        with open("/proc/{0}/status".format(pid)) as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+    return 0
+
+
+def percentile(values, fraction):
+    """Return the value at a fraction of the sorted values, or 0"""
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test aprs2influxdb with fake APRS-IS and influxdb servers')
+    parser.add_argument('--rate', help='Packets per second sent by the fake APRS-IS', type=int, default=1000)
+    parser.add_argument('--duration', help='Seconds to run', type=int, default=30)
+    parser.add_argument('--replay', help='File of raw packets to send instead of synthetic ones', default=None)
+    parser.add_argument('--latency', help='Seconds the fake influxdb waits per write', type=float, default=0.0)
+    parser.add_argument('--errorrate', help='Fraction of writes the fake influxdb fails', type=float, default=0.0)
+    parser.add_argument('--errorcode', help='HTTP status of injected write errors', type=int, default=500)
+    parser.add_argument('extra', nargs='*', help='Arguments passed to aprs2influxdb')
+    args = parser.parse_args()
+
+    packets = recordedPackets(args.replay) if args.replay else syntheticPackets()
+    aprsis = FakeAPRSIS(packets, args.rate)
+    influx = FakeInfluxDB(args.latency, args.errorrate, args.errorcode)
+    aprsis.start()
+    influx.start()
+
+    command = [sys.executable, "-m", "aprs2influxdb",
+               "--host", "127.0.0.1", "--port", str(aprsis.port),
+               "--dbhost", "127.0.0.1", "--dbport", str(influx.port),
+               "--callsign", "N0CALL"] + args.extra
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    child = subprocess.Popen(command, cwd=root)
+
+    print("{0:>5} {1:>9} {2:>9} {3:>9} {4:>9} {5:>9} {6:>8}".format("sec", "sent/s", "points/s", "p50 ms", "p99 ms", "errors", "rss MiB"))
+    allLatencies = []
+    memory = []
+    lastSent = lastPoints = 0
+    try:
+        for second in range(1, args.duration + 1):
+            time.sleep(1)
+            latencies = influx.takeLatencies()
+            allLatencies.extend(latencies)
+            memory.append(rss(child.pid))
+            print("{0:>5} {1:>9} {2:>9} {3:>9.1f} {4:>9.1f} {5:>9} {6:>8.1f}".format(
+                second, aprsis.sent - lastSent, influx.points - lastPoints,
+                percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000,
+                influx.errors, memory[-1]))
+            lastSent, lastPoints = aprsis.sent, influx.points
+            if child.poll() is not None:
+                print("aprs2influxdb exited with {0}".format(child.returncode))
+                break
+    finally:
+        if child.poll() is None:
+            child.send_signal(signal.SIGTERM)
+            time.sleep(2)
+            if child.poll() is None:
+                child.kill()
+
+    print("")
+    print("packets sent {0}, points written {1} in {2} batches, {3} injected errors".format(aprsis.sent, influx.points, influx.batches, influx.errors))
+    print("sustained points/s {0:.1f}".format(influx.points / float(args.duration)))
+    print("latency ms p50 {0:.1f} p95 {1:.1f} p99 {2:.1f} max {3:.1f}".format(
+        percentile(allLatencies, 0.5) * 1000, percentile(allLatencies, 0.95) * 1000,
+        percentile(allLatencies, 0.99) * 1000, percentile(allLatencies, 1) * 1000))
+    if memory:
+        print("rss MiB start {0:.1f} end {1:.1f} max {2:.1f}".format(memory[0], memory[-1], max(memory)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Measure memory and time of encoding, queuing and batching packets
+
+Encodes synthetic aprslib-style packets, holds the resulting points in a
+write queue the way a backlog builds up during a slow write, then drains the
+queue into batch payloads. Reports wall clock time, peak RSS and, on Python 3,
+peak traced allocations and garbage collector runs. Run from the source
+directory:
+
+    python benchmarks/memory.py [--packets N]
+"""
+import argparse
+import gc
+import os
+import resource
+import sys
+import time
+
+# Import the package from the source directory the script is run in
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aprs2influxdb import lineprotocol
+from aprs2influxdb.pipeline import BoundedQueue, FORMAT_PRIORITY
+from aprs2influxdb.writer import BatchWriter
+from fakes import callsign
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class NullSink(object):
+    """Sink discarding payloads, counting bytes"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, payload):
+        self.bytes += len(payload)
+
+    def close(self):
+        pass
+
+
+def syntheticPacket(sequence):
+    """Return a dictionary shaped like aprslib output for a position packet"""
+    source = callsign(sequence % 500, sequence % 15)
+    return {
+        "format": "uncompressed",
+        "from": source,
+        "to": "APRS",
+        "via": "",
+        "path": ["WIDE1-1", "qAR", "FAKE"],
+        "latitude": 49.0583 + sequence % 100 * 0.001,
+        "longitude": -72.0292,
+        "symbol": "-",
+        "symbol_table": "/",
+        "messagecapable": False,
+        "posambiguity": 0,
+        "altitude": 376.1232,
+        "comment": "Synthetic position {0}".format(sequence),
+        "raw": "{0}>APRS,WIDE1-1,qAR,FAKE:!4903.50N/07201.75W-Synthetic position {1}".format(source, sequence),
+        "weather": {"temperature": 25.0, "humidity": 50, "pressure": 990.0},
+    }
+
+
+def gcRuns():
+    """Return total garbage collector runs where supported"""
+    if hasattr(gc, "get_stats"):
+        return sum(stats["collections"] for stats in gc.get_stats())
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark encoder and queue memory use')
+    parser.add_argument('--packets', help='Packets to encode and queue', type=int, default=200000)
+    parser.add_argument('--batchsize', help='Points per written batch', type=int, default=500)
+    args = parser.parse_args()
+
+    packets = [syntheticPacket(sequence) for sequence in range(1000)]
+    queue = BoundedQueue("write", args.packets, "block")
+    writer = BatchWriter(NullSink(), args.batchsize, 0, queue)
+    received = time.time()
+
+    if tracemalloc:
+        tracemalloc.start()
+    baseRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    runs = gcRuns()
+    start = time.time()
+
+    # Encode every packet and hold the points in the queue
+    for sequence in range(args.packets):
+        packet = dict(packets[sequence % len(packets)])
+        line = lineprotocol.jsonToLineProtocol(packet, received + sequence * 1e-3)
+        writer.add(line, FORMAT_PRIORITY[packet["format"]])
+    encoded = time.time()
+
+    # Drain the backlog in batches
+    while len(queue):
+        writer.write(queue.getBatch(args.batchsize, 0))
+    end = time.time()
+
+    peakRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print("python {0}".format(sys.version.split()[0]))
+    print("packets {0}, bytes written {1}".format(args.packets, writer.sink.bytes))
+    print("encode+queue {0:.2f} s, drain {1:.2f} s, {2:.1f} us/packet".format(encoded - start, end - encoded, (end - start) / args.packets * 1e6))
+    print("peak rss growth {0:.1f} MiB".format((peakRss - baseRss) / 1024.0))
+    if tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        print("peak traced allocations {0:.1f} MiB, gc runs {1}".format(peak / 1048576.0, gcRuns() - runs))
+
+
+if __name__ == "__main__":
+    main()
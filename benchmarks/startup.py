@@ -0,0 +1,64 @@
+"""Measure aprs2influxdb start up time
+
+Runs short lived interpreter invocations several times and reports the best
+and median wall clock time of each, together with the heavy client libraries
+that were loaded. Run from the source directory:
+
+    python benchmarks/startup.py [--runs N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Libraries which should only load once a connection or write is needed
+HEAVY = ["aprslib", "influxdb", "requests", "pandas", "zstandard"]
+
+CASES = [
+    ("interpreter", ["-c", "pass"]),
+    ("import lineprotocol", ["-c", "import aprs2influxdb.lineprotocol"]),
+    ("import __main__", ["-c", "import aprs2influxdb.__main__"]),
+    ("aprs2influxdb --help", ["-m", "aprs2influxdb", "--help"]),
+]
+
+
+def timeCommand(arguments, runs):
+    """Return sorted wall clock times in milliseconds of a python invocation
+
+    keyword arguments:
+    arguments -- interpreter arguments
+    runs -- number of invocations
+    """
+    times = []
+    with open(os.devnull, "w") as devnull:
+        for run in range(runs):
+            start = time.time()
+            subprocess.call([sys.executable] + arguments, stdout=devnull, stderr=devnull)
+            times.append((time.time() - start) * 1000)
+    return sorted(times)
+
+
+def loadedModules(statement):
+    """Return the heavy modules present in sys.modules after a statement"""
+    check = "{0}; import sys; print(','.join(m for m in {1!r} if m in sys.modules))".format(statement, HEAVY)
+    output = subprocess.check_output([sys.executable, "-c", check])
+    return output.decode("ascii").strip() or "none"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark aprs2influxdb start up time')
+    parser.add_argument('--runs', help='Invocations per case', type=int, default=20)
+    args = parser.parse_args()
+
+    print("{0:<24} {1:>10} {2:>10}".format("case", "best ms", "median ms"))
+    for name, arguments in CASES:
+        times = timeCommand(arguments, args.runs)
+        print("{0:<24} {1:>10.1f} {2:>10.1f}".format(name, times[0], times[len(times) // 2]))
+
+    for module in ("aprs2influxdb.lineprotocol", "aprs2influxdb.__main__"):
+        print("heavy modules after importing {0}: {1}".format(module, loadedModules("import " + module)))
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,9 @@ setup(
         "six>=1.11.0",
         "urllib3>=1.22",
     ],
+    extras_require={
+        "export": ["pyarrow>=0.16"],
+    },
     entry_points={
         'console_scripts':
             ['aprs2influxdb = aprs2influxdb.__main__:main']
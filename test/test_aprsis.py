@@ -0,0 +1,79 @@
+import unittest
+
+from aprs2influxdb import aprsis
+from aprs2influxdb.aprsis import APRSIS, APRSISError
+
+# Stream of server comments and packets with both line endings
+STREAM = (b"# aprsc 2.1.10\r\n"
+          b"N0CALL>APRS,TCPIP*,qAC,T2TEST:!4903.50N/07201.75W-Test\r\n"
+          b"N0CALL-9>APDR15,WIDE1-1*,qAR,IGATE:=4903.50N/07201.75W>\n"
+          b"# 22 Oct 2026 10:00:00 GMT T2TEST 127.0.0.1:14580\r\n"
+          b"\r\n"
+          b"WX1>APRS,TCPIP*:_10090556c220s004g005t077r000p000P000h50b09900\r\n")
+PACKETS = [b"N0CALL>APRS,TCPIP*,qAC,T2TEST:!4903.50N/07201.75W-Test",
+           b"N0CALL-9>APDR15,WIDE1-1*,qAR,IGATE:=4903.50N/07201.75W>",
+           b"WX1>APRS,TCPIP*:_10090556c220s004g005t077r000p000P000h50b09900"]
+
+
+class FakeSocket(object):
+    """Socket returning a stream in chunks of a fixed size, then closing
+
+    keyword arguments:
+    data -- bytes to return
+    chunkSize -- bytes returned by each recv_into()
+    """
+
+    def __init__(self, data, chunkSize):
+        self.data = data
+        self.chunkSize = chunkSize
+
+    def recv_into(self, view):
+        chunk, self.data = self.data[:self.chunkSize], self.data[self.chunkSize:]
+        view[:len(chunk)] = chunk
+        return len(chunk)
+
+    def close(self):
+        pass
+
+
+class APRSISTest(unittest.TestCase):
+    """Splitting of the received stream into packet lines"""
+
+    def consume(self, data, chunkSize, bufferSize=262144):
+        """Return the batches of lines and the client after reading data"""
+        client = APRSIS("N0CALL", bufferSize=bufferSize)
+        client.sock = FakeSocket(data, chunkSize)
+        batches = []
+        self.assertRaises(APRSISError, client.consumer, batches.append)
+        return batches, client
+
+    def testLinesSplitAcrossChunks(self):
+        for chunkSize in range(1, len(STREAM) + 1):
+            batches, client = self.consume(STREAM, chunkSize)
+            self.assertEqual([line for batch in batches for line in batch], PACKETS)
+            self.assertEqual(client.comments, 2)
+            self.assertEqual(client.received, len(STREAM))
+
+    def testPartialLinesMovedToFrontOfSmallBuffer(self):
+        # Every receive after the first 100 bytes needs to make room
+        data = STREAM * 50
+        for chunkSize in (7, 64, 100):
+            batches, client = self.consume(data, chunkSize, aprsis.MIN_RECEIVE + 100)
+            self.assertEqual([line for batch in batches for line in batch], PACKETS * 50)
+
+    def testReadLineWhileLoggingIn(self):
+        client = APRSIS("N0CALL")
+        client.sock = FakeSocket(b"# aprsc\r\n# logresp N0CALL unverified, server T2TEST\r\n" + STREAM, 5)
+        self.assertEqual(client.readLine(), b"# aprsc")
+        self.assertEqual(client.readLine(), b"# logresp N0CALL unverified, server T2TEST")
+        batches = []
+        self.assertRaises(APRSISError, client.consumer, batches.append)
+        self.assertEqual([line for batch in batches for line in batch], PACKETS)
+
+    def testPasscode(self):
+        self.assertEqual(aprsis.passcode("N0CALL"), aprsis.passcode("n0call-9"))
+        self.assertEqual(aprsis.passcode("N0CALL"), 13023)
+
+
+if __name__ == "__main__":
+    unittest.main()
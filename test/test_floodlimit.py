@@ -0,0 +1,76 @@
+import unittest
+
+from aprs2influxdb import floodlimit
+from aprs2influxdb.floodlimit import FloodLimiter
+
+# Start of all tests in unix time
+NOW = 1500000000.0
+
+
+def packet(source, body=b">status"):
+    """Return a raw packet of a source callsign"""
+    return source + b">APRS,TCPIP*:" + body
+
+
+class FloodLimiterTest(unittest.TestCase):
+    """Token buckets per station and data type"""
+
+    def allowed(self, limiter, line, now, count):
+        """Return how many of count packets sent at once are allowed"""
+        return sum(limiter.allow(line, now) for index in range(count))
+
+    def testBurstThenRate(self):
+        # One packet a second after a burst of three
+        limiter = FloodLimiter(60, 3)
+        self.assertEqual(self.allowed(limiter, packet(b"N0CALL"), NOW, 5), 3)
+        self.assertEqual(self.allowed(limiter, packet(b"N0CALL"), NOW + 1, 5), 1)
+        self.assertEqual(self.allowed(limiter, packet(b"N0CALL"), NOW + 10, 5), 3)
+        self.assertEqual((limiter.passed, limiter.dropped), (7, 8))
+        self.assertEqual(limiter.top(), [("N0CALL", 8)])
+
+    def testBucketsPerStationAndDataType(self):
+        limiter = FloodLimiter(60, 1)
+        self.assertTrue(limiter.allow(packet(b"N0CALL"), NOW))
+        self.assertTrue(limiter.allow(packet(b"N1CALL"), NOW))
+        self.assertTrue(limiter.allow(packet(b"N0CALL", b"!4903.50N/07201.75W-"), NOW))
+        self.assertFalse(limiter.allow(packet(b"N0CALL"), NOW))
+
+    def testAllowList(self):
+        limiter = FloodLimiter(60, 1, allow=["N0CALL", "DB0*"])
+        for source in (b"N0CALL", b"DB0ABC", b"DB0XYZ-10"):
+            self.assertEqual(self.allowed(limiter, packet(source), NOW, 5), 5)
+        self.assertEqual(self.allowed(limiter, packet(b"N0CALL-9"), NOW, 5), 1)
+        self.assertEqual(self.allowed(limiter, packet(b"DB1ABC"), NOW, 5), 1)
+
+    def testFormatRates(self):
+        rates = floodlimit.typeRates(20, {"status": 0, "wx": 60})
+        self.assertEqual(rates[b">"], 0)
+        self.assertEqual(rates[b"_"], 60)
+        self.assertEqual(rates[b"!"], 60)
+        self.assertEqual(rates[b"`"], 20)
+
+        # Status packets are unlimited, objects use the default rate
+        limiter = FloodLimiter(20, 1, {"status": 0})
+        self.assertEqual(self.allowed(limiter, packet(b"N0CALL"), NOW, 5), 5)
+        self.assertEqual(self.allowed(limiter, packet(b"N0CALL", b";OBJECT   *092345z4903.50N/07201.75W>"), NOW, 5), 1)
+
+    def testMostThrottledKeptWhenFull(self):
+        limiter = FloodLimiter(60, 1, maxStations=4)
+        for index in range(10):
+            source = "T{0}".format(index).encode()
+            self.allowed(limiter, packet(source), NOW, index + 2)
+        self.assertEqual(limiter.throttledStations, 10)
+        self.assertEqual(limiter.dropped, sum(range(1, 11)))
+        self.assertTrue(len(limiter.throttled) <= 4)
+        self.assertEqual(limiter.top(2), [("T9", 10), ("T8", 9)])
+
+    def testRefilledBucketsExpired(self):
+        limiter = FloodLimiter(60, 1)
+        limiter.allow(packet(b"N0CALL"), NOW)
+        limiter.allow(packet(b"N1CALL"), NOW + 0.5)
+        limiter.sweep(NOW + 1.2)
+        self.assertEqual(list(limiter.buckets), [b">N1CALL"])
+
+
+if __name__ == "__main__":
+    unittest.main()
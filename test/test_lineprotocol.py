@@ -0,0 +1,201 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import aprslib
+
+from aprs2influxdb import __main__ as main
+from aprs2influxdb import fieldtypes
+from aprs2influxdb import lineprotocol
+from aprs2influxdb import sinks
+from aprs2influxdb import telemetry
+from aprs2influxdb.writer import BatchWriter
+
+# Receive time of all packets
+RECEIVED = 1500000000.5
+
+# Raw packets and their line protocol as written by the per-format encoder
+# functions the compiled plan replaced, with numbers in the field types
+# declared since
+FIXTURES = [
+    (b'N0CALL-9>APDR15,WIDE1-1,qAR,IGATE:=4903.50N/07201.75W>088/036/A=001234 mobile "test"',
+     'packet,format=uncompressed latitude=49.0583333333,longitude=-72.0291666667,posambiguity=0,altitude=376.1232,speed=66.672,course=88,from="N0CALL-9",to="APDR15",messagecapable="True",via="IGATE",path="WIDE1-1,qAR,IGATE",comment="mobile \\"test\\"",raw="N0CALL-9>APDR15,WIDE1-1,qAR,IGATE:=4903.50N/07201.75W>088/036/A=001234 mobile \\"test\\"",symbol=">",symbol_table="/" 1500000000500000000'),
+    (b'WX1>APRS,TCPIP*,qAC,T2TEST:!4903.50N/07201.75W_220/004g005t077r000p000P000h50b09900',
+     'packet,format=uncompressed latitude=49.0583333333,longitude=-72.0291666667,posambiguity=0,from="WX1",to="APRS",messagecapable="False",via="T2TEST",path="TCPIP*,qAC,T2TEST",raw="WX1>APRS,TCPIP*,qAC,T2TEST:!4903.50N/07201.75W_220/004g005t077r000p000P000h50b09900",symbol="_",symbol_table="/",humidity=50,pressure=990.0,rain_1h=0.0,rain_24h=0.0,rain_since_midnight=0.0,temperature=25.0,wind_direction=220,wind_gust=2.2352,wind_speed=1.78816 1500000000500000000'),
+    (b'N0CALL>APRS,TCPIP*,qAC,T2TEST:>status text',
+     'packet,format=status from="N0CALL",via="T2TEST",to="APRS",path="TCPIP*,qAC,T2TEST",status="status text",raw="N0CALL>APRS,TCPIP*,qAC,T2TEST:>status text" 1500000000500000000'),
+    (b'N0CALL>APRS,TCPIP*,qAC,T2TEST::BLN1     :bulletin text',
+     'packet,format=bulletin bid=1.0,from="N0CALL",to="APRS",via="T2TEST",path="TCPIP*,qAC,T2TEST",message_text="bulletin text",raw="N0CALL>APRS,TCPIP*,qAC,T2TEST::BLN1     :bulletin text" 1500000000500000000'),
+    (b'N0CALL>APRS,TCPIP*,qAC,T2TEST::N1CALL   :hello there{42',
+     'packet,format=message msgNo=42.0,from="N0CALL",to="APRS",via="T2TEST",addresse="N1CALL",path="TCPIP*,qAC,T2TEST",message_text="hello there",raw="N0CALL>APRS,TCPIP*,qAC,T2TEST::N1CALL   :hello there{42" 1500000000500000000'),
+    (b'N0CALL-9>S32U6T,WIDE1-1,qAR,IGATE:`(_fn"Oj/]mobile',
+     'packet,format=mic-e latitude=33.4273333333,longitude=-12.129,posambiguity=0,speed=37.04,course=251,mbits=100.0,from="N0CALL-9",via="IGATE",to="S32U6T",mtype="M3: Returning",path="WIDE1-1,qAR,IGATE",comment="]mobile",raw="N0CALL-9>S32U6T,WIDE1-1,qAR,IGATE:`(_fn\\"Oj/]mobile",symbol="j",symbol_table="/" 1500000000500000000'),
+    (b'N0CALL>APRS,TCPIP*,qAC,T2TEST:=/5L!!<*e7>7P[ compressed',
+     'packet,format=compressed latitude=49.5,longitude=-72.7500039378,speed=67.1016865367,course=88,from="N0CALL",to="APRS",messagecapable="True",via="T2TEST",path="TCPIP*,qAC,T2TEST",comment="compressed",raw="N0CALL>APRS,TCPIP*,qAC,T2TEST:=/5L!!<*e7>7P[ compressed",symbol=">",symbol_table="/" 1500000000500000000'),
+    (b'N0CALL>APRS,TCPIP*,qAC,T2TEST:_10090556c220s004g005t077r000p000P000h50b09900wRSW',
+     'packet,format=wx from="N0CALL",to="APRS",via="T2TEST",path="TCPIP*,qAC,T2TEST",comment="wRSW",raw="N0CALL>APRS,TCPIP*,qAC,T2TEST:_10090556c220s004g005t077r000p000P000h50b09900wRSW",wx_raw_timestamp="10090556",humidity=50,pressure=990.0,rain_1h=0.0,rain_24h=0.0,rain_since_midnight=0.0,temperature=25.0,wind_direction=220,wind_gust=2.2352,wind_speed=1.78816 1500000000500000000'),
+    (b'N0CALL>APRS,TCPIP*,qAC,T2TEST:!4903.50N/07201.75W-|!!!"!#!$!%|',
+     'packet,format=uncompressed latitude=49.0583333333,longitude=-72.0291666667,posambiguity=0,from="N0CALL",to="APRS",messagecapable="False",via="T2TEST",path="TCPIP*,qAC,T2TEST",raw="N0CALL>APRS,TCPIP*,qAC,T2TEST:!4903.50N/07201.75W-|!!!\\"!#!$!%|",symbol="-",symbol_table="/",seq=0,bits=0.0,analog1=1.0,analog2=2.0,analog3=3.0,analog4=4.0,analog5=0.0 1500000000500000000'),
+]
+
+# Object packets parse to a timestamp relative to the current date
+OBJECT = {"format": "object", "from": "N0CALL", "to": "APRS", "via": "", "path": ["TCPIP*"], "alive": True,
+          "object_name": "LEADER   ", "timestamp": 1500000000, "latitude": 49.5, "longitude": -72.75, "raw": "r"}
+OBJECT_LINE = 'packet,format=object latitude=49.5,longitude=-72.75,timestamp=1500000000,from="N0CALL",alive="True",via="",to="APRS",object_name="LEADER   ",path="TCPIP*",raw="r" 1500000000500000000'
+
+
+class EncoderTest(unittest.TestCase):
+    """Line protocol written by the compiled encoders"""
+
+    def tearDown(self):
+        lineprotocol.setPlan(lineprotocol.compilePlan())
+
+    def testDefaultPlanOutputUnchanged(self):
+        for raw, expected in FIXTURES:
+            self.assertEqual(lineprotocol.jsonToLineProtocol(aprslib.parse(raw), RECEIVED), expected)
+        self.assertEqual(lineprotocol.jsonToLineProtocol(dict(OBJECT), RECEIVED), OBJECT_LINE)
+
+    def testDisabledFormatIsSkipped(self):
+        lineprotocol.setPlan(lineprotocol.compilePlan(["status"]))
+        status = aprslib.parse(FIXTURES[2][0])
+        self.assertEqual(lineprotocol.jsonToLineProtocol(status, RECEIVED), FIXTURES[2][1])
+        self.assertEqual(lineprotocol.jsonToLineProtocol(aprslib.parse(FIXTURES[0][0]), RECEIVED), None)
+        self.assertFalse(lineprotocol.wantsRaw(FIXTURES[0][0]))
+        self.assertTrue(lineprotocol.wantsRaw(FIXTURES[2][0]))
+
+    def testFieldsRestricted(self):
+        lineprotocol.setPlan(lineprotocol.compilePlan(fields={"status": ["from", "status"]}, exclude=["raw"]))
+        self.assertEqual(lineprotocol.jsonToLineProtocol(aprslib.parse(FIXTURES[2][0]), RECEIVED),
+                         'packet,format=status from="N0CALL",status="status text" 1500000000500000000')
+        self.assertEqual(lineprotocol.jsonToLineProtocol(aprslib.parse(FIXTURES[0][0]), RECEIVED),
+                         FIXTURES[0][1][:FIXTURES[0][1].find(",raw=")] + ',symbol=">",symbol_table="/" 1500000000500000000')
+
+    def testUnknownNamesRejected(self):
+        self.assertRaises(ValueError, lineprotocol.compilePlan, ["nosuchformat"])
+        self.assertRaises(ValueError, lineprotocol.compilePlan, None, {"status": ["nosuchfield"]})
+
+
+class FakeClient(object):
+    """InfluxDB client answering SHOW FIELD KEYS
+
+    keyword arguments:
+    fields -- dictionary of measurement to (field key, field type) tuples
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def query(self, query):
+        return FakeResult(self.fields)
+
+
+class FakeResult(object):
+    """ResultSet of SHOW FIELD KEYS"""
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def items(self):
+        return [((measurement, None), [{"fieldKey": key, "fieldType": fieldType} for key, fieldType in fields])
+                for measurement, fields in self.fields.items()]
+
+
+class FieldTypeTest(unittest.TestCase):
+    """Coercion of field values to their registered types"""
+
+    def setUp(self):
+        self.registry = lineprotocol.fieldTypes
+        lineprotocol.fieldTypes = fieldtypes.FieldRegistry()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        lineprotocol.fieldTypes = self.registry
+        lineprotocol.setPlan(lineprotocol.compilePlan())
+        shutil.rmtree(self.directory)
+
+    def testInteger(self):
+        self.assertEqual(lineprotocol.formatValue(42, fieldtypes.INTEGER), "42i")
+        self.assertEqual(lineprotocol.formatValue("42", fieldtypes.INTEGER), "42i")
+        self.assertEqual(lineprotocol.formatValue(42.0, fieldtypes.INTEGER), "42i")
+        self.assertEqual(lineprotocol.formatValue(42.5, fieldtypes.INTEGER), None)
+        self.assertEqual(lineprotocol.formatValue("A1", fieldtypes.INTEGER), None)
+
+    def testFloat(self):
+        self.assertEqual(lineprotocol.formatValue(3, fieldtypes.FLOAT), "3.0")
+        self.assertEqual(lineprotocol.formatValue("2.5", fieldtypes.FLOAT), "2.5")
+        for value in (float("inf"), float("-inf"), float("nan"), "nan", "abc", None):
+            self.assertEqual(lineprotocol.formatValue(value, fieldtypes.FLOAT), None)
+        self.assertEqual(lineprotocol.formatValue(float("inf"), fieldtypes.INTEGER), None)
+
+    def testBoolean(self):
+        for value in (True, "true", "T", "yes", "Y", "1", 1):
+            self.assertEqual(lineprotocol.formatValue(value, fieldtypes.BOOLEAN), "true")
+        for value in (False, "false", "f", "No", "n", "0", 0):
+            self.assertEqual(lineprotocol.formatValue(value, fieldtypes.BOOLEAN), "false")
+        self.assertEqual(lineprotocol.formatValue("maybe", fieldtypes.BOOLEAN), None)
+
+    def testString(self):
+        self.assertEqual(lineprotocol.formatValue(42, fieldtypes.STRING), '"42"')
+        self.assertEqual(lineprotocol.formatValue('say "hi"', fieldtypes.STRING), '"say \\"hi\\""')
+
+    def testNonNumericMessageNumberQuarantined(self):
+        packet = aprslib.parse(b"N0CALL>APRS,TCPIP*::N1CALL   :hello{AB1")
+        line = lineprotocol.jsonToLineProtocol(packet, RECEIVED)
+        self.assertFalse("msgNo=" in line)
+        self.assertTrue('message_text="hello"' in line)
+        self.assertEqual(lineprotocol.fieldTypes.quarantined, {("packet", "msgNo"): 1})
+
+        # Written as text once msgNo is a string field
+        lineprotocol.fieldTypes.set("packet", "msgNo", fieldtypes.STRING)
+        lineprotocol.setPlan(lineprotocol.compilePlan())
+        self.assertTrue('msgNo="AB1"' in lineprotocol.jsonToLineProtocol(packet, RECEIVED))
+
+    def testSourcePrecedence(self):
+        cache = os.path.join(self.directory, "fieldtypes.json")
+        with open(cache, "w") as cacheFile:
+            json.dump({"packet": {"msgNo": "integer", "bid": "integer", "speed": "integer"}}, cacheFile)
+        ini = os.path.join(self.directory, "aprs2influxdb.ini")
+        with open(ini, "w") as iniFile:
+            iniFile.write("[fieldtypes]\npacket.msgNo = string\npacket.bid = string\n")
+        main.args = main.parseArguments(["--config", ini, "--fieldtypes", cache])
+
+        # The cache file, overridden by the configuration, overridden by the database
+        lineprotocol.fieldTypes.load(main.args.fieldtypes)
+        main.configureFieldTypes()
+        main.writers = [BatchWriter(sinks.InfluxDBSink(FakeClient({"packet": [("bid", "float")]}), "aprs"))]
+        main.warmFieldTypes()
+        main.writers = []
+
+        self.assertEqual(lineprotocol.fieldTypes.get("packet", "speed", None), fieldtypes.INTEGER)
+        self.assertEqual(lineprotocol.fieldTypes.get("packet", "msgNo", None), fieldtypes.STRING)
+        self.assertEqual(lineprotocol.fieldTypes.get("packet", "bid", None), fieldtypes.FLOAT)
+
+        # Saved types are loaded again
+        lineprotocol.fieldTypes.save(cache)
+        registry = fieldtypes.FieldRegistry()
+        registry.load(cache)
+        self.assertEqual(registry.types, lineprotocol.fieldTypes.types)
+
+
+class ChannelTypeTest(unittest.TestCase):
+    """Field types of telemetry channels named by stations"""
+
+    def tearDown(self):
+        lineprotocol.telemetryCache = telemetry.TelemetryCache()
+
+    def testChannelNamesNotRegistered(self):
+        lineprotocol.telemetryCache = telemetry.TelemetryCache()
+        registered = len(lineprotocol.fieldTypes)
+        for index in range(20):
+            station = "N0CALL-{0}".format(index)
+            lineprotocol.telemetryCache.update(station, {"tPARM": ["volts{0}".format(index), "temp{0}".format(index)]})
+            report = telemetry.parseReport("{0}>APRS,TCPIP*:T#001,12.5,20,,,,10000000".format(station))
+            line = lineprotocol.jsonToLineProtocol(report, RECEIVED)
+            self.assertTrue("volts{0}=12.5,temp{0}=20.0,".format(index) in line)
+        self.assertEqual(len(lineprotocol.fieldTypes), registered)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from aprs2influxdb import __main__ as main
+
+
+class ReceiveTimesTest(unittest.TestCase):
+    """Distinct receive times of packets received together"""
+
+    def setUp(self):
+        main.nextReceived = 0.0
+
+    def testPacketsGetDistinctTimes(self):
+        first = main.receiveTimes(1500000000.0, 3)
+        second = main.receiveTimes(1500000000.0, 2)
+        times = [first + index * main.RECEIVE_STEP for index in range(3)]
+        times += [second + index * main.RECEIVE_STEP for index in range(2)]
+        stamps = ["%d" % (received * 1e9) for received in times]
+        self.assertEqual(len(set(stamps)), 5)
+        self.assertEqual(sorted(times), times)
+
+    def testLaterTimeKept(self):
+        main.receiveTimes(1500000000.0, 3)
+        self.assertEqual(main.receiveTimes(1500000001.0, 1), 1500000001.0)
+
+    def testClockStepBackRestartsSequence(self):
+        main.receiveTimes(1500000000.0, 3)
+        self.assertEqual(main.receiveTimes(1400000000.0, 1), 1400000000.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
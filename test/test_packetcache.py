@@ -0,0 +1,71 @@
+import unittest
+
+import aprslib
+
+from aprs2influxdb import lineprotocol
+from aprs2influxdb import packetcache
+from aprs2influxdb.packetcache import PacketCache
+
+# Payloads of common formats, each heard through several paths
+PAYLOADS = [b"N0CALL-9>APDR15{0}:=4903.50N/07201.75W>088/036/A=001234 mobile \"test\"",
+            b"WX1>APRS{0}:!4903.50N/07201.75W_220/004g005t077r000p000P000h50b09900",
+            b"N0CALL>APRS{0}:>status text",
+            b"N0CALL>APRS{0}::BLN1     :bulletin text",
+            b"N0CALL-9>S32U6T{0}:`(_fn\"Oj/]mobile"]
+PATHS = [b"", b",TCPIP*,qAC,T2TEST", b",WIDE1-1,WIDE2-2,qAR,IGATE", b",DB0ABC*,WIDE2*,qAO,IGATE2-10"]
+
+# Receive time of all packets
+RECEIVED = 1500000000.5
+
+
+class PacketCacheTest(unittest.TestCase):
+    """Repeats encoded from the cache match packets parsed and encoded in full"""
+
+    def testRepeatsMatchFullEncoding(self):
+        cache = PacketCache()
+        for payload in PAYLOADS:
+            for path in PATHS:
+                line = payload.replace(b"{0}", path)
+                expected = lineprotocol.jsonToLineProtocol(aprslib.parse(line), RECEIVED)
+                self.assertTrue(expected)
+
+                key = packetcache.cacheKey(line)
+                entry = cache.get(key, RECEIVED)
+                if entry is None:
+                    entry = cache.add(key, aprslib.parse(line))
+                    packet = dict(entry.packet)
+                else:
+                    packet = entry.repeat(line)
+                self.assertEqual(entry.encode(packet, RECEIVED), expected)
+                self.assertTrue(entry.template is not None)
+        self.assertEqual(len(cache), len(PAYLOADS))
+        self.assertEqual(packetcache.templateErrors, 0)
+
+    def testCacheKeyIgnoresPath(self):
+        keys = set(packetcache.cacheKey(PAYLOADS[0].replace(b"{0}", path)) for path in PATHS)
+        self.assertEqual(len(keys), 1)
+
+    def testInvalidPathIsParsed(self):
+        entry = packetcache.CachedPacket(aprslib.parse(PAYLOADS[2].replace(b"{0}", b"")))
+        self.assertEqual(entry.repeat(PAYLOADS[2].replace(b"{0}", b",WIDE1 1")), None)
+
+    def testLeastRecentlyUsedEvicted(self):
+        cache = PacketCache(2)
+        cache.get(b"a", RECEIVED)
+        for key in (b"a", b"b"):
+            cache.add(key, {"format": "status"})
+        self.assertTrue(cache.get(b"a", RECEIVED) is not None)
+        cache.add(b"c", {"format": "status"})
+        self.assertTrue(cache.get(b"b", RECEIVED) is None)
+        self.assertEqual(len(cache), 2)
+
+    def testEmptiedOnNewDay(self):
+        cache = PacketCache()
+        cache.get(b"a", RECEIVED)
+        cache.add(b"a", {"format": "status"})
+        self.assertTrue(cache.get(b"a", RECEIVED) is not None)
+        self.assertTrue(cache.get(b"a", RECEIVED + 86400) is None)
+
+
+if __name__ == "__main__":
+    unittest.main()
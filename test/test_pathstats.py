@@ -0,0 +1,54 @@
+import unittest
+
+from aprs2influxdb import pathstats
+from aprs2influxdb.pathstats import PathStats
+
+
+class ParseHopsTest(unittest.TestCase):
+    """Digipeaters, q construct and iGate of packet paths"""
+
+    def testUsedDigipeatersUpToLastMarked(self):
+        self.assertEqual(pathstats.parseHops(["DB0ABC*", "WIDE2-1", "qAR", "IGATE"]), (["DB0ABC"], "qAR", "IGATE"))
+        self.assertEqual(pathstats.parseHops(["DB0ABC", "DB0XYZ*", "WIDE2*", "qAO", "IGATE"]),
+                         (["DB0ABC", "DB0XYZ"], "qAO", "IGATE"))
+
+    def testUnusedPathHasNoDigipeaters(self):
+        self.assertEqual(pathstats.parseHops(["WIDE1-1", "WIDE2-2", "qAR", "IGATE"]), ([], "qAR", "IGATE"))
+
+    def testAliasesSkipped(self):
+        path = ["WIDE1*", "TRACE3-3*", "RELAY*", "TCPIP*", "NOGATE*", "WIDE*"]
+        self.assertEqual(pathstats.parseHops(path), ([], None, None))
+
+    def testConstructWithoutEntry(self):
+        self.assertEqual(pathstats.parseHops(["DB0ABC*", "qAR"]), (["DB0ABC"], "qAR", None))
+        self.assertEqual(pathstats.parseHops([]), ([], None, None))
+
+
+class PathStatsTest(unittest.TestCase):
+    """Summary points of the path measurement"""
+
+    def testSummary(self):
+        stats = PathStats()
+        stats.count(["DB0ABC*", "WIDE2-1", "qAR", "IG1"], 1500000000.5)
+        stats.count(["DB0ABC", "DB0XYZ*", "WIDE2*", "qAO", "IG2"], 1500000001.5)
+        stats.count(["DB0ABC*", "WIDE2-1", "qAR", "IG1"], 1500000002.5)
+        stats.count(["TCPIP*", "qAC", "T2TEST"], 1500000003.5)
+        stats.count(None, 1500000003.5)
+        self.assertEqual(stats.flush(), [
+            "path,role=digipeater,call=DB0ABC packets=3 1500000003500000000",
+            "path,role=digipeater,call=DB0XYZ packets=1 1500000003500000000",
+            "path,role=igate,call=IG1 packets=2 1500000003500000000",
+            "path,role=igate,call=IG2 packets=1 1500000003500000000",
+            "path,role=qconstruct,call=qAC packets=1 1500000003500000000",
+            "path,role=qconstruct,call=qAO packets=1 1500000003500000000",
+            "path,role=qconstruct,call=qAR packets=2 1500000003500000000"])
+        self.assertEqual((stats.packets, stats.points), (5, 7))
+
+        # Counts start again after each summary
+        self.assertEqual(stats.flush(), [])
+        stats.count(["DB0ABC*", "qAR", "IG1"], 1500000010.5)
+        self.assertEqual(stats.flush()[0], "path,role=digipeater,call=DB0ABC packets=1 1500000010500000000")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import threading
+import unittest
+
+from aprs2influxdb import pipeline
+from aprs2influxdb.pipeline import BoundedQueue, HIGH, LOW, NORMAL
+
+
+class BoundedQueueTest(unittest.TestCase):
+    """Items each overload policy sheds once the queue is full"""
+
+    def testDropOldest(self):
+        queue = BoundedQueue("test", 3, "dropoldest")
+        for item in range(5):
+            self.assertTrue(queue.put(item))
+        self.assertEqual(queue.get(10), [2, 3, 4])
+        self.assertEqual(sum(queue.shed), 2)
+
+    def testPriorityShedsLowestPriorityFirst(self):
+        queue = BoundedQueue("test", 3, "priority")
+        queue.put("beacon", LOW)
+        queue.put("position", HIGH)
+        queue.put("weather", NORMAL)
+
+        # A position displaces the beacon, another beacon is shed itself
+        self.assertTrue(queue.put("position2", HIGH))
+        self.assertFalse(queue.put("beacon2", LOW))
+        self.assertEqual(queue.get(10), ["position", "weather", "position2"])
+        self.assertEqual(queue.shed, [2, 0, 0])
+
+    def testSampleAdmitsEverySampleRateth(self):
+        queue = BoundedQueue("test", 2, "sample", 3)
+        results = [queue.put(item) for item in range(8)]
+        self.assertEqual(results, [True, True, False, False, True, False, False, True])
+        self.assertEqual(queue.get(10), [4, 7])
+        self.assertEqual(sum(queue.shed), 6)
+
+    def testBlockWaitsForRoom(self):
+        queue = BoundedQueue("test", 1, "block")
+        queue.put(1)
+        thread = threading.Thread(target=queue.put, args=(2,))
+        thread.daemon = True
+        thread.start()
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+
+        self.assertEqual(queue.get(10), [1])
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(queue.get(10), [2])
+        self.assertEqual(queue.shed, [0, 0, 0])
+
+    def testPutManyKeepsOrder(self):
+        queue = BoundedQueue("test", 10)
+        self.assertEqual(queue.putMany([("a", LOW), ("b", HIGH), ("c", NORMAL)]), 3)
+        self.assertEqual(queue.get(2), ["a", "b"])
+        self.assertEqual(queue.get(2, 0), ["c"])
+        self.assertEqual(queue.get(2, 0), [])
+
+    def testRawPriority(self):
+        self.assertEqual(pipeline.rawPriority(b"N0CALL>APRS,TCPIP*:!4903.50N/07201.75W-"), HIGH)
+        self.assertEqual(pipeline.rawPriority(b"N0CALL>APRS,TCPIP*:_10090556c220s004g005t077"), NORMAL)
+        self.assertEqual(pipeline.rawPriority(b"N0CALL>APRS,TCPIP*:>status text"), LOW)
+
+
+if __name__ == "__main__":
+    unittest.main()
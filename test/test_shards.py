@@ -0,0 +1,45 @@
+import unittest
+
+from aprs2influxdb import shards
+from aprs2influxdb.shards import ShardRouter
+
+
+class ShardRouterTest(unittest.TestCase):
+    """Writers chosen for packets by each shard key"""
+
+    def testCallsignIsStableAndSpread(self):
+        router = ShardRouter(["a", "b", "c"], "callsign")
+        self.assertEqual(router.route({"from": "N0CALL-9"}), router.route({"from": b"N0CALL-9"}))
+        chosen = set()
+        for index in range(300):
+            writers = router.route({"from": "T{0}".format(index)})
+            self.assertEqual(len(writers), 1)
+            chosen.add(writers[0])
+        self.assertEqual(chosen, set(["a", "b", "c"]))
+
+    def testFormatFallsBackToDefaultShard(self):
+        router = ShardRouter(["wx", "rest", "messages"], "format", [set(["wx"]), set(), set(["message"])])
+        self.assertEqual(router.route({"format": "wx"}), ["wx"])
+        self.assertEqual(router.route({"format": "message"}), ["messages"])
+        self.assertEqual(router.route({"format": "mic-e"}), ["rest"])
+
+    def testRegion(self):
+        regions = [shards.parseRegion("35, -25, 72, 45"), shards.parseRegion("-50, 170, -30, -175"), None]
+        router = ShardRouter(["europe", "pacific", "rest"], "region", regions=regions)
+        self.assertEqual(router.route({"latitude": 52.5, "longitude": 13.4}), ["europe"])
+        self.assertEqual(router.route({"latitude": -41.3, "longitude": 174.8}), ["pacific"])
+        self.assertEqual(router.route({"latitude": -41.3, "longitude": -178.0}), ["pacific"])
+        self.assertEqual(router.route({"latitude": 40.7, "longitude": -74.0}), ["rest"])
+        self.assertEqual(router.route({"format": "status"}), ["rest"])
+
+    def testMirror(self):
+        router = ShardRouter(["a", "b"], "mirror")
+        self.assertEqual(router.route({"from": "N0CALL"}), ["a", "b"])
+
+    def testParseRegionRejectsMalformedBoxes(self):
+        for value in ["1, 2, 3", "north, 0, 10, 10", "10, 0, 5, 10", "0, 0, 95, 10", "0, 0, 10, 190"]:
+            self.assertRaises(ValueError, shards.parseRegion, value)
+
+
+if __name__ == "__main__":
+    unittest.main()
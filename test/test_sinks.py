@@ -0,0 +1,48 @@
+import socket
+import unittest
+
+from aprs2influxdb.sinks import UDPSink
+
+
+class UDPSinkTest(unittest.TestCase):
+    """Datagrams sent by UDPSink to a local listener"""
+
+    def setUp(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.settimeout(1)
+        self.sink = UDPSink("127.0.0.1", self.listener.getsockname()[1], mtu=100)
+
+    def tearDown(self):
+        self.sink.close()
+        self.listener.close()
+
+    def receive(self):
+        """Return the datagrams the sink sent"""
+        return [self.listener.recv(65536) for _ in range(self.sink.datagramsSent)]
+
+    def testDatagramsFitMtuAndKeepLinesWhole(self):
+        lines = ["packet,from=N0CALL{0} seq={1}i {2}".format(index, index * 7, 1500000000 + index) for index in range(50)]
+        payload = "\n".join(lines + [""])
+        self.sink.write(payload)
+
+        datagrams = self.receive()
+        self.assertTrue(len(datagrams) > 1)
+        for datagram in datagrams:
+            self.assertTrue(len(datagram) <= 100)
+            self.assertTrue(datagram.endswith(b"\n"))
+        self.assertEqual(b"".join(datagrams), payload.encode("utf-8"))
+        self.assertEqual(self.sink.linesSent, 50)
+        self.assertEqual(self.sink.bytesSent, len(payload))
+        self.assertEqual(self.sink.datagramsDropped, 0)
+
+    def testLongLineSentOnItsOwn(self):
+        payload = "short value=1i\n" + "long value=\"" + "x" * 200 + "\"\nshort value=2i\n"
+        self.sink.write(payload)
+
+        datagrams = self.receive()
+        self.assertEqual(datagrams, [b"short value=1i\n", ("long value=\"" + "x" * 200 + "\"\n").encode("utf-8"), b"short value=2i\n"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import aprslib
+
+from aprs2influxdb import lineprotocol
+from aprs2influxdb import telemetry
+from aprs2influxdb.telemetry import TelemetryCache
+
+# Receive time of all packets
+RECEIVED = 1500000000.5
+
+# Metadata of N0CALL: a reserved and a repeated channel name, scaling of the
+# first two channels and the sense of the bits
+METADATA = [b"N0CALL>APRS::N0CALL   :PARM.Volts,Temp,seq,Volts,,Door,Light",
+            b"N0CALL>APRS::N0CALL   :UNIT.V,C",
+            b"N0CALL>APRS::N0CALL   :EQNS.0,0.5,0,0,1,-40,0,1,0,0,1,0,0,1,0",
+            b"N0CALL>APRS::N0CALL   :BITS.10000000,Test project"]
+
+
+class ParseReportTest(unittest.TestCase):
+    """T# telemetry reports aprslib does not parse"""
+
+    def testReport(self):
+        packet = telemetry.parseReport(b"N0CALL>APRS,WIDE1-1,qAR,IGATE:T#005,100,,3.5,4,5,10101010")
+        self.assertEqual(packet["format"], "telemetry")
+        self.assertEqual(packet["from"], "N0CALL")
+        self.assertEqual(packet["path"], ["WIDE1-1", "qAR", "IGATE"])
+        self.assertEqual(packet["telemetry"], {"seq": 5, "vals": [100.0, None, 3.5, 4.0, 5.0], "bits": "10101010"})
+
+    def testMicReportHasNoSequence(self):
+        packet = telemetry.parseReport(b"N0CALL>APRS:T#MIC,1,2")
+        self.assertEqual(packet["telemetry"], {"seq": None, "vals": [1.0, 2.0], "bits": ""})
+
+    def testOtherPacketsRejected(self):
+        for line in (b"N0CALL>APRS:>status", b"N0CALL>APRS:T#ABC,1", b"N0CALL>APRS:T#001,x", b"N0CALL>APRS:T#001,1,2,3,4,5,10201010"):
+            self.assertEqual(telemetry.parseReport(line), None)
+
+
+class TelemetryCacheTest(unittest.TestCase):
+    """Metadata kept per station and applied to reports"""
+
+    def setUp(self):
+        self.cache = lineprotocol.telemetryCache
+        lineprotocol.telemetryCache = TelemetryCache()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        lineprotocol.telemetryCache = self.cache
+        shutil.rmtree(self.directory)
+
+    def encodeReport(self, line):
+        """Return the line protocol of a raw T# report"""
+        return lineprotocol.jsonToLineProtocol(telemetry.parseReport(line), RECEIVED)
+
+    def testReportScaledAndNamed(self):
+        for line in METADATA:
+            self.assertEqual(lineprotocol.jsonToLineProtocol(aprslib.parse(line), RECEIVED), None)
+        self.assertEqual(self.encodeReport(b"N0CALL>APRS,TCPIP*:T#005,100,60,3,4,5,10101010"),
+                         "telemetry,from=N0CALL seq=5,Volts=50.0,Temp=20.0,analog3=3.0,analog4=4.0,analog5=5.0,"
+                         "Door=true,Light=true,bit3=false,bit4=true,bit5=false,bit6=true,bit7=false,bit8=true 1500000000500000000")
+
+        entry = lineprotocol.telemetryCache.get("N0CALL")
+        self.assertEqual(entry["units"][:3], ["V", "C", ""])
+        self.assertEqual(entry["title"], "Test project")
+
+    def testUnknownStationUnscaled(self):
+        self.assertEqual(self.encodeReport(b"N1CALL>APRS,TCPIP*:T#001,1,,3"),
+                         "telemetry,from=N1CALL seq=1,analog1=1.0,analog3=3.0 1500000000500000000")
+
+    def testClashingNamesUseChannelKeys(self):
+        names = ["seq", "analog1", "Volts", "Volts", "bit1", "bit1", "x y", "x y"] + [""] * 5
+        keys = telemetry.channelKeys(names)
+        self.assertEqual(keys[:8], ["analog1", "analog2", "Volts", "analog4", "analog5", "bit1", "x\\ y", "bit3"])
+        self.assertEqual(len(set(keys)), 13)
+
+    def testLeastRecentlyUsedEvicted(self):
+        cache = TelemetryCache(2)
+        for station in ("A", "B"):
+            cache.update(station, {"tEQNS": [[0, 2, 0]] * 5})
+        self.assertTrue(cache.get("A") is not None)
+        cache.update("C", {"tPARM": ["Volts"]})
+        self.assertEqual(cache.get("B"), None)
+        self.assertEqual(len(cache), 2)
+        self.assertFalse(cache.update("D", {"format": "telemetry-message"}))
+
+    def testSaveAndLoad(self):
+        cache = TelemetryCache()
+        cache.update("A", {"tPARM": ["Volts", "Volts"], "tEQNS": [[0, 2, 1]] * 5, "tBITS": "01010101", "title": "Project"})
+        path = os.path.join(self.directory, "telemetry.json")
+        cache.save(path)
+
+        loaded = TelemetryCache()
+        loaded.load(path)
+        self.assertEqual(loaded.get("A"), cache.get("A"))
+        self.assertEqual(loaded.equations("A"), [(0, 2, 1)] * 5)
+        self.assertEqual(loaded.equations("B"), telemetry.DEFAULT_EQUATIONS)
+        self.assertTrue(loaded.version > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
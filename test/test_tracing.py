@@ -0,0 +1,69 @@
+import unittest
+
+from aprs2influxdb import tracing
+from aprs2influxdb.pipeline import BoundedQueue, LOW
+from aprs2influxdb.writer import BatchWriter
+
+
+class FakeSink(object):
+    """Sink keeping the payloads written"""
+
+    def __init__(self):
+        self.payloads = []
+
+    def write(self, payload):
+        self.payloads.append(payload)
+
+
+class TracerTest(unittest.TestCase):
+    """Sampling and counting of traced packets through the writer stage"""
+
+    def tracedPoint(self, tracer, line):
+        """Return a traced point of a line noted as queued for one writer"""
+        trace = tracer.trace(b"raw").trace
+        trace.mark(tracing.DEQUEUE)
+        trace.mark(tracing.PARSE)
+        point = tracer.point(line, trace, 1)
+        trace.mark(tracing.ENQUEUE)
+        return point
+
+    def testSampleEveryRateth(self):
+        tracer = tracing.Tracer(3)
+        items = [((b"packet", 0), LOW) for index in range(7)]
+        tracer.sample(items)
+        traced = [index for index, ((line, received), priority) in enumerate(items) if line.__class__ is tracing.TracedLine]
+        self.assertEqual(traced, [2, 5])
+        self.assertEqual(tracer.sampleLine(b"packet").__class__, bytes)
+        self.assertEqual(tracer.sampleLine(b"packet").__class__, tracing.TracedLine)
+        self.assertEqual(tracer.sampled, 3)
+
+    def testWrittenPointsFinishTraces(self):
+        tracer = tracing.Tracer(1)
+        writer = BatchWriter(FakeSink(), tracer=tracer)
+        writer.add(self.tracedPoint(tracer, "packet value=1i"))
+        writer.add("packet value=2i")
+        self.assertEqual(tracer.pending, 1)
+
+        points = writer.queue.getBatch(10, 0)
+        traces = tracer.take(points)
+        writer.write(points)
+        tracer.acknowledge(traces)
+        self.assertEqual(tracer.pending, 0)
+        self.assertEqual(tracer.finished, 1)
+        self.assertEqual([row[0] for row in tracer.summary()], tracing.INTERVALS + ["total"])
+
+    def testShedPointsNoLongerPending(self):
+        for policy in ("dropoldest", "priority", "sample"):
+            tracer = tracing.Tracer(1)
+            writer = BatchWriter(FakeSink(), queue=BoundedQueue("write", 2, policy, 2), tracer=tracer)
+            for index in range(10):
+                writer.add(self.tracedPoint(tracer, "packet value={0}i".format(index)))
+            self.assertEqual(len(writer.queue), 2)
+            self.assertEqual(tracer.pending, 2)
+
+            tracer.take(writer.queue.getBatch(10, 0))
+            self.assertEqual(tracer.pending, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
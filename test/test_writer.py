@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from aprs2influxdb import writer
+from aprs2influxdb.writer import BatchController, BatchWriter, DeadLetter
+
+
+class SinkError(Exception):
+    """Write error carrying an HTTP status code like InfluxDBClientError"""
+
+    def __init__(self, code):
+        Exception.__init__(self, "status {0}".format(code))
+        self.code = code
+
+
+class FakeSink(object):
+    """Sink rejecting payloads holding a bad point, or failing with codes in turn
+
+    keyword arguments:
+    failures -- status codes raised by the first writes
+    """
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.attempts = 0
+        self.payloads = []
+
+    def write(self, payload):
+        self.attempts += 1
+        if self.failures:
+            raise SinkError(self.failures.pop(0))
+        if "bad" in payload:
+            raise SinkError(400)
+        self.payloads.append(payload)
+
+
+class BatchWriterTest(unittest.TestCase):
+    """Retries and bisection of rejected batches"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.deadLetter = DeadLetter(os.path.join(self.directory, "rejected.lp"))
+
+    def tearDown(self):
+        self.deadLetter.close()
+        shutil.rmtree(self.directory)
+
+    def testRejectedBatchIsolatesBadPoint(self):
+        sink = FakeSink()
+        writer = BatchWriter(sink, retries=2, retryDelay=0, deadLetter=self.deadLetter)
+        points = ["packet value={0}i".format(index) for index in range(16)]
+        points[11] = "packet value=bad"
+        writer.write(points)
+
+        written = "".join(sink.payloads).splitlines()
+        self.assertEqual(sorted(written), sorted(point for point in points if point != "packet value=bad"))
+        self.assertEqual(writer.written, 15)
+        self.assertEqual(writer.rejected, 1)
+        self.assertEqual(writer.failed, 0)
+        self.assertEqual(writer.retried, 0)
+
+        self.deadLetter.close()
+        with open(self.deadLetter.path) as deadLetterFile:
+            lines = deadLetterFile.read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("# ") and lines[0].endswith("status 400"))
+        self.assertEqual(lines[1], "packet value=bad")
+
+    def testServerErrorIsRetried(self):
+        sink = FakeSink([503, 503])
+        writer = BatchWriter(sink, retries=2, retryDelay=0)
+        writer.write(["packet value=1i", "packet value=2i"])
+        self.assertEqual(sink.payloads, ["packet value=1i\npacket value=2i\n"])
+        self.assertEqual(writer.retried, 2)
+        self.assertEqual(writer.written, 2)
+
+    def testPermanentErrorIsNotRetried(self):
+        sink = FakeSink([401])
+        writer = BatchWriter(sink, retries=2, retryDelay=0)
+        writer.write(["packet value=1i"])
+        self.assertEqual(sink.attempts, 1)
+        self.assertEqual(writer.failed, 1)
+        self.assertEqual(writer.written, 0)
+
+
+class BatchControllerTest(unittest.TestCase):
+    """Additive increase and multiplicative decrease of the batch size"""
+
+    def setUp(self):
+        self.controller = BatchController(minSize=10, maxSize=5000, targetLatency=0.5)
+
+    def testFastFullBatchGrows(self):
+        self.assertEqual(self.controller.observe(100, 100, 0.1), 110)
+        self.assertEqual(self.controller.increases, 1)
+
+    def testSlowOrFailedWriteHalves(self):
+        self.assertEqual(self.controller.observe(100, 100, 1.0), 50)
+        self.assertEqual(self.controller.observe(100, 100, 0.1, True), 50)
+        self.assertEqual(self.controller.decreases, 2)
+        self.assertEqual(self.controller.errorRate, 0.2)
+
+    def testClampedToMinAndMax(self):
+        self.assertEqual(self.controller.observe(15, 15, 1.0), 10)
+        self.assertEqual(self.controller.observe(10, 10, 1.0), 10)
+        self.assertEqual(self.controller.observe(4995, 4995, 0.1), 5000)
+        self.assertEqual(self.controller.observe(5000, 5000, 0.1), 5000)
+        self.assertEqual(self.controller.increases, 1)
+        self.assertEqual(self.controller.decreases, 1)
+
+    def testPartialBatchLeavesSize(self):
+        self.assertEqual(self.controller.observe(100, 40, 0.1), 100)
+        self.assertEqual(self.controller.increases + self.controller.decreases, 0)
+
+    def testWriterFollowsController(self):
+        batchWriter = BatchWriter(FakeSink([503]), batchSize=100, retries=1, retryDelay=0, controller=self.controller)
+        batchWriter.write(["packet value={0}i".format(index) for index in range(100)])
+        # Halved by the failed attempt, grown by the retry writing a full batch
+        self.assertEqual(batchWriter.batchSize, 60)
+
+
+class SeriesKeyTest(unittest.TestCase):
+    """Measurement and tag set of points"""
+
+    def testUnescapedSpaceEndsKey(self):
+        self.assertEqual(writer.seriesKey('packet,format=status from="A" 1'), "packet,format=status")
+        self.assertEqual(writer.seriesKey('path,role=igate,call=A\\ B packets=1i 1'), "path,role=igate,call=A\\ B")
+        self.assertEqual(writer.seriesKey('path,call=A\\\\ packets=1i 1'), "path,call=A\\\\")
+        self.assertEqual(writer.seriesKey('path,call=A\\\\\\ B packets=1i 1'), "path,call=A\\\\\\ B")
+
+    def testBatchGroupedBySeries(self):
+        sink = FakeSink()
+        batchWriter = BatchWriter(sink, flushInterval=0)
+        for line in ['path,call=A\\ C packets=1i', 'path,call=A\\ B packets=2i', 'path,call=A\\ C packets=3i']:
+            batchWriter.add(line)
+        batchWriter.stop()
+        batchWriter.run()
+        self.assertEqual(sink.payloads, ['path,call=A\\ B packets=2i\npath,call=A\\ C packets=1i\npath,call=A\\ C packets=3i\n'])
+
+
+if __name__ == "__main__":
+    unittest.main()